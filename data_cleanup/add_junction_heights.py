@@ -1,32 +1,84 @@
+### Adds the elevation of every junction
+### Elevations are sampled from the DEM tiles in the DEM folder so that no network access is needed.
+### An Open-Elevation compatible service can be used instead with --api. Its elevations are cached so rerunning
+### only looks up junctions that haven't been looked up before.
+
 import sys
 sys.path.append('../') # This should probably be changed to a more sofisticated system at some point. i.e. install the package
 
-from ast import literal_eval
+import os
+import argparse
 
 from data_wrangler import Dataset
-import requests
+from data_wrangler.dataset import parquet_available
+from data_wrangler.elevation import DemTileSet
+from data_wrangler.elevation import rasterio_available
+from data_wrangler.elevation import DemElevationProvider
+from data_wrangler.elevation import HttpElevationProvider
+from data_wrangler.elevation import CachedElevationProvider
+from data_wrangler.profiling import profile_if_requested
+
+if __name__ == "__main__":
+    profile_if_requested()
 
 INPUT_FOLDER = '../data/cleaned_data'
 OUTPUT_FOLDER = '../data/cleaned_data'
 JUNCTIONS = f'{INPUT_FOLDER}/reach_junctions.csv'
+JUNCTIONS_PARQUET = f'{INPUT_FOLDER}/reach_junctions.parquet'
+
+# ESRI ASCII grids (.asc) or GeoTIFFs (.tif) in longitude/latitude coordinates. The tiles aren't in the repository, see the README.
+DEM_FOLDER = '../data/original_data/dem'
+
+OPEN_ELEVATION_URL = "https://api.open-elevation.com/api/v1/lookup"
+ELEVATION_CACHE = '../data/elevation_cache.json'
 
-junctions = Dataset.load_file(JUNCTIONS)
+parser = argparse.ArgumentParser(description="Add the elevation of every junction")
+parser.add_argument('--dem', default=DEM_FOLDER, help="The folder of DEM tiles to sample")
+parser.add_argument('--api', nargs='?', const=OPEN_ELEVATION_URL, help=f"Query an Open-Elevation compatible service instead of the DEM. Defaults to {OPEN_ELEVATION_URL}")
+parser.add_argument('--cache', default=ELEVATION_CACHE, help="Where to keep the elevations found with --api")
+parser.add_argument('--batch-size', type=int, default=1000, help="The number of junctions per request with --api")
+parser.add_argument('--workers', type=int, default=4, help="The number of requests to send at once with --api")
+args = parser.parse_args()
+
+if not args.api:
+    tiles = DemTileSet.tile_filenames(args.dem)
+    if not tiles:
+        print(f"No DEM tiles were found in {os.path.abspath(args.dem)}")
+        print("Download tiles that cover the junctions, eg: the Canadian Digital Elevation Model from Natural Resources Canada on")
+        print("open.canada.ca, as ESRI ASCII grids (.asc) or GeoTIFFs (.tif) in longitude/latitude coordinates and put them in that")
+        print("folder, or choose another folder with --dem. To look the elevations up online instead run with --api.")
+        sys.exit(1)
+    if not rasterio_available() and any(not tile.lower().endswith('.asc') for tile in tiles):
+        print("Reading GeoTIFF tiles requires rasterio. Install it with pip install -r requirements-optional.txt or convert the tiles to ASCII grids.")
+        sys.exit(1)
+
+# The Parquet copy keeps the types of the reach columns so it is used when it is up to date
+if parquet_available() and os.path.exists(JUNCTIONS_PARQUET) and os.path.getmtime(JUNCTIONS_PARQUET) >= os.path.getmtime(JUNCTIONS):
+    junctions = Dataset.load_file(JUNCTIONS_PARQUET)
+else:
+    junctions = Dataset.load_file(JUNCTIONS)
 
 junctions.convert_property("latitude", float)
 junctions.convert_property("longitude", float)
 
-url = "https://api.open-elevation.com/api/v1/lookup"
-locations = [{'longitude': junction['longitude'], 'latitude': junction['latitude']} for junction in junctions]
-response = requests.post(url, json={'locations': locations})
+if args.api:
+    provider = CachedElevationProvider(HttpElevationProvider(args.api, args.batch_size, args.workers), args.cache)
+else:
+    provider = DemElevationProvider(DemTileSet.from_folder(args.dem))
+
+elevations = provider.lookup([junction['longitude'] for junction in junctions], [junction['latitude'] for junction in junctions])
+
+missing = sum(elevation is None for elevation in elevations)
+if missing:
+    print(f"No elevation was found for {missing} junctions. Their elevation is left empty")
 
-results = response.json()["results"]
-junctions.add_property("elevation", value=0)
-nonZero = False
-for junction, result in zip(junctions, results):
-    junction["elevation"] = result["elevation"]
-    if result["elevation"] != 0:
-        print(result["elevation"])
-        nonZero = True
+# The junction file is rewritten in place so it may already have elevations
+if 'elevation' not in junctions.get_column_names():
+    junctions.add_property("elevation", value=0)
+for junction, elevation in zip(junctions, elevations):
+    junction["elevation"] = None if elevation is None else round(elevation, 2)
 
 junctions.write_to_file(f'{OUTPUT_FOLDER}/reach_junctions.csv')
-        
\ No newline at end of file
+# A typed copy that analysis scripts can read a few columns of quickly
+if parquet_available():
+    junctions.write_to_file(f'{OUTPUT_FOLDER}/reach_junctions.parquet')
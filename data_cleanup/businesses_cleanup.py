@@ -1,52 +1,30 @@
 ### Processes the business dataset and reduces it from 700,000 records to less than 6000
 ### Filters for only valid licences within vancouver related to retail
 ### Also renames the fields
+### The licence file is read in chunks and filtered as it is read so only the licences that are kept are ever held in memory
 
-import pandas as pd
-
-FILENAME = '../data/original_data/business-licences.csv'
-
-print("Loading Data")
-licences = pd.read_csv(FILENAME, delimiter=';')
-print(f"Starting Data: {licences.shape[0]}")
-
-# Keep only issued licences
-licences = licences[licences['Status'] == 'Issued']
-print(f"Removed unissued licences: {licences.shape[0]}")
+import sys
+sys.path.append('../') # This should probably be changed to a more sofisticated system at some point. i.e. install the package
 
-# Keep only licences in the city of vancouver
-licences = licences[licences['City'] == 'Vancouver']
-print(f"Removed businesses outside Vancouver: {licences.shape[0]}")
-
-# Keep licences with location information
-licences = licences[licences['geo_point_2d'].notna()]
-print(f"Removed businesses without a location: {licences.shape[0]}")
+import os
+import pandas as pd
 
-# Remove licences without issued date information
-licences = licences[licences['IssuedDate'].notna()]
-print(f"Removed licences without an issue date: {licences.shape[0]}")
+from data_wrangler.profiling import profile_if_requested
 
-# Convert the IssuedDate to datetime type
-dates = pd.to_datetime(licences['IssuedDate'])
-licences.loc[:, 'IssuedDate'] = dates
+if __name__ == "__main__":
+    profile_if_requested()
 
-# Remove duplicate records
-duplicate_columns = ['BusinessName', 'BusinessTradeName', 'BusinessType', 'BusinessSubType', 'Street', 'LocalArea', 'geo_point_2d']
-licences.sort_values('IssuedDate', ascending=False, inplace=True)
-licences.drop_duplicates(subset=duplicate_columns, keep='first', inplace=True)
-print(f"Removed duplicates: {licences.shape[0]}")
+FILENAME = '../data/original_data/business-licences.csv'
+OUTPUT_FOLDER = '../data/pre_processed_data'
 
-# Set the expiry date to the end of the issued year if null
-licences.loc[:, 'ExpiredDate'] = pd.to_datetime(licences['ExpiredDate'], errors='coerce')
-last_day_of_year = licences['IssuedDate'].apply(lambda x: pd.Timestamp(year=x.year, month=12, day=31)) 
-licences.loc[:, 'ExpiredDate'].fillna(last_day_of_year, inplace=True)
+# The number of licences to read at once
+CHUNK_SIZE = 50000
 
-# Remove any licences expired before 2021
-licences = licences[licences['ExpiredDate'] > pd.Timestamp(year=2020, month=12, day=31)]
-print(f"Removed expired licences: {licences.shape[0]}")
+if not os.path.exists(OUTPUT_FOLDER):
+    os.makedirs(OUTPUT_FOLDER, exist_ok=True)
 
-# Only keep licences that have a commercial type
-ctypes = [
+# Only licences that have a commercial type are kept
+COMMERCIAL_TYPES = [
     'Bingo Hall', 'Motel', 'Auctioneer', 'Piano Tuner', 'Steam Bath', 'Liquor Delivery Services', 'Livery & Feed Stables', 
     'Model Agency', 'Carpet/Upholstery Cleaner', 'Horse Racing', 'Public Market Operator-Annual', 'Equipment Operator', 
     'Lumber Yard', 'Social Escort Services', 'Plumber & Sprinkler Contractor', 'Amusement Park', 'Machinery Dealer', 
@@ -76,30 +54,79 @@ ctypes = [
     'Massage Therapist', 'Computer Services', 'Retail Dealer - Food', 'Health and Beauty', 'Financial Services', 
     'Ltd Service Food Establishment', 'Restaurant Class 1', 'Retail Dealer', 'Health Services'
 ]
-licences = licences[licences['BusinessType'].isin(ctypes)]
-print(f"Removed non-commercial businesses: {licences.shape[0]}")
+
+# Licences with these types are tagged as retail
+RETAIL_TYPES = ['Wholesale Dealer - Food with Anc. Retail', 'Retail Dealer - Market Outlet', 'Wholesale Dealer w/ Anc. Retail', 'Manufacturer with Anc. Retail', 'Manufacturer - Food with Anc. Retail', 'Retail Dealer - Grocery', 'Liquor Retail Store', 'Wholesale Dealer - Food', 'Wholesale  Dealer', 'Retail Dealer - Food', 'Retail Dealer', 'Ltd Service Food Establishment']
+
+# The columns that are read from the licence file. Everything else is dropped while reading.
+COLUMN_TYPES = {
+    'LicenceRSN': 'Int64',
+    'LicenceNumber': str,
+    'BusinessName': str,
+    'BusinessTradeName': str,
+    'Status': 'category',
+    'IssuedDate': str,
+    'ExpiredDate': str,
+    'BusinessType': 'category',
+    'BusinessSubType': str,
+    'House': str,
+    'Street': str,
+    'City': 'category',
+    'PostalCode': str,
+    'LocalArea': str,
+    'NumberofEmployees': float,
+    'geo_point_2d': str,
+}
+
+print("Loading Data")
+starting_count = 0
+kept_chunks = []
+for chunk in pd.read_csv(FILENAME, delimiter=';', usecols=list(COLUMN_TYPES), dtype=COLUMN_TYPES, chunksize=CHUNK_SIZE):
+    starting_count += chunk.shape[0]
+    
+    # Keep only issued licences in the city of vancouver with a commercial type, a location and an issued date
+    chunk = chunk[
+        (chunk['Status'] == 'Issued') &
+        (chunk['City'] == 'Vancouver') &
+        chunk['BusinessType'].isin(COMMERCIAL_TYPES) &
+        chunk['geo_point_2d'].notna() &
+        chunk['IssuedDate'].notna()
+    ]
+    kept_chunks.append(chunk)
+
+licences = pd.concat(kept_chunks, ignore_index=True)
+licences['BusinessType'] = licences['BusinessType'].astype(str)
+print(f"Starting Data: {starting_count}")
+print(f"Removed unissued, non-commercial licences and licences outside Vancouver or without a location or issue date: {licences.shape[0]}")
+
+# Licences are issued in both PST and PDT so the issue dates are compared in UTC but written with their original offset
+issued_utc = pd.to_datetime(licences['IssuedDate'], utc=True)
+licences['IssuedDate'] = licences['IssuedDate'].str.replace('T', ' ', n=1)
+
+# Remove duplicate records
+duplicate_columns = ['BusinessName', 'BusinessTradeName', 'BusinessType', 'BusinessSubType', 'Street', 'LocalArea', 'geo_point_2d']
+licences = licences.iloc[issued_utc.argsort(kind='stable')[::-1]]
+licences.drop_duplicates(subset=duplicate_columns, keep='first', inplace=True)
+print(f"Removed duplicates: {licences.shape[0]}")
+
+# Set the expiry date to the end of the issued year if null
+issued_year_end = pd.to_datetime(licences['IssuedDate'].str[:4] + '-12-31')
+licences['ExpiredDate'] = pd.to_datetime(licences['ExpiredDate'], errors='coerce').fillna(issued_year_end)
+
+# Remove any licences expired before 2021
+licences = licences[licences['ExpiredDate'] > pd.Timestamp(year=2020, month=12, day=31)]
+print(f"Removed expired licences: {licences.shape[0]}")
 
 # Give licences a tag indicating whether they are retail type
-retailTypes = ['Wholesale Dealer - Food with Anc. Retail', 'Retail Dealer - Market Outlet', 'Wholesale Dealer w/ Anc. Retail', 'Manufacturer with Anc. Retail', 'Manufacturer - Food with Anc. Retail', 'Retail Dealer - Grocery', 'Liquor Retail Store', 'Wholesale Dealer - Food', 'Wholesale  Dealer', 'Retail Dealer - Food', 'Retail Dealer', 'Ltd Service Food Establishment']
-licences['retail'] = licences['BusinessType'].isin(retailTypes)
+licences = licences.assign(retail=licences['BusinessType'].isin(RETAIL_TYPES))
 licences = licences[licences['retail']]
 print(f"Removed non-retail businesses: {licences.shape[0]}")
 
-licences['latitude'] = licences['geo_point_2d'].apply(lambda p: float(p.split(',')[0]))
-licences['longitude'] = licences['geo_point_2d'].apply(lambda p: float(p.split(',')[1]))
-
-licences.drop('FOLDERYEAR', inplace=True, axis=1)
-licences.drop('LicenceRevisionNumber', inplace=True, axis=1)
-licences.drop('Status', inplace=True, axis=1)
-licences.drop('Unit', inplace=True, axis=1)
-licences.drop('UnitType', inplace=True, axis=1)
-licences.drop('City', inplace=True, axis=1)
-licences.drop('Province', inplace=True, axis=1)
-licences.drop('Country', inplace=True, axis=1)
-licences.drop('FeePaid', inplace=True, axis=1)
-licences.drop('ExtractDate', inplace=True, axis=1)
-licences.drop('Geom', inplace=True, axis=1)
-licences.drop('geo_point_2d', inplace=True, axis=1)
+# Getting lat and lon fom "lat, lon" format
+lat_lng = licences['geo_point_2d'].str.split(',', n=1, expand=True).astype(float)
+licences = licences.assign(latitude=lat_lng[0], longitude=lat_lng[1])
+
+licences = licences.drop(columns=['Status', 'City', 'geo_point_2d'])
 
 licences.rename(columns={
     'LicenceRSN': 'licence_rsn',
@@ -115,7 +142,6 @@ licences.rename(columns={
     'Street': 'street',
     'PostalCode': 'postal_code',
     'LocalArea': 'local_area',
-    'NumberOfEmployees': 'number_of_employees',
 }, inplace=True)
 
 licences.reset_index(inplace=True, drop=True)
@@ -123,4 +149,4 @@ licences.index.name = "id"
 
 print(f"Final count: {licences.shape[0]}")
 
-licences.to_csv('../temp/businesses.csv')
\ No newline at end of file
+licences.to_csv(f'{OUTPUT_FOLDER}/businesses.csv')
@@ -3,10 +3,17 @@
 import sys
 sys.path.append('../') # This should probably be changed to a more sofisticated system at some point. i.e. install the package
 
-from ast import literal_eval
 
 from data_wrangler import Dataset
+from data_wrangler.expression import col
+from data_wrangler import aggregation as agg
 from data_wrangler.conversion_functions import split_latitude, split_longitude
+from data_wrangler.profiling import profile_if_requested
+
+from compute_segment_locations import segment_midpoints_and_bearings
+
+if __name__ == "__main__":
+    profile_if_requested()
 
 # NOTE: The reason I am using Dataset instead of Panda Dataframes is because I would have to work out how to match two Dataframes based on locations
 
@@ -60,7 +67,7 @@ print(f"Initial segment count: {starting_segments_count}")
 segments.convert_properties({
     'id': int,
     'length_metres': float,
-    'neighbors': literal_eval
+    'neighbors': col('neighbors').parse_list()
 })
 
 segments.filter(lambda row: len(row['neighbors']) >= 2)
@@ -74,7 +81,19 @@ for segment in segments:
         junction['neighbors'].extend([
             (neighbor_id, segment['length_metres'], segment['id']) for neighbor_id in neighbors if neighbor_id != junction_id
         ])
-        
+
+# Locate the segments halfway along the street from their first junction to their last, and find the direction of the street
+junction_ids = [junction['id'] for junction in junctions]
+junction_latitudes = [junction['latitude'] for junction in junctions]
+junction_longitudes = [junction['longitude'] for junction in junctions]
+segment_neighbors = [segment['neighbors'] for segment in segments]
+
+latitudes, longitudes, bearings = segment_midpoints_and_bearings(junction_ids, junction_latitudes, junction_longitudes, segment_neighbors)
+for segment, latitude, longitude, bearing in zip(segments, latitudes.tolist(), longitudes.tolist(), bearings.tolist()):
+    segment['latitude'] = latitude
+    segment['longitude'] = longitude
+    segment['bearing'] = round(bearing, 2) % 360
+
 junctions.filter(lambda row: len(row['neighbors']) > 0)
 
 print(f"Removed junctions with no connections. Remaining {len(junctions)} ({len(junctions) / starting_junction_count:.0%})")
@@ -94,7 +113,7 @@ crime.filter(lambda row: row['latitude'] != 0 or row['longitude'] != 0)
 print(f"Removed crimes with null locations. Remaining: {len(crime)} ({len(crime) / starting_crime_count:.0%})")
     
 # Match to junctions
-crime.match_lat_lng_approx(junctions, 'junction_id', 'junction_dst', count_field='crime_count', distance_limit=200)
+crime.match_lat_lng(junctions, 'junction_id', 'junction_dst', count_field='crime_count', distance_limit=200)
 crime.filter(lambda row: row['junction_id'] != 0)
 print(f"Removed crimes more than 200 meters from a junction. Remaining {len(crime)} ({len(crime) / starting_crime_count:.0%})")
 
@@ -120,8 +139,9 @@ for row in sorted(stores, key=lambda row: row['year_recorded'], reverse=True):
         IDs.add(int(row['store_id']))
         
 # Update the id property to use the actual store id
+stores.set_primary_key('store_id')
+stores.drop('id')
 stores.rename('store_id', 'id')
-stores.set_primary_key('id')
 stores.drop('year_recorded')
         
 print(f"Removed duplicate stores. Remaining {len(stores)} ({len(stores) / starting_stores_count:.0%})")
@@ -129,7 +149,7 @@ print(f"Removed duplicate stores. Remaining {len(stores)} ({len(stores) / starti
 stores.filter(lambda store: store['category'] != 'Vacant')
 print(f"Removed vacant stores. Remaining {len(stores)} ({len(stores) / starting_stores_count:.0%})")
 
-stores.match_lat_lng_approx(junctions, 'junction_id', 'junction_dst', count_field='stores_count', distance_limit=200)
+stores.match_lat_lng(junctions, 'junction_id', 'junction_dst', count_field='stores_count', distance_limit=200)
 stores.filter(lambda row: row['junction_id'] != 0)
 print(f"Removed stores with no connections. Remaining {len(stores)} ({len(stores) / starting_stores_count:.0%})")
 
@@ -144,7 +164,7 @@ transit.convert_properties({
     'longitude': float
 })
 
-transit.match_lat_lng_approx(junctions, 'junction_id', 'junction_dst', count_field='transit_count', distance_limit=200)
+transit.match_lat_lng(junctions, 'junction_id', 'junction_dst', count_field='transit_count', distance_limit=200)
 transit.filter(lambda row: row['junction_id'] != 0)
 print(f"Removed transit with no connections. Remaining {len(transit)} ({len(transit) / starting_transit_count:.0%})")
 
@@ -159,9 +179,8 @@ rapid_transit.convert_properties({
     'longitude': float
 })
 
-rapid_transit.match_lat_lng_approx(junctions, 'junction_id', 'junction_dst', count_field='rapid_transit_count', distance_limit=200)
-rapid_transit.filter(lambda row: row['junction_id'] != 0)
-rapid_transit.filter(lambda row: row['id'] != 18) # Removing one of the commercial - broadway stations
+rapid_transit.match_lat_lng(junctions, 'junction_id', 'junction_dst', count_field='rapid_transit_count', distance_limit=200)
+rapid_transit.filter(lambda row: row['junction_id'] != 0 and row['id'] != 18) # Also removing one of the commercial - broadway stations
 print(f"Removed rapid transit with no connections. Remaining {len(rapid_transit)} ({len(rapid_transit) / starting_rapid_transit_count:.0%})")
 
 ## Cleanup Schools ##
@@ -174,31 +193,30 @@ schools.convert_properties({
     'longitude': float
 })
 
-schools.match_lat_lng_approx(junctions, 'junction_id', 'junction_dst', count_field='schools_count', distance_limit=200)
+schools.match_lat_lng(junctions, 'junction_id', 'junction_dst', count_field='schools_count', distance_limit=200)
 schools.filter(lambda row: row['junction_id'] != 0)
 print(f"Removed schools with no connections. Remaining {len(schools)} ({len(schools) / starting_schools_count:.0%})")
 
 ## Cleanup Businesses ##
 print(f"Initial business count: {starting_business_count}")
-businesses.convert_property('id', int)
-businesses.convert_property('employees_count', float)
-businesses.convert_property('latitude', float)
-businesses.convert_property('longitude', float)
-businesses.convert_property('retail', lambda v: True if v == "True" else False)
+businesses.convert_properties({
+    'id': int,
+    'employees_count': float,
+    'latitude': float,
+    'longitude': float,
+    'retail': lambda value: value == "True"
+})
 
-businesses.match_lat_lng_approx(junctions, 'junction_id', 'junction_dst', count_field='retail_count', distance_limit=200)
+businesses.match_lat_lng(junctions, 'junction_id', 'junction_dst', count_field='retail_count', distance_limit=200)
 businesses.filter(lambda row: row['junction_id'] != 0)
 print(f"Removed businesses with no connections. Remaining {len(businesses)} ({len(businesses) / starting_business_count:.0%})")
 
-for junction in junctions:
-    junction['retail_count'] = 0
-    junction['employees'] = 0
+retail = businesses.group_by('junction_id').agg({
+    'retail_count': agg.count_if(col('retail')),
+    'employees': agg.sum_if('employees_count', col('retail'))
+})
+junctions.join(retail, on='id', fill=0)
 
-for business in businesses:
-    if not business['retail']: continue
-    junctions[business['junction_id']]['retail_count'] += 1
-    junctions[business['junction_id']]['employees'] += business['employees_count']
-    
 
 
 ## Write Data ##
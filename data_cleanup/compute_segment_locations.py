@@ -1,38 +1,97 @@
-### Computes the midpoint of a segment based on its two junctions
-
-import csv
-
-# Load the junctions
-junctions = {}
-with open('../data/original_data/junctions.csv', 'r') as jcsvinput:
-    jdr = csv.DictReader(jcsvinput,quoting=csv.QUOTE_MINIMAL)
-    for jdict_row in jdr:
-        junctionll=[float(jdict_row["latitude"]),float(jdict_row["longitude"])]
-        junctions[int(jdict_row["JunctionID"])] = junctionll
-        
-# Load the segments
-segments = []
-fieldnames = []
-with open('../data/original_data/streetsegments.csv', 'r') as streetInput:
-    streetReader = csv.DictReader(streetInput,quoting=csv.QUOTE_MINIMAL)
-    fieldnames = streetReader.fieldnames
-    for street in streetReader:
-        near_junctions = [
-            int(street[key]) 
-            for key in ["pseudoJunctionID1", "pseudoJunctionID2", "adjustJunctionID1", "adjustJunctionID2"]
-        ]
-        junctionCount = sum(id > 0 for id in near_junctions)
-        if junctionCount == 0:
-            print(f"Streed with id {street['StreetID']} is not connected to any junctions.")
-            continue
-        
-        latitude = sum(junctions[id][0] for id in near_junctions if id > 0) / junctionCount
-        longitude = sum(junctions[id][1] for id in near_junctions if id > 0) / junctionCount
-        street["latitude"] = latitude
-        street["longitude"] = longitude
-        segments.append(street)
-        
-with open('../data/original_data/streetsegments_new.csv', 'w', newline='') as streetOutput:
-    writer = csv.DictWriter(f=streetOutput, fieldnames=fieldnames, quoting=csv.QUOTE_MINIMAL) # type: ignore
-    writer.writeheader()
-    writer.writerows(segments)
\ No newline at end of file
+### Computes the location of street segments from the junctions they connect
+### All segments are computed at once with numpy. Used by cleanup.py to set the latitude and longitude of the segments.
+### The Cypher version is in important_queries/compute_segment_locations
+
+import numpy as np
+
+from collections.abc import Sequence
+
+EARTH_RADIUS = 6371000
+
+def _flatten_neighbors(junction_ids: np.ndarray, segment_neighbors: Sequence[Sequence[int]]) -> tuple[np.ndarray, np.ndarray]:
+    """Get the segment index and the junction index of every segment-junction connection"""
+    counts = np.array([len(neighbors) for neighbors in segment_neighbors], dtype=np.intp)
+    flat_ids = np.fromiter((id for neighbors in segment_neighbors for id in neighbors), dtype=np.int64, count=int(counts.sum()))
+
+    order = np.argsort(junction_ids)
+    positions = np.searchsorted(junction_ids, flat_ids, sorter=order)
+    positions = np.minimum(positions, len(junction_ids) - 1)
+    junction_indexes = order[positions]
+
+    unknown = junction_ids[junction_indexes] != flat_ids
+    if unknown.any():
+        raise Exception(f"Segments reference junctions that don't exist: {sorted(set(flat_ids[unknown].tolist()))[:10]}")
+
+    return np.repeat(np.arange(len(segment_neighbors)), counts), junction_indexes
+
+def segment_locations(
+    junction_ids: Sequence[int], junction_latitudes: Sequence[float], junction_longitudes: Sequence[float],
+    segment_neighbors: Sequence[Sequence[int]]
+) -> tuple[np.ndarray, np.ndarray]:
+    """Get the location of each segment as the average location of the junctions it connects
+
+    Args:
+        junction_ids (Sequence[int]): The ids of the junctions
+        junction_latitudes (Sequence[float]): The latitudes of the junctions
+        junction_longitudes (Sequence[float]): The longitudes of the junctions
+        segment_neighbors (Sequence[Sequence[int]]): The ids of the junctions connected by each segment
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: The latitudes and longitudes of the segments. NaN for segments without junctions.
+    """
+    junction_ids = np.asarray(junction_ids, dtype=np.int64)
+    segment_indexes, junction_indexes = _flatten_neighbors(junction_ids, segment_neighbors)
+
+    counts = np.bincount(segment_indexes, minlength=len(segment_neighbors)).astype(float)
+    counts[counts == 0] = np.nan
+    latitudes = np.bincount(segment_indexes, np.asarray(junction_latitudes, dtype=float)[junction_indexes], len(segment_neighbors))
+    longitudes = np.bincount(segment_indexes, np.asarray(junction_longitudes, dtype=float)[junction_indexes], len(segment_neighbors))
+
+    return latitudes / counts, longitudes / counts
+
+def segment_midpoints_and_bearings(
+    junction_ids: Sequence[int], junction_latitudes: Sequence[float], junction_longitudes: Sequence[float],
+    segment_neighbors: Sequence[Sequence[int]]
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Get the point halfway along each segment and the direction of the segment
+
+    Segments are treated as great circle arcs from their first junction to their last junction.
+
+    Args:
+        junction_ids (Sequence[int]): The ids of the junctions
+        junction_latitudes (Sequence[float]): The latitudes of the junctions
+        junction_longitudes (Sequence[float]): The longitudes of the junctions
+        segment_neighbors (Sequence[Sequence[int]]): The ids of the junctions connected by each segment, in order
+
+    Returns:
+        tuple[np.ndarray, np.ndarray, np.ndarray]: The latitudes and longitudes of the midpoints and the bearings in degrees
+            clockwise from north at the first junction. NaN for segments with less than 2 junctions.
+    """
+    junction_ids = np.asarray(junction_ids, dtype=np.int64)
+    junction_latitudes = np.radians(np.asarray(junction_latitudes, dtype=float))
+    junction_longitudes = np.radians(np.asarray(junction_longitudes, dtype=float))
+
+    has_ends = np.array([len(neighbors) >= 2 for neighbors in segment_neighbors], dtype=bool)
+    ends = [(neighbors[0], neighbors[-1]) if len(neighbors) >= 2 else () for neighbors in segment_neighbors]
+    _, end_indexes = _flatten_neighbors(junction_ids, ends)
+    start, end = end_indexes[0::2], end_indexes[1::2]
+
+    lat_1, lng_1 = junction_latitudes[start], junction_longitudes[start]
+    lat_2, lng_2 = junction_latitudes[end], junction_longitudes[end]
+    d_lng = lng_2 - lng_1
+
+    b_x = np.cos(lat_2) * np.cos(d_lng)
+    b_y = np.cos(lat_2) * np.sin(d_lng)
+    mid_lat = np.arctan2(np.sin(lat_1) + np.sin(lat_2), np.sqrt((np.cos(lat_1) + b_x) ** 2 + b_y ** 2))
+    mid_lng = lng_1 + np.arctan2(b_y, np.cos(lat_1) + b_x)
+
+    bearing = np.arctan2(np.sin(d_lng) * np.cos(lat_2), np.cos(lat_1) * np.sin(lat_2) - np.sin(lat_1) * np.cos(lat_2) * np.cos(d_lng))
+
+    latitudes = np.full(len(segment_neighbors), np.nan)
+    longitudes = np.full(len(segment_neighbors), np.nan)
+    bearings = np.full(len(segment_neighbors), np.nan)
+    latitudes[has_ends] = np.degrees(mid_lat)
+    longitudes[has_ends] = np.degrees(mid_lng)
+    bearings[has_ends] = np.degrees(bearing) % 360
+
+    return latitudes, longitudes, bearings
@@ -0,0 +1,201 @@
+### Loads the yearly crime files from the Vancouver police department into a single crime table
+### The UTM locations of the crimes are converted to latitude and longitude a whole file at a time
+### Crime ids are derived from the content of the crime so they don't change when other years are added
+
+import sys
+sys.path.append('../') # This should probably be changed to a more sofisticated system at some point. i.e. install the package
+
+import os
+import csv
+import json
+import hashlib
+import numpy as np
+import utm
+
+from collections import Counter
+from collections.abc import Sequence
+
+from data_wrangler import Dataset
+from data_wrangler.conversion_functions import Row
+from data_wrangler.conversion_functions import create_regular_str
+from data_wrangler.files import atomic_write
+
+ZONE_NUMBER = 10
+ZONE_LETTER = 'U'
+
+# Matches crime_2021.csv, crime_2022.csv, ... but not other files like vanc_crime_2022_old.csv
+CRIME_FILE_PATTERN = 'crime_[0-9][0-9][0-9][0-9].csv'
+
+CRIME_COLUMNS = ['id', 'type_of_crime', 'date_of_crime', 'time_of_crime', 'hundred_block', 'latitude', 'longitude']
+
+def utm_to_lat_lng(x: Sequence[str], y: Sequence[str]) -> tuple[list[float], list[float]]:
+    """Convert columns of UTM coordinates to latitude and longitude
+
+    Crimes without a location have an empty X or Y or have both X and Y set to 0. Their latitude and longitude are set to 0.
+
+    Args:
+        x (Sequence[str]): The eastings as read from the file
+        y (Sequence[str]): The northings as read from the file
+
+    Returns:
+        tuple[list[float], list[float]]: The latitudes and longitudes
+    """
+    x_present = np.array([bool(v) for v in x], dtype=bool)
+    y_present = np.array([bool(v) for v in y], dtype=bool)
+
+    # Parse each column once, using 0 for the missing values
+    eastings = np.array([v or '0' for v in x], dtype=float)
+    northings = np.array([v or '0' for v in y], dtype=float)
+
+    has_location = x_present & y_present & ((eastings != 0) | (northings != 0))
+
+    latitudes = np.zeros(len(eastings))
+    longitudes = np.zeros(len(eastings))
+    if has_location.any():
+        latitudes[has_location], longitudes[has_location] = utm.to_latlon(
+            eastings[has_location], northings[has_location], ZONE_NUMBER, ZONE_LETTER
+        )
+
+    return latitudes.tolist(), longitudes.tolist()
+
+def crime_id(record: Sequence[str], occurrence: int) -> int:
+    """Derive a stable id for a crime from its original record
+
+    The police data contains identical records (locations are rounded to the block) so the number of times the same
+    record has already been seen in the file is included.
+
+    Args:
+        record (Sequence[str]): The values of the original row
+        occurrence (int): How many identical records came before this one in the file
+
+    Returns:
+        int: A positive id that fits in a 64 bit signed integer
+    """
+    digest = hashlib.blake2b('\x1f'.join([*record, str(occurrence)]).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') >> 1
+
+def read_crime_file(filename: str) -> list[Row]:
+    """Read one yearly crime file
+
+    Args:
+        filename (str): The path of the file
+
+    Returns:
+        list[Row]: The crimes
+    """
+    with open(filename, 'r', encoding='utf-8-sig') as input_file:
+        reader = csv.reader(input_file, quoting=csv.QUOTE_MINIMAL)
+        header = next(reader)
+        records = list(reader)
+
+    if not records: return []
+    data = { name: column for name, column in zip(header, zip(*records)) }
+
+    latitudes, longitudes = utm_to_lat_lng(data['X'], data['Y'])
+
+    seen = Counter()
+    ids = []
+    for record in records:
+        key = tuple(record)
+        ids.append(crime_id(record, seen[key]))
+        seen[key] += 1
+
+    return [
+        {
+            'id': id,
+            'type_of_crime': crime_type,
+            # Creating a date field in format yyyy-mm-dd
+            'date_of_crime': f"{year}-{create_regular_str(month)}-{create_regular_str(day)}",
+            # Creating a time field in the format HH:MM
+            'time_of_crime': f"{create_regular_str(hour)}:{create_regular_str(minute)}",
+            'hundred_block': hundred_block,
+            'latitude': latitude,
+            'longitude': longitude,
+        }
+        for id, crime_type, year, month, day, hour, minute, hundred_block, latitude, longitude in zip(
+            ids, data['TYPE'], data['YEAR'], data['MONTH'], data['DAY'], data['HOUR'], data['MINUTE'], data['HUNDRED_BLOCK'],
+            latitudes, longitudes
+        )
+    ]
+
+def load_crimes(filenames: Sequence[str]) -> Dataset:
+    """Load any number of yearly crime files into one dataset
+
+    Args:
+        filenames (Sequence[str]): The paths of the crime files
+
+    Returns:
+        Dataset: The crimes
+    """
+    rows = []
+    for filename in filenames:
+        print(f"    Reading {filename}")
+        rows.extend(read_crime_file(filename))
+
+    return Dataset(rows)
+
+def _file_hash(filename: str) -> str:
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def ingest_crimes(filenames: Sequence[str], output_filename: str):
+    """Write any number of yearly crime files to one crime table
+
+    Each file is converted and written before the next one is read. The files that have been written and the size of the table
+    after each of them are recorded in [output_filename].sources.json. When the table already exists and all of the files recorded
+    there are unchanged, only the new files are appended to the table. Otherwise the table is rewritten.
+
+    Args:
+        filenames (Sequence[str]): The paths of the crime files
+        output_filename (str): The path of the crime table
+    """
+    sources_filename = f'{output_filename}.sources.json'
+
+    sources = {}
+    size = 0
+    if os.path.exists(output_filename) and os.path.exists(sources_filename):
+        with open(sources_filename, 'r', encoding='utf-8') as sources_file:
+            recorded = json.load(sources_file)
+        # Older runs only recorded the files, so the end of the rows they wrote isn't known
+        if 'files' in recorded and 'size' in recorded and recorded['size'] <= os.path.getsize(output_filename):
+            sources = recorded['files']
+            size = recorded['size']
+
+    hashes = { os.path.basename(filename): _file_hash(filename) for filename in filenames }
+
+    # Any removed or modified file means the rows already in the table are wrong
+    if any(hashes.get(name) != file_hash for name, file_hash in sources.items()):
+        print("    Crime files have changed since the last run. Rewriting the crime table")
+        sources = {}
+
+    new_files = [filename for filename in filenames if os.path.basename(filename) not in sources]
+    if not new_files:
+        print("    No new crime files")
+        return
+
+    if sources:
+        # Remove anything an interrupted run appended after the last file it recorded
+        with open(output_filename, 'r+b') as out_file:
+            out_file.truncate(size)
+
+    with open(output_filename, 'a' if sources else 'w', newline='', encoding='utf-8-sig') as out_file:
+        writer = csv.DictWriter(out_file, fieldnames=CRIME_COLUMNS, quoting=csv.QUOTE_MINIMAL)
+        if not sources:
+            writer.writeheader()
+
+        for filename in new_files:
+            print(f"    Adding {filename}")
+            writer.writerows(read_crime_file(filename))
+            out_file.flush()
+
+            # Record the file straight away so an interrupted run doesn't append it twice
+            sources[os.path.basename(filename)] = hashes[os.path.basename(filename)]
+            _write_sources(sources_filename, sources, os.fstat(out_file.fileno()).st_size)
+
+def _write_sources(filename: str, sources: dict[str, str], size: int):
+    """Record the files in the crime table and its size"""
+    with atomic_write(filename) as sources_file:
+        json.dump({ 'files': sources, 'size': size }, sources_file, indent=4)
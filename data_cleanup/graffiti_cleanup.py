@@ -9,10 +9,17 @@ import os
 import utm
 
 from data_wrangler import Dataset
+from data_wrangler.dataset import parquet_available
+from data_wrangler import aggregation as agg
+from data_wrangler.expression import col
 from data_wrangler.conversion_functions import RowFunction
 from data_wrangler.conversion_functions import generate_id
 from data_wrangler.conversion_functions import create_regular_str
 from data_wrangler.conversion_functions import split_latitude, split_longitude
+from data_wrangler.profiling import profile_if_requested
+
+if __name__ == "__main__":
+    profile_if_requested()
 
 # NOTE: The reason I am using Dataset instead of Panda Dataframes is because I would have to work out how to match two Dataframes based on locations
 
@@ -65,7 +72,8 @@ junctions = Dataset.load_file(JUNCTIONS)
 junctions.convert_properties({
     'id': int,
     'latitude': float,
-    'longitude': float
+    'longitude': float,
+    'crime_count': int
 })
 
 
@@ -84,39 +92,24 @@ print(f"Removed graffiti with no connections. Remaining {len(graffiti)} ({len(gr
 print()
 print(f"Initial observation count: {starting_observation_count}")
 
-def on_match(row_1, row_2, dst):
-    row_1['junction_id'] = row_2[junctions.primary_key]
-    row_1['junction_dst'] = dst
-    
-    row_2['observation_count'] = row_2['observation_count'] + 1
-    if (row_1['crime_type'] == 1): row_2['theft_likelihood'] += row_1['crime_likelihood']
-    if (row_1['crime_type'] == 2): row_2['mischief_likelihood'] += row_1['crime_likelihood']
-    if (row_1['crime_type'] == 3): row_2['breakins_likelihood'] += row_1['crime_likelihood']
-    if (row_1['crime_type'] == 4): row_2['assault_likelihood'] += row_1['crime_likelihood']
-    if (row_1['crime_type'] == 5): row_2['other_likelihood'] += row_1['crime_likelihood']
-    
-for row in junctions:
-    row['observation_count'] = 0
-    row['theft_likelihood'] = 0
-    row['mischief_likelihood'] = 0
-    row['breakins_likelihood'] = 0
-    row['assault_likelihood'] = 0
-    row['other_likelihood'] = 0
-
-observations.match_lat_lng_custom(junctions, on_match=on_match, distance_limit=200)
-#observations.match_lat_lng(junctions, 'junction_id', 'junction_dst', count_field='observation_count', distance_limit=200)
+observations.match_lat_lng(junctions, 'junction_id', 'junction_dst', distance_limit=200)
 observations.filter(lambda row: row['junction_id'] != 0)
 print(f"Removed observations with no connections. Remaining {len(observations)} ({len(observations) / starting_observation_count:.0%})")
 
-for row in junctions:
-    c = row['observation_count']
-    if c == 0: continue
-    row['theft_likelihood'] /= c
-    row['mischief_likelihood'] /= c
-    row['breakins_likelihood'] /= c
-    row['assault_likelihood'] /= c
-    row['other_likelihood'] /= c
+# The likelihood of each type of crime is averaged over all the observations at the junction
+CRIME_TYPES = { 'theft': 1, 'mischief': 2, 'breakins': 3, 'assault': 4, 'other': 5 }
+likelihoods = observations.group_by('junction_id').agg({
+    'observation_count': agg.count(),
+    **{ f'{name}_likelihood': agg.sum_if('crime_likelihood', col('crime_type') == crime_type) for name, crime_type in CRIME_TYPES.items() }
+})
+likelihoods.convert_properties({
+    f'{name}_likelihood': col(f'{name}_likelihood') / col('observation_count') for name in CRIME_TYPES
+})
+junctions.join(likelihoods, on='id', fill=0)
 
 junctions.write_to_file(f'{OUTPUT_FOLDER}/junctions.csv')
+# A typed copy that analysis scripts can read a few columns of quickly
+if parquet_available():
+    junctions.write_to_file(f'{OUTPUT_FOLDER}/junctions.parquet')
 graffiti.write_to_file(f'{OUTPUT_FOLDER}/graffiti.csv')
 observations.write_to_file(f'{OUTPUT_FOLDER}/observations.csv')
\ No newline at end of file
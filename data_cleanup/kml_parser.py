@@ -1,25 +1,124 @@
+### Parses the SkyTrain network KML file into station and line coordinate rows
+### The file is parsed as a stream and each placemark is discarded once it has been processed, so large regional
+### transit KML files can be parsed without loading the whole document
+
 import xml.etree.ElementTree as ET
 import csv
 import re
 import sys
 
+from typing import Iterator
+
 sys.path.append("../")
+
+from data_wrangler import Dataset
+from data_wrangler.conversion_functions import Row
+
 # Define file paths
 kml_file = "data/original_data/Skytrain Network Map.kml"
 stations_csv = "data/stations.csv"
 lines_csv = "data/line_coordinates.csv"
 
-def parse_kml_to_csv(kml_file, stations_csv, lines_csv):
-    tree = ET.parse(kml_file)
-    root = tree.getroot()
-
-    # Detect namespace (if any)
-    namespace_match = re.match(r'\{.*\}', root.tag)
-    ns = {'kml': namespace_match.group(0)[1:-1]} if namespace_match else {}
+# Used to clean HTML tags from descriptions
+HTML_TAG = re.compile(r'<.*?>')
+
+# Grabs phrases ending with 'Line' before 'on Platforms' or the end of the description
+LINE_NAME = re.compile(r'([\w\s\-]+Line)(?=\s+on Platforms|$)')
+
+def _local_name(tag: str) -> str:
+    """Remove the namespace from a tag. eg: '{http://www.opengis.net/kml/2.2}Placemark' -> 'Placemark'"""
+    return tag.rsplit('}', 1)[-1]
+
+def station_line_names(description: str) -> list[str]:
+    """Get the names of the lines that serve a station from the station's description
+
+    Args:
+        description (str): The description of the station placemark
+
+    Returns:
+        list[str]: The line names. ['Unknown'] if no line names are found
+    """
+    clean_desc = HTML_TAG.sub('', description)
+
+    # The part before the first comma is the station name
+    line_description = clean_desc.split(',', 1)[1] if ',' in clean_desc else clean_desc
+
+    line_names = [line_name.strip() for line_name in LINE_NAME.findall(line_description)]
+    return line_names if line_names else ['Unknown']
+
+def iter_placemarks(kml_file: str) -> Iterator[tuple[str, str, str, list[tuple[str, str]]]]:
+    """Stream the placemarks of a KML file
+
+    Args:
+        kml_file (str): The path of the KML file
+
+    Yields:
+        tuple:
+            str: 'Point' or 'LineString'
+            str: The name of the placemark
+            str: The description of the placemark
+            list[tuple[str, str]]: The (longitude, latitude) coordinates of the placemark
+    """
+    # The elements that have started but not ended. Used to find the parent of an element so it can be removed.
+    open_elements = []
+    placemark_depth = 0
+
+    for event, elem in ET.iterparse(kml_file, events=('start', 'end')):
+        tag = _local_name(elem.tag)
+
+        if event == 'start':
+            open_elements.append(elem)
+            if tag == 'Placemark': placemark_depth += 1
+            continue
+
+        open_elements.pop()
+
+        if tag == 'Placemark':
+            placemark_depth -= 1
+            placemark = { _local_name(child.tag): child for child in elem }
+            name = placemark['name'].text if 'name' in placemark and placemark['name'].text else 'Unnamed'
+            description = (placemark['description'].text or '') if 'description' in placemark else ''
+
+            for kind in ('Point', 'LineString'):
+                if kind not in placemark: continue
+                coord_text = next((child.text for child in placemark[kind] if _local_name(child.tag) == 'coordinates'), None)
+                if coord_text:
+                    coordinates = [tuple(coord.split(',')[:2]) for coord in coord_text.split()]
+                    yield kind, name, description, coordinates   # type: ignore
+                break
+
+        # Discard everything that isn't part of a placemark still being read
+        if placemark_depth == 0 and open_elements:
+            open_elements[-1].remove(elem)
+
+def iter_kml_rows(kml_file: str) -> Iterator[tuple[str, Row]]:
+    """Stream the station and line coordinate rows of a KML file
+
+    Args:
+        kml_file (str): The path of the KML file
+
+    Yields:
+        tuple:
+            str: 'station' or 'line'
+            Row: A station row {name, line_name, longitude, latitude} or a line row {name, longitude, latitude}
+    """
+    for kind, name, description, coordinates in iter_placemarks(kml_file):
+        if kind == 'Point':
+            lon, lat = coordinates[0]
+            for line in station_line_names(description):
+                yield 'station', { 'name': name, 'line_name': line, 'longitude': lon, 'latitude': lat }
+        else:
+            for lon, lat in coordinates:
+                yield 'line', { 'name': name, 'longitude': lon, 'latitude': lat }
 
-    def findall(elem, path):
-        return elem.findall(path, ns) if ns else elem.findall(path)
+def parse_kml_to_csv(kml_file, stations_csv, lines_csv):
+    """Write the stations and line coordinates of a KML file to csv files as they are parsed
 
+    Args:
+        kml_file (str): The path of the KML file
+        stations_csv (str): The file to write the stations to
+        lines_csv (str): The file to write the line coordinates to
+    """
     with open(stations_csv, 'w', newline='', encoding='utf-8') as station_file, \
          open(lines_csv, 'w', newline='', encoding='utf-8') as line_file:
 
@@ -29,57 +128,29 @@ def parse_kml_to_csv(kml_file, stations_csv, lines_csv):
         station_writer.writerow(['id', 'line_name', 'longitude', 'latitude'])
         line_writer.writerow(['name', 'longitude', 'latitude'])
 
-        for folder in findall(root, './/kml:Folder' if ns else './/Folder'):
-            folder_name_elem = folder.find('kml:name', ns) if ns else folder.find('name')
-            folder_name = folder_name_elem.text if folder_name_elem is not None else 'Unknown'
-
-            for placemark in findall(folder, 'kml:Placemark' if ns else 'Placemark'):
-                name = placemark.findtext('kml:name', default='Unnamed', namespaces=ns)
-                description = placemark.findtext('kml:description', default='', namespaces=ns)
+        for kind, row in iter_kml_rows(kml_file):
+            if kind == 'station':
+                station_writer.writerow([row['name'], row['line_name'], row['longitude'], row['latitude']])
+            else:
+                line_writer.writerow([row['name'], row['longitude'], row['latitude']])
 
-                point = placemark.find('kml:Point', ns) if ns else placemark.find('Point')
-                linestring = placemark.find('kml:LineString', ns) if ns else placemark.find('LineString')
+def load_kml(kml_file: str) -> tuple[Dataset, Dataset]:
+    """Load the stations and line coordinates of a KML file directly into datasets
 
-                if point is not None:
-                    coord_text = point.findtext('kml:coordinates', namespaces=ns) if ns else point.findtext('coordinates')
-                    if coord_text:
-                        lon, lat, *_ = coord_text.strip().split(',')
+    Both datasets use a generated integer id as the primary key and have float latitudes and longitudes
 
-                        # Clean HTML tags from description
-                        clean_desc = re.sub(r'<.*?>', '', description)
+    Args:
+        kml_file (str): The path of the KML file
 
-                        # Try splitting station name and lines if there's a comma
-                        if ',' in clean_desc:
-                            try:
-                                station_name_part, line_description = clean_desc.split(',', 1)
-                            except ValueError:
-                                # fallback if split fails
-                                line_description = clean_desc
-                        else:
-                            line_description = clean_desc
-
-                        # Extract line names with regex: grab phrases ending with 'Line' before 'on Platforms' or EOL
-                        line_names = re.findall(r'([\w\s\-]+Line)(?=\s+on Platforms|$)', line_description)
-
-                        # Clean whitespace
-                        line_names = [ln.strip() for ln in line_names]
-
-                        # Fallback if no line names found
-                        if not line_names:
-                            line_names = ['Unknown']
-
-                        for line in line_names:
-                            station_writer.writerow([name, line, lon, lat])
-
-
-                elif linestring is not None :
-                    coord_text = linestring.findtext('kml:coordinates', namespaces=ns) if ns else linestring.findtext('coordinates')
-                    if coord_text:
-                        coords = coord_text.strip().split()
-                        for coord in coords:
-                            lon, lat, *_ = coord.strip().split(',')
-                            line_writer.writerow([name, lon, lat])
+    Returns:
+        tuple[Dataset, Dataset]: The stations and the line coordinates
+    """
+    stations, lines = [], []
+    for kind, row in iter_kml_rows(kml_file):
+        rows = stations if kind == 'station' else lines
+        rows.append({ 'id': len(rows), **row, 'longitude': float(row['longitude']), 'latitude': float(row['latitude']) })
+    return Dataset(stations), Dataset(lines)
 
 # Run the conversion
-parse_kml_to_csv(kml_file, stations_csv, lines_csv)
-
+if __name__ == "__main__":
+    parse_kml_to_csv(kml_file, stations_csv, lines_csv)
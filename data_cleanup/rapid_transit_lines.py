@@ -0,0 +1,87 @@
+### Builds the ordered coordinates of each rapid transit line from the Burnaby and Vancouver open data line files
+### The files split each line into many pieces in no particular order or direction. Pieces that share endpoints are
+### chained together and the chains are then joined into one sequence per line.
+
+import sys
+sys.path.append('../') # This should probably be changed to a more sofisticated system at some point. i.e. install the package
+
+import csv
+import json
+
+from collections import defaultdict
+
+from data_wrangler.polylines import Polyline
+from data_wrangler.polylines import stitch_polylines
+from data_wrangler.polylines import join_polylines
+from data_wrangler.profiling import profile_if_requested
+
+INPUT_FOLDER = '../data/cleaned_data/rapid-transit-lines'
+OUTPUT_FOLDER = '../data/cleaned_data'
+
+BURNABY_LINES = f'{INPUT_FOLDER}/burnaby.json'
+VANCOUVER_LINES = f'{INPUT_FOLDER}/vancouver.json'
+
+# Endpoints within about a metre of each other are treated as the same point
+SNAP_TOLERANCE = 1e-5
+
+def line_name(raw_name: str) -> str:
+    """Normalize the name of a line. eg: 'EXPO LINE' -> 'Expo Line'"""
+    return raw_name.strip().lower().title()
+
+def read_burnaby_lines(filename: str) -> dict[str, list[list]]:
+    """Read the line pieces of a GeoJSON feature collection where the line name is the NAME property"""
+    with open(filename, 'r', encoding='utf-8') as file:
+        features = json.load(file)['features']
+
+    pieces = defaultdict(list)
+    for feature in features:
+        if feature['geometry']['type'] == 'LineString':
+            pieces[line_name(feature['properties']['NAME'])].append(feature['geometry']['coordinates'])
+        elif feature['geometry']['type'] == 'MultiLineString':
+            pieces[line_name(feature['properties']['NAME'])].extend(feature['geometry']['coordinates'])
+    return pieces
+
+def read_vancouver_lines(filename: str) -> dict[str, list[list]]:
+    """Read the line pieces of a list of {line, geom} records where geom is a GeoJSON feature"""
+    with open(filename, 'r', encoding='utf-8') as file:
+        records = json.load(file)
+
+    pieces = defaultdict(list)
+    for record in records:
+        geometry = record['geom']['geometry']
+        if geometry['type'] == 'LineString':
+            pieces[line_name(record['line'])].append(geometry['coordinates'])
+        elif geometry['type'] == 'MultiLineString':
+            pieces[line_name(record['line'])].extend(geometry['coordinates'])
+    return pieces
+
+def assemble_lines(*line_pieces: dict[str, list[list]], tolerance: float = SNAP_TOLERANCE) -> dict[str, Polyline]:
+    """Combine the pieces of each line from any number of sources into one ordered sequence of (longitude, latitude) coordinates
+
+    Args:
+        *line_pieces (dict[str, list[list]]): The pieces of each line, keyed by line name
+        tolerance (float, optional): The distance within which piece endpoints are snapped together. Defaults to SNAP_TOLERANCE.
+
+    Returns:
+        dict[str, Polyline]: The coordinates of each line
+    """
+    pieces = defaultdict(list)
+    for source in line_pieces:
+        for name, source_pieces in source.items():
+            pieces[name].extend(source_pieces)
+
+    return { name: join_polylines(stitch_polylines(line, tolerance)) for name, line in pieces.items() }
+
+def write_lines(lines: dict[str, Polyline], filename: str):
+    with open(filename, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(['line_name', 'longitude', 'latitude'])
+        for name, coordinates in lines.items():
+            writer.writerows((name, longitude, latitude) for longitude, latitude in coordinates)
+
+if __name__ == "__main__":
+    profile_if_requested()
+    lines = assemble_lines(read_burnaby_lines(BURNABY_LINES), read_vancouver_lines(VANCOUVER_LINES))
+    for name, coordinates in lines.items():
+        print(f"{name}: {len(coordinates)} points")
+    write_lines(lines, f'{OUTPUT_FOLDER}/rapid_transit_lines.csv')
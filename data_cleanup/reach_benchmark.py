@@ -0,0 +1,303 @@
+### Benchmarks the reach calculation and checks that it gives the right answers
+### Builds grid and radial street networks of increasing size, and uses the real junctions in data/cleaned_data, then times each
+### reach implementation (see IMPLEMENTATIONS) at each distance limit and compares every reach column with a plain reference implementation.
+### Reports how the run time grows with the number of junctions and the limit, to estimate how long larger regions will take.
+### Exits with an error if any implementation gives different reaches.
+###
+###     python reach_benchmark.py --sizes 1000 10000 100000 --limits 500 1000 --project 60000
+
+import sys
+sys.path.append('../') # This should probably be changed to a more sofisticated system at some point. i.e. install the package
+
+import os
+import json
+import math
+import random
+import pickle
+import argparse
+
+from heapq import heappush, heappop
+from contextlib import redirect_stdout
+
+import numpy as np
+
+from data_wrangler import Dataset
+from data_wrangler.bench import Benchmark
+from data_wrangler.bench import environment
+
+from data_wrangler.reach import DEFAULT_REACHES
+from data_wrangler.reach import load_junction_graph
+from data_wrangler.reach import calculate_reaches
+
+REAL_JUNCTIONS = '../data/cleaned_data/junctions.csv'
+
+# The length of a block in metres
+BLOCK = 100
+
+WEIGHT_COLUMNS = [reach.column for reach in DEFAULT_REACHES]
+
+def add_weights(rows, rng):
+    """Give junctions random counts, like the counts of crimes, stores, etc. matched to real junctions"""
+    for row in rows:
+        row['crime_count'] = rng.choice((0, 0, 0, 1, 2, 5, 12))
+        row['stores_count'] = rng.choice((0, 0, 0, 0, 1, 3))
+        row['transit_count'] = rng.choice((0, 0, 0, 1, 2))
+        row['rapid_transit_count'] = int(rng.random() < 0.01)
+        row['schools_count'] = int(rng.random() < 0.02)
+        row['retail_count'] = rng.choice((0, 0, 0, 0, 1, 4))
+
+    # Every column needs a weight somewhere or normalizing divides by zero
+    for column in WEIGHT_COLUMNS:
+        if not any(row[column] for row in rows):
+            rows[rng.randrange(len(rows))][column] = 1
+
+def _connect(rows, positions, i, j, street_id):
+    length = round(math.dist(positions[i], positions[j]), 7)
+    rows[i]['neighbors'].append((j, length, street_id))
+    rows[j]['neighbors'].append((i, length, street_id))
+
+def grid_graph(junction_count, seed=0):
+    """A square grid of blocks with slightly uneven block lengths
+
+    Args:
+        junction_count (int): The number of junctions
+        seed (int, optional): The random seed. Defaults to 0.
+
+    Returns:
+        Dataset: The junctions with neighbors and counts in the format of the cleaned data
+    """
+    rng = random.Random(seed)
+    side = math.ceil(math.sqrt(junction_count))
+    positions = [((i % side + rng.uniform(-0.2, 0.2)) * BLOCK, (i // side + rng.uniform(-0.2, 0.2)) * BLOCK) for i in range(junction_count)]
+    rows = [{ 'id': i, 'neighbors': [] } for i in range(junction_count)]
+
+    street_id = 0
+    for i in range(junction_count):
+        for j in (i + 1 if (i + 1) % side else None, i + side):
+            if j is not None and j < junction_count:
+                _connect(rows, positions, i, j, street_id)
+                street_id += 1
+
+    add_weights(rows, rng)
+    return Dataset(rows)
+
+def radial_graph(junction_count, seed=0):
+    """Rings of junctions around a centre joined by spokes, like a city that grew out from a downtown
+
+    Ring k has 6k junctions one block apart and each junction is joined to the closest junction of the ring inside it.
+
+    Args:
+        junction_count (int): The number of junctions
+        seed (int, optional): The random seed. Defaults to 0.
+
+    Returns:
+        Dataset: The junctions with neighbors and counts in the format of the cleaned data
+    """
+    rng = random.Random(seed)
+    positions = [(0.0, 0.0)]
+    rings = [[0]]
+    ring = 1
+    while len(positions) < junction_count:
+        count = min(6 * ring, junction_count - len(positions))
+        rings.append(list(range(len(positions), len(positions) + count)))
+        for k in range(count):
+            angle = 2 * math.pi * k / (6 * ring)
+            positions.append((ring * BLOCK * math.cos(angle), ring * BLOCK * math.sin(angle)))
+        ring += 1
+
+    rows = [{ 'id': i, 'neighbors': [] } for i in range(len(positions))]
+    street_id = 0
+    for ring, members in enumerate(rings[1:], start=1):
+        for k, i in enumerate(members):
+            # Around the ring
+            if k + 1 < len(members) or len(members) == 6 * ring:
+                _connect(rows, positions, i, members[(k + 1) % len(members)], street_id)
+                street_id += 1
+            # In towards the centre
+            inner = rings[ring - 1]
+            j = inner[min(len(inner) - 1, round(k * len(inner) / (6 * ring))) if ring > 1 else 0]
+            _connect(rows, positions, i, j, street_id)
+            street_id += 1
+
+    add_weights(rows, rng)
+    return Dataset(rows)
+
+def reference_reaches(junctions, reaches, limit):
+    """The reaches found the simplest way: the shortest distance from each junction to every junction within the limit, then a
+    weighted sum over those junctions, normalized by the largest reach
+
+    Args:
+        junctions (Dataset): The junctions with parsed neighbors
+        reaches (list[Reach]): The reaches to calculate
+        limit (float): The largest distance counted
+
+    Returns:
+        dict[str, np.ndarray]: Each reach column in the order of the junctions
+    """
+    graph = { junction['id']: [(neighbor, length) for neighbor, length, _ in junction['neighbors']] for junction in junctions }
+    weights = { reach.name: { junction['id']: junction[reach.column] for junction in junctions } for reach in reaches }
+
+    totals = { reach.name: np.zeros(len(junctions)) for reach in reaches }
+    for index, junction in enumerate(junctions):
+        distances = { junction['id']: 0.0 }
+        done = set()
+        queue = [(0.0, junction['id'])]
+        while queue:
+            distance, node = heappop(queue)
+            if node in done: continue
+            done.add(node)
+            for neighbor, length in graph[node]:
+                total = distance + length
+                if total <= limit and total < distances.get(neighbor, math.inf):
+                    distances[neighbor] = total
+                    heappush(queue, (total, neighbor))
+
+        for reach in reaches:
+            totals[reach.name][index] = sum(weights[reach.name][node] * reach.weight(distance) for node, distance in distances.items())
+
+    return { key: values / values.max() for key, values in totals.items() }
+
+def mean_visited(junctions, limit, sample=200, seed=0):
+    """The average number of junctions within the limit of a junction, from a sample of junctions"""
+    graph = { junction['id']: junction['neighbors'] for junction in junctions }
+    sources = random.Random(seed).sample(list(graph), min(sample, len(graph)))
+    total = 0
+    for source in sources:
+        distances = { source: 0.0 }
+        queue = [(0.0, source)]
+        while queue:
+            distance, node = heappop(queue)
+            if distance > distances[node]: continue
+            for neighbor, length, _ in graph[node]:
+                if distance + length <= limit and distance + length < distances.get(neighbor, math.inf):
+                    distances[neighbor] = distance + length
+                    heappush(queue, (distance + length, neighbor))
+        total += len(distances)
+    return total / len(sources)
+
+# Each implementation fills in the normalized reach columns of the junctions it is given
+IMPLEMENTATIONS = {
+    'reach': lambda junctions, limit: calculate_reaches(junctions, DEFAULT_REACHES, limit),
+}
+
+def compare_columns(expected, actual, tolerance):
+    """The largest difference of each reach column and whether all of them are within the tolerance"""
+    differences = { key: float(np.max(np.abs(actual[key] - expected[key]), initial=0)) for key in expected }
+    return differences, all(difference <= tolerance for difference in differences.values())
+
+def run_case(graph_name, junctions, limit, implementations, repeat, tolerance, check):
+    """Time every implementation on one graph and limit and check their reaches
+
+    Returns:
+        list[dict]: The result of each implementation
+    """
+    state = pickle.dumps(junctions)
+
+    expected = reference_reaches(junctions, DEFAULT_REACHES, limit) if check else None
+    visited = mean_visited(junctions, limit)
+
+    results = []
+    for name in implementations:
+        outputs = []
+        def run(data, name=name):
+            # The progress of the calculation would be mixed into the JSON report
+            with redirect_stdout(sys.stderr):
+                IMPLEMENTATIONS[name](data, limit)
+            outputs.append(data)
+
+        result = Benchmark(name, graph_name, run, len(junctions), lambda: pickle.loads(state), limit=limit, mean_visited=visited).measure(repeat, memory=False)
+        reaches = { key: np.array([junction[key] for junction in outputs[-1]]) for key in (reach.name for reach in DEFAULT_REACHES) }
+
+        # Without a reference the first implementation is the reference
+        if expected is None:
+            expected = reaches
+            result['matches'] = None
+        else:
+            result['max_difference'], result['matches'] = compare_columns(expected, reaches, tolerance)
+
+        result['seconds_per_junction'] = result['best_seconds'] / len(junctions)
+        results.append(result)
+        status = { None: 'reference', True: 'ok', False: 'MISMATCH' }[result['matches']]
+        print(f"{graph_name:>7} {len(junctions):>8} junctions  limit {limit:>6}  {name:<8} {result['best_seconds']:>9.3f}s  {status}", file=sys.stderr)
+    return results
+
+def fit_scaling(results):
+    """Fit time = a * junctions^b for each implementation, graph type and limit, and time = a * limit^b for each size"""
+    def fit(xs, ys):
+        if len(xs) < 2 or min(xs) <= 0 or min(ys) <= 0: return None
+        slope, intercept = np.polyfit(np.log(xs), np.log(ys), 1)
+        return { 'exponent': float(slope), 'coefficient': float(math.exp(intercept)) }
+
+    by_size, by_limit = {}, {}
+    for result in results:
+        if result['dataset'] == 'real' or math.isinf(result['limit']): continue
+        by_size.setdefault((result['name'], result['dataset'], result['limit']), []).append((result['rows'], result['best_seconds']))
+        by_limit.setdefault((result['name'], result['dataset'], result['rows']), []).append((result['limit'], result['best_seconds']))
+
+    return {
+        'junctions': [
+            { 'implementation': name, 'graph': graph, 'limit': limit, **(fit(*zip(*points)) or {}) }
+            for (name, graph, limit), points in by_size.items() if len(points) > 1
+        ],
+        'limit': [
+            { 'implementation': name, 'graph': graph, 'junctions': size, **(fit(*zip(*points)) or {}) }
+            for (name, graph, size), points in by_limit.items() if len(points) > 1
+        ]
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the reach calculation and check its results")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 5000], help="The numbers of junctions of the synthetic graphs. eg: 1000 10000 200000")
+    parser.add_argument('--limits', type=float, nargs='+', default=[500, 1000], help="The distance limits in metres. inf for no limit")
+    parser.add_argument('--graphs', nargs='+', default=['grid', 'radial'], choices=['grid', 'radial'])
+    parser.add_argument('--implementations', nargs='+', default=list(IMPLEMENTATIONS), choices=list(IMPLEMENTATIONS))
+    parser.add_argument('--real', default=REAL_JUNCTIONS, help="The real junctions. Skipped if the file doesn't exist")
+    parser.add_argument('--no-real', action='store_true')
+    parser.add_argument('--repeat', type=int, default=1, help="The number of timed runs of each implementation")
+    parser.add_argument('--tolerance', type=float, default=1e-9, help="The largest allowed difference of a normalized reach from the reference")
+    parser.add_argument('--reference-limit', type=int, default=20000, help="Graphs with more junctions are checked against the first implementation instead of the slower reference")
+    parser.add_argument('--project', type=int, nargs='*', default=[], help="Estimate the run time for these numbers of junctions from the fitted scaling")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="Write the JSON report to this file instead of printing it")
+    args = parser.parse_args()
+
+    graphs = []
+    for size in args.sizes:
+        if 'grid' in args.graphs: graphs.append(('grid', grid_graph(size, args.seed)))
+        if 'radial' in args.graphs: graphs.append(('radial', radial_graph(size, args.seed)))
+    if not args.no_real and os.path.exists(args.real):
+        graphs.append(('real', load_junction_graph(args.real, DEFAULT_REACHES)))
+
+    results = []
+    for graph_name, junctions in graphs:
+        for limit in args.limits:
+            results += run_case(graph_name, junctions, limit, args.implementations, args.repeat, args.tolerance, len(junctions) <= args.reference_limit)
+
+    scaling = fit_scaling(results)
+    projections = [
+        { **fit, 'projected_junctions': count, 'projected_seconds': fit['coefficient'] * count ** fit['exponent'] }
+        for fit in scaling['junctions'] if 'exponent' in fit for count in args.project
+    ]
+
+    print(f"\n{'implementation':<15} {'graph':<7} {'limit':>6} {'exponent':>9}  seconds per 1000 junctions at the largest size", file=sys.stderr)
+    for fit in scaling['junctions']:
+        if 'exponent' not in fit: continue
+        largest = max((result for result in results if (result['name'], result['dataset'], result['limit']) == (fit['implementation'], fit['graph'], fit['limit'])), key=lambda result: result['rows'])
+        print(f"{fit['implementation']:<15} {fit['graph']:<7} {fit['limit']:>6} {fit['exponent']:>9.2f}  {largest['seconds_per_junction'] * 1000:.3f}", file=sys.stderr)
+    for projection in projections:
+        print(f"{projection['implementation']} on a {projection['graph']} graph with {projection['projected_junctions']} junctions and limit {projection['limit']}: about {projection['projected_seconds']:.0f}s", file=sys.stderr)
+
+    report = { 'environment': environment(), 'arguments': vars(args), 'results': results, 'scaling': scaling, 'projections': projections }
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    mismatches = [result for result in results if result['matches'] is False]
+    if mismatches:
+        print(f"{len(mismatches)} runs gave different reaches than the reference", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
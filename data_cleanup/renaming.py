@@ -4,16 +4,19 @@ import sys
 sys.path.append('../') # This should probably be changed to a more sofisticated system at some point. i.e. install the package
 
 import os
-import utm
+from glob import glob
 
 from data_wrangler import Dataset
 from data_wrangler.conversion_functions import RowFunction
 from data_wrangler.conversion_functions import generate_id
-from data_wrangler.conversion_functions import create_regular_str
 from data_wrangler.conversion_functions import split_latitude, split_longitude
+from data_wrangler.profiling import profile_if_requested
 
-ZONE_NUMBER = 10
-ZONE_LETTER = 'U'
+from crime_ingest import ingest_crimes
+from crime_ingest import CRIME_FILE_PATTERN
+
+if __name__ == "__main__":
+    profile_if_requested()
 
 INPUT_FOLDER = '../data/original_data'
 OUTPUT_FOLDER = '../data/pre_processed_data'
@@ -21,11 +24,9 @@ OUTPUT_FOLDER = '../data/pre_processed_data'
 JUNCTION_FILE = f'{INPUT_FOLDER}/junctions.csv'
 SEGMENT_FILE = f'{INPUT_FOLDER}/streetsegments.csv'
 TRANSIT_FILE = f'{INPUT_FOLDER}/transitstops.csv'
-RAPID_TRANSIT_FILE = f'{INPUT_FOLDER}/rapid-transit-stations.csv'
+RAPID_TRANSIT_FILE = f'{INPUT_FOLDER}/rapid-transit-stations/vancouver_stations.csv'
 COMMERCIAL_FILE = f'{INPUT_FOLDER}/storefronts-inventory.csv'
 SCHOOL_FILE = f'{INPUT_FOLDER}/schools.csv'
-CRIME_2022 = f'{INPUT_FOLDER}/crime_2022.csv'
-CRIME_2021 = f'{INPUT_FOLDER}/crime_2021.csv'
 
 
 if not os.path.exists(OUTPUT_FOLDER):
@@ -70,8 +71,6 @@ Dataset.load_file(
         'traffic_10_16_avg': (str, "Avg_ALL10_16"),
         'traffic_17_18_avg': (str, "Avg_ALL17_18"),
         'length_metres': (float, "Shape_Length"),
-        'latitude': float,
-        'longitude': float,
         
         # Converting land uses to a list
         'land_uses': (lambda v: list(str.split(v, ', ')), "Landuse"),
@@ -151,29 +150,6 @@ Dataset.load_file(
 ).write_to_file(f'{OUTPUT_FOLDER}/schools.csv')
 
 print("Pre-processing Crimes")
-crime_conversion_props = {
-    # Generating id because crime doesn't have id already
-    'id': generate_id,
-    'type_of_crime': (str, 'TYPE'),
-    
-    # Creating a date field in format yyyy-mm-dd
-    'date_of_crime': RowFunction(lambda row, i: f"{row['YEAR']}-{create_regular_str(row['MONTH'])}-{create_regular_str(row['DAY'])}"),
-    
-    # Creating a time field in the format HH:MM
-    'time_of_crime': RowFunction(lambda row, i: f"{create_regular_str(row['HOUR'])}:{create_regular_str(row['MINUTE'])}"),
-    'hundred_block': (str, 'HUNDRED_BLOCK'),
-    
-    # Determining latitude and longitude from utm location
-    'latitude': RowFunction(lambda row, i: utm.to_latlon(float(row["X"]), float(row["Y"]), ZONE_NUMBER, ZONE_LETTER)[0] if row["X"] and row["Y"] and (float(row["X"]) or float(row["Y"])) else 0),
-    'longitude': RowFunction(lambda row, i: utm.to_latlon(float(row["X"]), float(row["Y"]), ZONE_NUMBER, ZONE_LETTER)[1] if row["X"] and row["Y"] and (float(row["X"]) or float(row["Y"])) else 0),
-}
-
-crime_2022 = Dataset.load_file(CRIME_2022, crime_conversion_props)
-crime_2021 = Dataset.load_file(CRIME_2021, crime_conversion_props)
-
-# Modify the crime 2021 ID values
-crime_2021_id_start = len(crime_2022)
-crime_2021.convert_property('id', lambda id: id + crime_2021_id_start)
-
-crime_2022.merge(crime_2021)
-crime_2022.write_to_file(f'{OUTPUT_FOLDER}/crimes.csv')
\ No newline at end of file
+# Every yearly crime file in the input folder is combined. Files that were already added in a previous run are not reprocessed.
+crime_files = sorted(glob(f'{INPUT_FOLDER}/{CRIME_FILE_PATTERN}'))
+ingest_crimes(crime_files, f'{OUTPUT_FOLDER}/crimes.csv')
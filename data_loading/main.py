@@ -1,26 +1,32 @@
 import sys
 import os
 import json
+import argparse
 from collections import defaultdict
-import math
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 import utm
 from neo4j import GraphDatabase
 from time import perf_counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 from data_wrangler import Dataset
 from data_wrangler import Category
 from data_wrangler import Relationship
 from data_wrangler import GraphWriter
-
-from ast import literal_eval
+from data_wrangler import Checkpoint
+from data_wrangler.expression import col
+from data_wrangler.list_literals import parse_tuple_lists
 
 from data_wrangler.conversion_functions import convert_if_not_null
 from data_wrangler.relationship_property_matchers import first_set_prop_match
 from data_wrangler.relationship_property_matchers import match_props
 from data_wrangler.conversion_functions import split_latitude, split_longitude
+from data_wrangler.polylines import stitch_polylines, join_polylines
+from data_wrangler.elevation import segment_slope
+from data_wrangler.instrumentation import stage, instrumentation, format_duration
+from data_wrangler.profiling import profile_if_requested
 
 
 # Change this to point to the directory of your database information
@@ -41,12 +47,30 @@ GRAFFITI_FILE = f'{INPUT_FOLDER}/graffiti.csv'
 OBSERVATIONS_FILE = f'{INPUT_FOLDER}/observations.csv'
 RAPID_TRANSIT_LINES = f'{INPUT_FOLDER}/rapid_transit_lines.csv'
 
+# Records which batches have been committed so an interrupted load can be resumed with --resume
+CHECKPOINT_FILE = 'load_checkpoint.json'
+
+# The time, CPU time, rows and peak memory of each stage of the last load
+REPORT_FILE = 'load_report.json'
+
 ZONE_NUMBER = 10
 ZONE_LETTER = 'U'
 
 ## Main Program ##
 
 def main():
+    parser = argparse.ArgumentParser(description="Load the cleaned data into the Neo4j database")
+    parser.add_argument(
+        '--resume', action='store_true',
+        help=(
+            f"Continue an interrupted load from the last committed batch instead of clearing the database. Batches are recorded in "
+            f"{CHECKPOINT_FILE} and, in the same transaction as each batch, in LoadCheckpoint nodes, so no batch is written twice"
+        )
+    )
+    parser.add_argument('--workers', type=int, default=None, help="The number of processes used to parse the files. Defaults to the number of processors.")
+    parser.add_argument('--report', default=REPORT_FILE, help=f"Where to write the time and memory used by each stage. Defaults to {REPORT_FILE}")
+    args = parser.parse_args()
+    
     driver = create_driver()
     if not driver: return
     
@@ -54,12 +78,16 @@ def main():
         if not session: return
         
         start_time = perf_counter()
-        load_data(session)
+        with stage('load_data'):
+            load_data(session, resume=args.resume, workers=args.workers)
         end_time = perf_counter()
         
     driver.close()
     elapsed_time = end_time - start_time
-    print(f"Completed in {(elapsed_time / 60):.0f}:{(elapsed_time % 60):.0f} minutes")
+    print()
+    print(instrumentation().summary_table())
+    instrumentation().write_report(args.report)
+    print(f"Completed in {format_duration(elapsed_time)} minutes")
 
 ## Database Setup ##
 
@@ -129,18 +157,24 @@ def load_junctions():
             'rapid_transit_count': int,
             'retail_count': int,
             'rapid_transit_count': int,
-            'neighbor_ids': (lambda v: [n[0] for n in literal_eval(v if v else '[]')], 'neighbors'),
-            'street_ids': (lambda v: [n[2] for n in literal_eval(v if v else '[]')], 'neighbors'),
+            'neighbors': str,
             'crime_reach': float,
             'store_reach': float,
             'transit_reach': float,
             'rapid_transit_reach': float,
             'schools_reach': float,
             'retail_reach': float,
-            'elevation': float
+            'elevation': lambda v: convert_if_not_null(v, on_null=None)
         }
     )
     
+    # The neighbors are (junction id, distance, street id). Parse them once for both ids
+    neighbors = parse_tuple_lists(junction['neighbors'] for junction in junctionData)
+    for junction, neighbor_ids, street_ids in zip(junctionData, neighbors.lists(0), neighbors.lists(2)):
+        junction['neighbor_ids'] = neighbor_ids
+        junction['street_ids'] = street_ids
+    junctionData.drop('neighbors')
+    
     junctions = Category(
         "Junction",
         junctionData,
@@ -199,10 +233,14 @@ def load_segments():
             'length_metres': float,
             'latitude': float,
             'longitude': float,
-            'land_uses': literal_eval,
-            'neighbors': literal_eval
+            'land_uses': str,
+            'neighbors': str
         }
     )
+    segmentData.convert_properties({
+        'land_uses': col('land_uses').parse_list(),
+        'neighbors': col('neighbors').parse_list()
+    })
     
     print("Loaded Segments")
     
@@ -560,42 +598,10 @@ def load_rapid_transit_lines(session):
 
     print("finished loading rapid transit lines")
 
-def distance(p1, p2):
-    return math.sqrt((p1[0] - p2[0])**2 + (p1[1] - p2[1])**2)
-
 def merge_segments(segments):
-    """Greedily merges a list of coordinate lists into one continuous list. This still needs work. Currently trying to get it to work for the burnaby line data"""
-    if not segments:
-        return []
-
-    merged = segments.pop(0)
-
-    while segments:
-        best_idx = -1
-        best_reverse = False
-        best_dist = float('inf')
-
-        for i, s in enumerate(segments):
-            d1 = distance(merged[-1], s[0])
-            d2 = distance(merged[-1], s[-1])
-            if d1 < best_dist:
-                best_idx = i
-                best_dist = d1
-                best_reverse = False
-            if d2 < best_dist:
-                best_idx = i
-                best_dist = d2
-                best_reverse = True
-
-        chosen = segments.pop(best_idx)
-        if best_reverse:
-            chosen.reverse()
-        if distance(merged[-1], chosen[0]) < 1e-6:
-            merged.extend(chosen[1:])
-        else:
-            merged.extend(chosen)
-
-    return merged
+    """Merges a list of coordinate lists into one continuous list. Pieces that share endpoints are chained first and the
+    resulting polylines are then joined end to end"""
+    return join_polylines(stitch_polylines(segments))
 
 def create_relationships(junctions, segments, transit, crimes, stores, rtransit, schools, businesses, graffiti, observations):
     def junction_prop_matcher(j1, j2):
@@ -628,7 +634,7 @@ def create_relationships(junctions, segments, transit, crimes, stores, rtransit,
                 'longitude',
                 'land_uses'
             ]
-        )
+        ) | { 'slope': segment_slope(j1['elevation'], j2['elevation'], segment['length_metres']) }
         
     connects_to = Relationship(
         'CONNECTS_TO', junctions, junctions, 'neighbor_ids',
@@ -690,62 +696,97 @@ def create_relationships(junctions, segments, transit, crimes, stores, rtransit,
     
     return relationships
 
-def load_data(session, upload_relationships = False):
+# The loaders for each of the categories. They are independent so they can be run at the same time in separate processes.
+CATEGORY_LOADERS = [
+    load_junctions,
+    load_transit,
+    load_crimes,
+    load_stores,
+    load_rapid_transit,
+    load_schools,
+    load_businesses,
+    #load_trees,
+    load_graffiti,
+    load_observations
+]
+
+def run_loader(loader):
+    """Run a loader in a worker process and return what it loaded with the stages it recorded, which are otherwise lost with the process"""
+    # Forked workers start with the stages of the main process
+    instrumentation().clear()
+    with stage(f'parse:{loader.__name__}'):
+        result = loader()
+    return result, instrumentation().report()['stages']
+
+def load_data(session, upload_relationships = False, resume = False, workers = None, checkpoint_file = CHECKPOINT_FILE):
+    """ Load all the data into the database
+    
+    The files are parsed in a process pool. Each category is written as soon as it has been parsed so the database writes
+    overlap with parsing the remaining files.
     
-    # This makes it easer to only load some of the data without having to modify too much code
-    junctions = transit = crimes = stores = rtransit = schools = businesses = None
+    Parameters:
+        session - Session: The database session to write with
+        upload_relationships - bool: Whether or not the relationships should be written
+        resume - bool: Continue from the batches recorded in the checkpoint file instead of clearing the database
+        workers - int: The number of processes used for parsing. Defaults to the number of processors.
+        checkpoint_file - String: Where to record the committed batches. Defaults to CHECKPOINT_FILE.
+    """
     
     print("Loading Data")
-    junction_data, junctions = load_junctions()
-    segment_data = load_segments()
-    transit_data, transit = load_transit()
-    crime_data, crimes = load_crimes()
-    stores_data, stores = load_stores()
-    rtransit_data, rtransit = load_rapid_transit()
-    schools_data, schools = load_schools()
-    businesses_data, businesses = load_businesses()
-    #trees_data, trees = load_trees()
-    graffiti_data, graffiti = load_graffiti()
-    observation_data, observations = load_observations()
-    
-    
-    
-    categories = [
-        junctions,
-        transit,
-        crimes,
-        stores,
-        rtransit,
-        schools,
-        businesses,
-        #trees,
-        graffiti,
-        observations
-    ]
-             
-    print("Writing Data")
-    writer = GraphWriter(session)
-    writer.clear_all()
-    load_rapid_transit_lines(session)
-    print()
-    print("-- Writing Categories --")
-    for category in categories:
-        writer.clear_category(category)
-        writer.write_category(category)
-        print(f"Wrote {category.name}")
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Datasets are pickled column by column when they are sent back from the workers (see Dataset.__getstate__)
+        category_futures = { executor.submit(run_loader, loader): loader for loader in CATEGORY_LOADERS }
+        segment_future = executor.submit(run_loader, load_segments)
+        
+        print("Writing Data")
+        checkpoint = Checkpoint(checkpoint_file)
+        if resume:
+            print(f"Resuming from {checkpoint_file}")
+        else:
+            checkpoint.clear()
+        
+        writer = GraphWriter(session, checkpoint)
+        if not resume:
+            writer.clear_all()
+        
+        if not checkpoint.is_done('rapid_transit_lines'):
+            load_rapid_transit_lines(session)
+            checkpoint.mark_done('rapid_transit_lines')
+        print()
+        print("-- Writing Categories --")
+        
+        # Write each category as soon as it has been parsed
+        loaded = {}
+        for future in as_completed(category_futures):
+            (data, category), stages = future.result()
+            instrumentation().merge(stages)
+            loaded[category_futures[future]] = category
+            
+            if not resume:
+                writer.clear_category(category)
+            writer.write_category(category)
+            print(f"Wrote {category.name}")
+        
+        segment_data, stages = segment_future.result()
+        instrumentation().merge(stages)
     
     if upload_relationships:
         print()
         print("-- Writing Relationships --")
-        relationships = create_relationships(
-            junctions, segment_data, transit, crimes, stores, rtransit, schools, businesses, graffiti, observations
-        )
+        with stage('create_relationships'):
+            relationships = create_relationships(
+                loaded[load_junctions], segment_data, loaded[load_transit], loaded[load_crimes], loaded[load_stores], loaded[load_rapid_transit],
+                loaded[load_schools], loaded[load_businesses], loaded[load_graffiti], loaded[load_observations]
+            )
         for relation in relationships:
             writer.write_relation(relation)
     
+    # Only an interrupted load needs to know which batches were committed
+    writer.clear_checkpoints()
     print()
     print("Writing Data Completed")
     
 # Start the program
 if __name__ == "__main__":
+    profile_if_requested()
     main()
\ No newline at end of file
@@ -0,0 +1,127 @@
+"""Benchmarks writing the cleaned data to Neo4j
+
+Runs load_data end to end with a RecordingSession in place of the database and reports the batches, statements and bytes sent
+for each category and relationship, so changes to GraphWriter can be measured without the cloud database. With --neo4j the same
+load is also run against a local database, eg: one started with
+
+    docker run -p 7687:7687 -e NEO4J_AUTH=neo4j/password neo4j
+
+Run it from the project root:
+
+    python -m data_loading.write_benchmark --relationships --output writes.json
+    python -m data_loading.write_benchmark --neo4j --password password
+
+The local database is cleared before it is written to.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+from contextlib import redirect_stdout
+
+from neo4j import GraphDatabase
+from neo4j.exceptions import ServiceUnavailable, AuthError
+
+from data_wrangler.bench import environment
+from data_wrangler.recording_session import RecordingSession
+
+from . import main as loader
+
+LOCAL_NEO4J = 'bolt://localhost:7687'
+
+def run_load(session, upload_relationships, workers):
+    """Run load_data with a RecordingSession and report what was written
+
+    Args:
+        session (Session | None): The neo4j session to write to, or None to only record the queries
+        upload_relationships (bool): Whether the relationships are written
+        workers (int | None): The number of processes used to parse the files
+
+    Returns:
+        dict: The time taken, the totals of all the queries and the totals of each category and relationship
+    """
+    recording = RecordingSession(session)
+    with tempfile.TemporaryDirectory() as folder:
+        # The checkpoint of a real load is left alone
+        checkpoint_file = os.path.join(folder, 'checkpoint.json')
+
+        # load_data prints its progress, which would be mixed into the JSON
+        with redirect_stdout(sys.stderr):
+            start, start_cpu = time.perf_counter(), time.process_time()
+            loader.load_data(recording, upload_relationships=upload_relationships, workers=workers, checkpoint_file=checkpoint_file)
+            seconds, cpu_seconds = time.perf_counter() - start, time.process_time() - start_cpu
+
+    totals = recording.totals()
+    return {
+        'database': 'neo4j' if session is not None else 'recording',
+        'seconds': seconds,
+        'cpu_seconds': cpu_seconds,
+        'statements_per_second': totals['statements'] / seconds if seconds > 0 else None,
+        'totals': totals,
+        'targets': recording.summary()
+    }
+
+def local_session(uri, user, password):
+    """Open a session on a local Neo4j database, or return None if it can't be reached"""
+    driver = GraphDatabase.driver(uri, auth=(user, password))
+    try:
+        driver.verify_connectivity()
+    except (ServiceUnavailable, AuthError, OSError) as error:
+        print(f"Skipping {uri}: {type(error).__name__}: {error}", file=sys.stderr)
+        driver.close()
+        return None, None
+    return driver, driver.session()
+
+def table(result):
+    """Make a table of the writes of each category and relationship"""
+    lines = [f"{'target':<40} {'batches':>8} {'statements':>11} {'MiB sent':>9} {'db seconds':>11}"]
+    for target, totals in result['targets'].items():
+        lines.append(
+            f"{target:<40} {totals['batches']:>8,} {totals['statements']:>11,} {totals['parameter_bytes'] / 2**20:>9.2f} {totals['seconds']:>11.3f}"
+        )
+    totals = result['totals']
+    lines.append(
+        f"{'total':<40} {totals['queries']:>8,} {totals['statements']:>11,} {(totals['parameter_bytes'] + totals['query_bytes']) / 2**20:>9.2f} "
+        f"{totals['seconds']:>11.3f}"
+    )
+    lines.append(f"{totals['round_trips']:,} round trips in {result['seconds']:.1f}s ({result['cpu_seconds']:.1f}s CPU) against {result['database']}")
+    return '\n'.join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark writing the cleaned data to Neo4j")
+    parser.add_argument('--relationships', action='store_true', help="Also create and write the relationships")
+    parser.add_argument('--workers', type=int, default=None, help="The number of processes used to parse the files. Defaults to the number of processors.")
+    parser.add_argument('--neo4j', nargs='?', const=LOCAL_NEO4J, help=f"Also write to this database, which is cleared first. Defaults to {LOCAL_NEO4J}")
+    parser.add_argument('--user', default='neo4j')
+    parser.add_argument('--password', default=os.environ.get('NEO4J_PASSWORD', 'password'), help="Defaults to $NEO4J_PASSWORD or 'password'")
+    parser.add_argument('--output', help="Write the JSON to this file instead of printing it")
+    args = parser.parse_args()
+
+    results = [run_load(None, args.relationships, args.workers)]
+    print(table(results[-1]), file=sys.stderr)
+
+    if args.neo4j:
+        driver, session = local_session(args.neo4j, args.user, args.password)
+        if session is not None:
+            try:
+                results.append(run_load(session, args.relationships, args.workers))
+            finally:
+                session.close()
+                driver.close()
+            print(table(results[-1]), file=sys.stderr)
+
+    # The credentials are left out so reports can be shared
+    arguments = { name: value for name, value in vars(args).items() if name not in ('user', 'password') }
+    report = { 'environment': environment(), 'arguments': arguments, 'results': results }
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
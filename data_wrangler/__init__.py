@@ -2,5 +2,6 @@ from .dataset import Dataset
 from .category import Category
 from .relationship import Relationship
 from .graph_writer import GraphWriter
+from .checkpoint import Checkpoint
 from . import conversion_functions
 from . import relationship_property_matchers
\ No newline at end of file
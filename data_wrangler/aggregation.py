@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import numpy as np
+
+from typing import Any
+from typing import TYPE_CHECKING
+
+from .expression import Expression
+from .expression import col
+
+if TYPE_CHECKING:
+    from .dataset import Dataset
+
+class Aggregation:
+    """Combines the values of each group of rows into one value. Create with count, sum, mean, count_if, sum_if, min or max."""
+
+    def __init__(self, kind: str, value: str | Expression | None = None, condition: Expression | None = None):
+        self.kind = kind
+        self.value = col(value) if isinstance(value, str) else value
+        self.condition = condition
+
+    def compute(self, data: Dataset, codes: np.ndarray, group_count: int, columns: dict[str, np.ndarray]) -> list[Any]:
+        """Calculate the value of each group
+
+        Args:
+            data (Dataset): The rows being grouped
+            codes (np.ndarray): The group number of each row
+            group_count (int): The number of groups
+            columns (dict[str, np.ndarray]): Columns that have already been read, shared between the aggregations
+
+        Returns:
+            list[Any]: The value of each group in order of group number
+        """
+        mask = self.condition.evaluate(data, columns).astype(bool) if self.condition is not None else None
+        values = self.value.evaluate(data, columns) if self.value is not None else None
+
+        if self.kind == 'count':
+            return np.bincount(codes, weights=mask, minlength=group_count).astype(np.int64).tolist()
+
+        if self.kind == 'sum':
+            weights = values if mask is None else np.where(mask, values, 0)
+            sums = np.bincount(codes, weights=weights, minlength=group_count)
+            # Keep integer sums as integers
+            return (sums.astype(np.int64) if np.asarray(values).dtype.kind in 'biu' else sums).tolist()
+
+        if self.kind == 'mean':
+            counts = np.bincount(codes, weights=mask, minlength=group_count)
+            weights = values if mask is None else np.where(mask, values, 0)
+            sums = np.bincount(codes, weights=weights, minlength=group_count)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                means = sums / counts
+            return [None if count == 0 else mean for count, mean in zip(counts.tolist(), means.tolist())]
+
+        if self.kind in ('min', 'max'):
+            if mask is not None:
+                codes, values = codes[mask], values[mask]   # type: ignore
+            order = np.argsort(codes, kind='stable')
+            sorted_codes, sorted_values = codes[order], np.asarray(values)[order]
+            starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]]) if len(sorted_codes) else np.array([], dtype=np.intp)
+            reduce = np.minimum if self.kind == 'min' else np.maximum
+            results: list[Any] = [None] * group_count
+            if len(starts):
+                for group, result in zip(sorted_codes[starts].tolist(), reduce.reduceat(sorted_values, starts).tolist()):
+                    results[group] = result
+            return results
+
+        raise Exception(f"Unknown aggregation {self.kind}")
+
+def count() -> Aggregation:
+    """The number of rows in the group"""
+    return Aggregation('count')
+
+def count_if(condition: Expression) -> Aggregation:
+    """The number of rows in the group for which the condition is true. eg: count_if(col('retail'))"""
+    return Aggregation('count', condition=condition)
+
+def sum(value: str | Expression) -> Aggregation:
+    """The total of a column or expression over the group"""
+    return Aggregation('sum', value)
+
+def sum_if(value: str | Expression, condition: Expression) -> Aggregation:
+    """The total of a column or expression over the rows of the group for which the condition is true.
+    eg: sum_if('crime_likelihood', col('crime_type') == 1)
+    """
+    return Aggregation('sum', value, condition)
+
+def mean(value: str | Expression, condition: Expression | None = None) -> Aggregation:
+    """The average of a column or expression over the group, or over the rows for which the condition is true. None if there are no rows."""
+    return Aggregation('mean', value, condition)
+
+def min(value: str | Expression, condition: Expression | None = None) -> Aggregation:
+    """The smallest value of a column or expression in the group. None if there are no rows."""
+    return Aggregation('min', value, condition)
+
+def max(value: str | Expression, condition: Expression | None = None) -> Aggregation:
+    """The largest value of a column or expression in the group. None if there are no rows."""
+    return Aggregation('max', value, condition)
+
+class GroupBy:
+    def __init__(self, data: Dataset, key: str):
+        """Rows of a dataset grouped on the value of a column. Created by Dataset.group_by
+
+        Args:
+            data (Dataset): The dataset
+            key (str): The column to group on
+        """
+        if len(data) and key not in data.get_column_names():
+            raise Exception(f"Cannot group on {key} because it is not a column of the dataset")
+        self.data = data
+        self.key = key
+
+    def agg(self, aggregations: dict[str, Aggregation]) -> Dataset:
+        """Calculate aggregations for every group at once
+
+        eg: businesses.group_by('junction_id').agg({ 'retail_count': count_if(col('retail')), 'employees': sum('employees_count') })
+
+        Args:
+            aggregations (dict[str, Aggregation]): The name and aggregation of each new column
+
+        Returns:
+            Dataset: One row per group with the group key (as the primary key) and the aggregated columns.
+                Groups are in the order they first appear.
+        """
+        from .dataset import Dataset
+
+        # Number the groups in order of first appearance
+        group_numbers: dict[Any, int] = {}
+        codes = np.fromiter(
+            (group_numbers.setdefault(row[self.key], len(group_numbers)) for row in self.data), dtype=np.intp, count=len(self.data)
+        )
+
+        columns: dict[str, np.ndarray] = {}
+        results = { name: aggregation.compute(self.data, codes, len(group_numbers), columns) for name, aggregation in aggregations.items() }
+
+        return Dataset(
+            [
+                { self.key: key, **{ name: values[group] for name, values in results.items() } }
+                for key, group in group_numbers.items()
+            ],
+            primary_key=self.key
+        )
@@ -0,0 +1,409 @@
+"""Benchmarks for the hot paths of data_wrangler
+
+Times loading, converting, filtering, matching and writing datasets and building nodes and relationships, on synthetic city sized
+data and on the files in data/cleaned_data. Throughput and peak memory are reported as JSON so runs on different commits can be
+compared.
+
+    python -m data_wrangler.bench --output before.json
+    python -m data_wrangler.bench --output after.json --compare before.json
+"""
+
+from __future__ import annotations
+
+import io
+import os
+import sys
+import json
+import math
+import time
+import random
+import pickle
+import argparse
+import platform
+import tempfile
+import subprocess
+import statistics
+import tracemalloc
+
+from typing import Any
+from typing import Callable
+from contextlib import redirect_stdout
+
+import numpy as np
+
+from .dataset import Dataset
+from .dataset import parquet_available
+from .category import Category
+from .relationship import Relationship
+from .expression import col
+from .list_literals import parse_tuple_lists
+from .conversion_functions import convert_if_not_null
+
+REAL_DATA_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'cleaned_data')
+
+# The middle of Vancouver and the distance between synthetic junctions in degrees (about 100m)
+ORIGIN = (49.25, -123.1)
+GRID_STEP = 0.001
+
+class Benchmark:
+    def __init__(self, name: str, dataset: str, run: Callable[[Any], Any], rows: int, setup: Callable[[], Any] | None = None, **details):
+        """One operation to time
+
+        Args:
+            name (str): The name of the operation. eg: 'load_file'
+            dataset (str): The data it runs on. eg: 'synthetic' or 'real'
+            run (Callable[[Any], Any]): The operation. Is given the result of setup
+            rows (int): The number of rows the operation processes, used for the throughput
+            setup (Callable[[], Any], optional): Prepares the input of each run without being timed, eg: copying a dataset that
+                run changes. Defaults to None.
+            details: Extra information to report with the result. eg: the number of pairs compared
+        """
+        self.name = name
+        self.dataset = dataset
+        self.run = run
+        self.rows = rows
+        self.setup = setup if setup is not None else (lambda: None)
+        self.details = details
+
+    def measure(self, repeat: int = 3, memory: bool = True) -> dict[str, Any]:
+        """Time the operation
+
+        Each run is timed separately and the best time is used for the throughput, since slower runs are slowed by other
+        processes. Peak memory is measured on an extra run with tracemalloc because tracing slows the operation down.
+
+        Args:
+            repeat (int, optional): The number of timed runs. Defaults to 3.
+            memory (bool, optional): Whether to measure peak memory. Defaults to True.
+
+        Returns:
+            dict[str, Any]: The result
+        """
+        times = []
+        cpu_times = []
+        for _ in range(repeat):
+            argument = self.setup()
+            with redirect_stdout(io.StringIO()):
+                start, cpu_start = time.perf_counter(), time.process_time()
+                self.run(argument)
+                times.append(time.perf_counter() - start)
+                cpu_times.append(time.process_time() - cpu_start)
+
+        peak_memory = None
+        if memory:
+            argument = self.setup()
+            tracemalloc.start()
+            try:
+                with redirect_stdout(io.StringIO()):
+                    self.run(argument)
+                peak_memory = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+        best = min(times)
+        return {
+            'name': self.name,
+            'dataset': self.dataset,
+            'rows': self.rows,
+            'repeat': repeat,
+            'best_seconds': best,
+            'median_seconds': statistics.median(times),
+            'best_cpu_seconds': min(cpu_times),
+            'rows_per_second': self.rows / best if best > 0 else None,
+            'peak_memory_bytes': peak_memory,
+            **self.details
+        }
+
+def synthetic_junctions(junction_count: int, segment_count: int, seed: int = 0) -> tuple[Dataset, Dataset]:
+    """Create a grid shaped street network
+
+    Segments join neighboring junctions of the grid. If more segments are asked for than the grid has, the rest join
+    random junctions a few blocks apart.
+
+    Args:
+        junction_count (int): The number of junctions
+        segment_count (int): The number of segments
+        seed (int, optional): The random seed. Defaults to 0.
+
+    Returns:
+        tuple[Dataset, Dataset]: The junctions and segments in the same format as the cleaned data
+    """
+    rng = random.Random(seed)
+    side = math.ceil(math.sqrt(junction_count))
+    locations = [(ORIGIN[0] + (i // side) * GRID_STEP, ORIGIN[1] + (i % side) * GRID_STEP) for i in range(junction_count)]
+
+    pairs = [(i, i + 1) for i in range(junction_count - 1) if (i + 1) % side != 0]
+    pairs += [(i, i + side) for i in range(junction_count - side)]
+    rng.shuffle(pairs)
+    while len(pairs) < segment_count:
+        i = rng.randrange(junction_count)
+        j = min(junction_count - 1, i + rng.randint(2, 4) * rng.choice((1, side)))
+        if i != j: pairs.append((i, j))
+    pairs = pairs[:segment_count]
+
+    segment_rows = []
+    neighbors: list[list[tuple[int, float, int]]] = [[] for _ in range(junction_count)]
+    for segment_id, (i, j) in enumerate(pairs):
+        length = round(math.dist(locations[i], locations[j]) * 111000, 7)
+        neighbors[i].append((j, length, segment_id))
+        neighbors[j].append((i, length, segment_id))
+        segment_rows.append({
+            'id': segment_id,
+            'hblock': f'{rng.randint(1, 99)}XX MAIN ST',
+            'type': rng.choice(('Residential', 'Arterial', 'Collector')),
+            'length_metres': length,
+            'latitude': (locations[i][0] + locations[j][0]) / 2,
+            'longitude': (locations[i][1] + locations[j][1]) / 2,
+            'land_uses': rng.sample(['S110', 'S200', 'S230', 'S400', 'C100'], rng.randint(0, 3)),
+            'neighbors': [i, j]
+        })
+
+    junction_rows = [
+        {
+            'id': i,
+            'type': 'Junction',
+            'street_count': len(neighbors[i]),
+            'longitude': longitude,
+            'latitude': latitude,
+            'neighbors': neighbors[i],
+            'crime_count': rng.randint(0, 20),
+            'stores_count': rng.randint(0, 5),
+            'transit_count': rng.randint(0, 3),
+            'rapid_transit_count': int(rng.random() < 0.01),
+            'schools_count': int(rng.random() < 0.02),
+            'retail_count': rng.randint(0, 5),
+            'elevation': round(rng.uniform(0, 150), 2)
+        }
+        for i, (latitude, longitude) in enumerate(locations)
+    ]
+
+    return Dataset(junction_rows), Dataset(segment_rows)
+
+def synthetic_points(point_count: int, junction_count: int, seed: int = 0) -> Dataset:
+    """Create crime like points spread over the area of synthetic_junctions
+
+    Args:
+        point_count (int): The number of points
+        junction_count (int): The number of junctions the area is sized for
+        seed (int, optional): The random seed. Defaults to 0.
+
+    Returns:
+        Dataset: The points
+    """
+    rng = random.Random(seed + 1)
+    side = math.ceil(math.sqrt(junction_count))
+    types = ('Theft from Vehicle', 'Mischief', 'Break and Enter Residential/Other', 'Offence Against a Person', 'Other Theft')
+    return Dataset([
+        {
+            'id': i,
+            'type_of_crime': rng.choice(types),
+            'date_of_crime': f'2022-{rng.randint(1, 12):02}-{rng.randint(1, 28):02}',
+            'time_of_crime': f'{rng.randint(0, 23):02}:{rng.randint(0, 59):02}',
+            'hundred_block': f'{rng.randint(1, 99)}XX MAIN ST',
+            'latitude': ORIGIN[0] + rng.uniform(0, side * GRID_STEP),
+            'longitude': ORIGIN[1] + rng.uniform(0, side * GRID_STEP)
+        }
+        for i in range(point_count)
+    ])
+
+def _copy(data: Dataset) -> Dataset:
+    return pickle.loads(pickle.dumps(data))
+
+def _with_neighbor_ids(junctions: Dataset) -> Dataset:
+    """Add neighbor_ids and street_ids like data_loading/main.py does"""
+    junctions = _copy(junctions)
+    neighbors = parse_tuple_lists(str(junction['neighbors']) if not isinstance(junction['neighbors'], str) else junction['neighbors'] for junction in junctions)
+    for junction, neighbor_ids, street_ids in zip(junctions, neighbors.lists(0), neighbors.lists(2)):
+        junction['neighbor_ids'] = neighbor_ids
+        junction['street_ids'] = street_ids
+    return junctions
+
+# The conversions data_loading/main.py makes to junctions
+JUNCTION_CONVERSIONS = {
+    'id': int,
+    'type': str,
+    'longitude': float,
+    'latitude': float,
+    'street_count': int,
+    'crime_count': int,
+    'stores_count': int,
+    'transit_count': int,
+    'rapid_transit_count': int,
+    'schools_count': int,
+    'retail_count': int,
+    'neighbors': str,
+    'elevation': lambda v: convert_if_not_null(v, on_null=None)
+}
+
+JUNCTION_PROPERTIES = ['id', 'type', 'street_count', 'longitude', 'latitude', 'crime_count', 'transit_count', 'stores_count',
+                       'schools_count', 'rapid_transit_count', 'retail_count', 'elevation']
+
+def load_segments(segment_file: str) -> Dataset:
+    """Load segments with the conversions data_loading/main.py makes"""
+    segments = Dataset.load_file(segment_file, { 'id': int, 'hblock': str, 'type': str, 'length_metres': float, 'land_uses': str, 'neighbors': str })
+    segments.convert_properties({ 'land_uses': col('land_uses').parse_list(), 'neighbors': col('neighbors').parse_list() })
+    return segments
+
+def dataset_benchmarks(label: str, junction_file: str, segment_file: str | None, points: Dataset, match_point_count: int, folder: str) -> list[Benchmark]:
+    """The benchmarks for one set of data
+
+    Args:
+        label (str): The name of the data in the results
+        junction_file (str): A csv file of junctions in the format of data/cleaned_data/junctions.csv
+        segment_file (str | None): A csv file of segments in the format of data/cleaned_data/segments.csv
+        points (Dataset): Points with latitude and longitude to match to the junctions
+        match_point_count (int): The number of points to match. Matching compares every point with every junction.
+        folder (str): A folder for the files that are written
+
+    Returns:
+        list[Benchmark]: The benchmarks
+    """
+    with redirect_stdout(io.StringIO()):
+        raw = Dataset.load_file(junction_file)
+        junctions = Dataset.load_file(junction_file, { name: conversion for name, conversion in JUNCTION_CONVERSIONS.items() if name in raw.get_column_names() })
+    junctions.convert_property('latitude', float)
+    junctions.convert_property('longitude', float)
+    linked = _with_neighbor_ids(junctions)
+    match_points = Dataset(list(points.get_rows(match_point_count)))
+
+    numeric = [name for name in ('id', 'street_count', 'crime_count', 'stores_count', 'transit_count', 'retail_count') if name in raw.get_column_names()]
+    conversions = { name: int for name in numeric } | { 'latitude': float, 'longitude': float }
+    expressions = { name: col(name).astype(int) for name in numeric } | { 'latitude': col('latitude').astype(float), 'longitude': col('longitude').astype(float) }
+
+    category = Category('Junction', junctions, [name for name in JUNCTION_PROPERTIES if name in junctions.get_column_names()])
+    connects_to = Relationship(
+        'CONNECTS_TO', Category('Junction', linked, ['id']), Category('Junction', linked, ['id']), 'neighbor_ids',
+        prop_matcher=lambda j1, j2: { 'street_id': j1['street_ids'][j1['neighbor_ids'].index(j2['id'])] },
+        remove_duplicates=True
+    )
+
+    benchmarks = [
+        Benchmark('load_file', label, lambda _: Dataset.load_file(junction_file), len(raw)),
+        Benchmark('load_file_converted', label, lambda _: Dataset.load_file(junction_file, JUNCTION_CONVERSIONS), len(raw)),
+        Benchmark('convert_properties', label, lambda data: data.convert_properties(conversions), len(raw), lambda: _copy(raw)),
+        Benchmark('convert_properties_expression', label, lambda data: data.convert_properties(expressions), len(raw), lambda: _copy(raw)),
+        Benchmark('filter', label, lambda data: data.filter(lambda row: row['crime_count'] > 0), len(junctions), lambda: _copy(junctions)),
+        Benchmark('filter_expression', label, lambda data: data.filter(col('crime_count') > 0), len(junctions), lambda: _copy(junctions)),
+        Benchmark(
+            'match_lat_lng', label, lambda data: data.match_lat_lng(junctions, 'junction_id', 'junction_dst'), len(match_points),
+            lambda: _copy(match_points), pairs=len(match_points) * len(junctions)
+        ),
+        Benchmark('write_to_file', label, lambda _: junctions.write_to_file(os.path.join(folder, f'{label}_junctions.csv')), len(junctions)),
+        Benchmark('Relationship.get_links', label, lambda _: connects_to.get_links(), sum(len(junction['neighbor_ids']) for junction in linked)),
+        Benchmark('Category.get_nodes_properties', label, lambda _: category.get_nodes_properties(), len(junctions)),
+    ]
+
+    if segment_file is not None:
+        with redirect_stdout(io.StringIO()):
+            segment_count = len(Dataset.load_file(segment_file))
+        benchmarks.append(Benchmark('load_file_segments', label, lambda _: load_segments(segment_file), segment_count))
+
+    if parquet_available():
+        parquet_file = os.path.join(folder, f'{label}_junctions.parquet')
+        benchmarks += [
+            Benchmark('write_to_file_parquet', label, lambda _: junctions.write_to_file(parquet_file), len(junctions)),
+            Benchmark('load_file_parquet', label, lambda _: Dataset.load_file(parquet_file), len(junctions), lambda: None if os.path.exists(parquet_file) else junctions.write_to_file(parquet_file)),
+        ]
+
+    return benchmarks
+
+def run_benchmarks(benchmarks: list[Benchmark], repeat: int, only: list[str] | None = None) -> list[dict[str, Any]]:
+    """Measure each benchmark, printing progress to stderr so stdout is left for the JSON"""
+    results = []
+    for benchmark in benchmarks:
+        if only and benchmark.name not in only: continue
+        print(f"{benchmark.dataset:>10} {benchmark.name}", end='', file=sys.stderr, flush=True)
+        result = benchmark.measure(repeat)
+        print(f"  {result['best_seconds']:.4f}s  {result['rows_per_second'] or 0:,.0f} rows/s  {result['peak_memory_bytes'] / 2**20:.1f} MiB", file=sys.stderr)
+        results.append(result)
+    return results
+
+def environment() -> dict[str, Any]:
+    """Information about the code and machine the benchmarks ran on"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+
+    return {
+        'commit': commit,
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'parquet': parquet_available(),
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'cpu_count': os.cpu_count()
+    }
+
+def compare(results: list[dict[str, Any]], baseline: list[dict[str, Any]]) -> str:
+    """Make a table of how long each benchmark took compared with a previous run. Below 1 is faster."""
+    previous = { (result['name'], result['dataset']): result for result in baseline }
+    lines = [f"{'dataset':>10} {'benchmark':<32} {'before':>10} {'after':>10} {'ratio':>7}"]
+    for result in results:
+        before = previous.get((result['name'], result['dataset']))
+        if before is None: continue
+        ratio = result['best_seconds'] / before['best_seconds'] if before['best_seconds'] else float('nan')
+        lines.append(f"{result['dataset']:>10} {result['name']:<32} {before['best_seconds']:>9.4f}s {result['best_seconds']:>9.4f}s {ratio:>7.2f}")
+    return '\n'.join(lines)
+
+def main(arguments: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Benchmark the hot paths of data_wrangler and report throughput and peak memory as JSON")
+    parser.add_argument('--junctions', type=int, default=6000, help="The number of synthetic junctions. Vancouver has about 6000")
+    parser.add_argument('--segments', type=int, default=10000, help="The number of synthetic segments")
+    parser.add_argument('--points', type=int, default=80000, help="The number of synthetic crime points")
+    parser.add_argument('--match-points', type=int, default=200, help="The number of points matched to the junctions. Matching compares every point with every junction")
+    parser.add_argument('--repeat', type=int, default=3, help="The number of timed runs of each benchmark")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--real', default=REAL_DATA_FOLDER, help="The folder of cleaned data to benchmark. Skipped if it doesn't exist")
+    parser.add_argument('--no-real', action='store_true', help="Only use synthetic data")
+    parser.add_argument('--no-synthetic', action='store_true', help="Only use the real data")
+    parser.add_argument('--only', nargs='*', help="Only run these benchmarks. eg: load_file match_lat_lng")
+    parser.add_argument('--output', help="Write the JSON to this file instead of printing it")
+    parser.add_argument('--compare', help="A JSON file from a previous run to compare with")
+    args = parser.parse_args(arguments)
+
+    results = []
+    with tempfile.TemporaryDirectory() as folder:
+        if not args.no_synthetic:
+            print(f"Creating {args.junctions} junctions, {args.segments} segments and {args.points} points", file=sys.stderr)
+            junctions, segments = synthetic_junctions(args.junctions, args.segments, args.seed)
+            points = synthetic_points(args.points, args.junctions, args.seed)
+            junction_file = os.path.join(folder, 'synthetic_source.csv')
+            segment_file = os.path.join(folder, 'synthetic_segments.csv')
+            junctions.write_to_file(junction_file)
+            segments.write_to_file(segment_file)
+
+            benchmarks = dataset_benchmarks('synthetic', junction_file, segment_file, points, args.match_points, folder)
+            point_file = os.path.join(folder, 'synthetic_points.csv')
+            points.write_to_file(point_file)
+            benchmarks.append(Benchmark('load_file_points', 'synthetic', lambda _: Dataset.load_file(point_file, {
+                'id': int, 'type_of_crime': str, 'date_of_crime': str, 'time_of_crime': str, 'hundred_block': str, 'latitude': float, 'longitude': float
+            }), len(points)))
+            results += run_benchmarks(benchmarks, args.repeat, args.only)
+
+        junction_file = os.path.join(args.real, 'junctions.csv')
+        if not args.no_real and os.path.exists(junction_file):
+            point_file = next((os.path.join(args.real, name) for name in ('crimes.csv', 'graffiti.csv', 'stores.csv') if os.path.exists(os.path.join(args.real, name))), None)
+            if point_file is not None:
+                with redirect_stdout(io.StringIO()):
+                    points = Dataset.load_file(point_file)
+                points.convert_properties({ 'latitude': float, 'longitude': float })
+                segment_file = os.path.join(args.real, 'segments.csv')
+                segment_file = segment_file if os.path.exists(segment_file) else None
+                results += run_benchmarks(dataset_benchmarks('real', junction_file, segment_file, points, args.match_points, folder), args.repeat, args.only)
+        elif not args.no_real:
+            print(f"No real data in {args.real}", file=sys.stderr)
+
+    report = { 'environment': environment(), 'arguments': vars(args), 'results': results }
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            print(compare(results, json.load(baseline_file)['results']), file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
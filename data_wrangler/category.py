@@ -1,4 +1,7 @@
 from typing import Any
+from typing import Iterator
+
+from itertools import islice
 
 from .dataset import Dataset
 from .conversion_functions import Row
@@ -6,37 +9,68 @@ from .conversion_functions import Row
 class Category:
     """Represents a Neo4j node category
     """
-    
-    def __init__(self, name: str, data: Dataset, property_names: list[str | tuple[str, str]]):
+
+    def __init__(self, name: str, data: Dataset, property_names: list[str | tuple[str, str]], batch_size: int = 10000):
         """ Create a new node category
 
         Args:
             name (str): The name of the category to use in Neo4j
             data (Dataset): The data used for the nodes
-            property_names (list[str | tuple[str, str]]): The fieldnames to use as the properties for the nodes. 
+            property_names (list[str | tuple[str, str]]): The fieldnames to use as the properties for the nodes.
                 Fieldnames can be renamed by using a tuple where the first item is the new name and the second is the old name.
+            batch_size (int, optional): The number of nodes to project at once when iterating over batches. Defaults to 10000.
         """
-        
+
         self.name = name
         self.data = data
         self.property_names = property_names
-        
+        self.batch_size = batch_size
+
+        # Resolve the renames once so that projecting a row is only a lookup for each property
+        # Each item is (resulting property name, key in the original data)
+        self._projection = [
+            (prop[0], prop[1]) if isinstance(prop, tuple) else (prop, prop)
+            for prop in property_names
+        ]
+
+    def project(self, row: Row) -> Row:
+        """ Get the node properties of a single row
+
+        Args:
+            row (Row): The row of data
+
+        Returns:
+            Row: The properties for the node
+        """
+        return { new_name: row[old_name] for new_name, old_name in self._projection }
+
+    def iter_nodes_properties(self, batch_size: int | None = None, start: int = 0) -> Iterator[list[Row]]:
+        """ Lazily get the properties of the nodes in batches
+
+        Rows are only projected when the batch they belong to is requested so only one batch is held in memory at a time
+
+        Args:
+            batch_size (int, optional): The number of nodes in each batch. Defaults to the batch size of the category.
+            start (int, optional): The number of rows to skip before the first batch. Defaults to 0.
+
+        Yields:
+            list[Row]: The properties for each node in the batch
+        """
+        if batch_size is None:
+            batch_size = self.batch_size
+
+        rows = islice(self.data, start, None)
+        while True:
+            batch = [self.project(row) for row in islice(rows, batch_size)]
+            if not batch: return
+            yield batch
+
     def get_nodes_properties(self) -> list[Row]:
         """ Get a list of rows of properties from rows of data
-        
+
         Extract the properties from each of the rows in the dataset
 
         Returns:
             list[Row]: The properties for each node
         """
-        
-        # Each property key can either be a string or it can be a tuple of two strings in which case the first string is used as the 
-        # resulting property name while the first is used as the key for accessing the original data
-        return [
-            { 
-                (prop[0] if type(prop) == tuple else prop):                 # type: ignore
-                    row[prop[1] if type(prop) == tuple else prop]           # type: ignore
-                for prop in self.property_names 
-            } 
-            for row in self.data
-        ]
\ No newline at end of file
+        return [self.project(row) for row in self.data]
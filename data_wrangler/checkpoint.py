@@ -0,0 +1,105 @@
+import json
+import os
+
+from .files import atomic_write
+
+class Checkpoint:
+    """Records the progress of a graph load in a local json file
+
+    Progress is stored per key (eg: 'category:Junction' or 'relationship:CONNECTS_TO') as the number of batches and rows
+    that have been committed, and whether the key has been completely written. The file is rewritten after every update so
+    an interrupted load can be continued from the last committed batch. A batch is recorded after it is committed, so the file
+    can be one batch behind the database. GraphWriter keeps the committed rows in the database too to catch that.
+    """
+
+    def __init__(self, filename: str):
+        """ Open a checkpoint file
+
+        If the file does not exist an empty checkpoint is created
+
+        Args:
+            filename (str): The path of the checkpoint file
+        """
+        self.filename = filename
+        self._progress: dict[str, dict] = {}
+
+        if os.path.exists(filename):
+            with open(filename, 'r', encoding='utf-8') as checkpoint_file:
+                self._progress = json.load(checkpoint_file)
+
+    def completed_rows(self, key: str) -> int:
+        """Get the number of rows that have been committed for a key
+
+        Args:
+            key (str): The key of the category or relationship
+
+        Returns:
+            int: The number of committed rows
+        """
+        return self._progress.get(key, {}).get('rows', 0)
+
+    def completed_batches(self, key: str) -> int:
+        """Get the number of batches that have been committed for a key
+
+        Args:
+            key (str): The key of the category or relationship
+
+        Returns:
+            int: The number of committed batches
+        """
+        return self._progress.get(key, {}).get('batches', 0)
+
+    def is_done(self, key: str) -> bool:
+        """Check whether a key has been completely written
+
+        Args:
+            key (str): The key of the category or relationship
+
+        Returns:
+            bool: True if every batch has been committed
+        """
+        return self._progress.get(key, {}).get('done', False)
+
+    def record_batch(self, key: str, row_count: int):
+        """Record that a batch has been committed
+
+        Args:
+            key (str): The key of the category or relationship
+            row_count (int): The number of rows in the batch
+        """
+        progress = self._progress.setdefault(key, { 'batches': 0, 'rows': 0, 'done': False })
+        progress['batches'] += 1
+        progress['rows'] += row_count
+        self.save()
+
+    def set_completed_rows(self, key: str, row_count: int):
+        """Correct the number of rows that have been committed for a key, eg: from the rows recorded in the database
+
+        Args:
+            key (str): The key of the category or relationship
+            row_count (int): The number of committed rows
+        """
+        self._progress.setdefault(key, { 'batches': 0, 'rows': 0, 'done': False })['rows'] = row_count
+        self.save()
+
+    def mark_done(self, key: str):
+        """Record that every batch of a key has been committed
+
+        Args:
+            key (str): The key of the category or relationship
+        """
+        self._progress.setdefault(key, { 'batches': 0, 'rows': 0, 'done': False })['done'] = True
+        self.save()
+
+    def clear(self):
+        """Forget all progress and delete the checkpoint file
+        """
+        self._progress = {}
+        if os.path.exists(self.filename):
+            os.remove(self.filename)
+
+    def save(self):
+        """Write the progress to the checkpoint file
+        """
+        with atomic_write(self.filename) as checkpoint_file:
+            json.dump(self._progress, checkpoint_file, indent=4)
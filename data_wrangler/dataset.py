@@ -1,24 +1,86 @@
 from __future__ import annotations
 
+import os
 import csv
 from haversine import haversine, Unit
 
 from copy import copy
 
 from itertools import islice
+from itertools import compress
 
 from typing import Callable
 from typing import Any
 from collections.abc import Sequence
 
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
 from .conversion_functions import Row
 from .conversion_functions import RowFunction
 from .conversion_functions import ConversionMap
 from .conversion_functions import ConversionFunction
+from .record import record_type
+from .expression import Expression
+from .aggregation import GroupBy
+from .schema import Schema
+from .instrumentation import stage
+from .progress import progress
 
 # from deprecated.sphinx import deprecated
 
 
+def _lat_lng_distance(point_1: tuple[float, float], point_2: tuple[float, float]) -> float:
+    """The distance in meters between two (latitude, longitude) records. The points must already have been checked."""
+    return haversine(point_1, point_2, unit=Unit.METERS, check=False)
+
+def _check_lat_lng(data: Dataset):
+    """Check that the latitudes and longitudes of a dataset are in range once instead of on every distance calculation"""
+    for row in data:
+        if not (-90 <= row['latitude'] <= 90 and -180 <= row['longitude'] <= 180):
+            raise ValueError(f"Row {row[data.primary_key]} has an invalid location ({row['latitude']}, {row['longitude']})")
+
+# Parquet metadata listing the columns whose values were tuples, so they can be turned back into tuples when read
+TUPLE_COLUMNS_KEY = b'data_wrangler.tuple_columns'
+
+def parquet_available() -> bool:
+    """Whether pyarrow is installed so Parquet files can be read and written"""
+    return pa is not None
+
+def is_columnar_file(filename: str) -> bool:
+    """Whether a file name is for the columnar (Parquet) format rather than csv"""
+    return filename.lower().endswith(('.parquet', '.pq'))
+
+def _require_pyarrow():
+    if pa is None:
+        raise Exception("Reading and writing Parquet files requires pyarrow. Install it with pip install -r requirements-optional.txt or use a .csv file.")
+
+def _arrow_column(values: list[Any]) -> tuple[Any, bool]:
+    """Convert the values of a column to an Arrow array
+
+    Lists of tuples, like junction neighbors, become lists of structs so each position of the tuples keeps its own type.
+    Columns with mixed types that Arrow can't store are stored as strings, like they would be in a csv file.
+
+    Returns:
+        tuple: The array and whether the column holds lists of tuples
+    """
+    sample = next((value for value in values if isinstance(value, list) and value), None)
+    if sample is not None and isinstance(sample[0], tuple):
+        items = [item for value in values if value for item in value]
+        fields = [(f'_{i}', pa.array([item[i] for item in items]).type) for i in range(len(sample[0]))]
+        try:
+            return pa.array(values, type=pa.list_(pa.struct(fields))), True
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            pass
+
+    try:
+        return pa.array(values), False
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return pa.array([None if value is None else str(value) for value in values], type=pa.string()), False
+
 class Dataset:
     
     def __init__(self, rows: list[Row], primary_key='id'):
@@ -38,7 +100,31 @@ class Dataset:
     
     def __getitem__(self, index):
         return self._rows[index]
-    
+
+    def __getstate__(self):
+        """Get a compact state for pickling
+
+        When all the rows have the same columns the data is stored as one list per column so the column names are only stored
+        once instead of once per row. This makes datasets much smaller and faster to send between processes.
+        """
+        columns = list(self.get_single_row() or {})
+        if all(len(row) == len(columns) and all(column in row for column in columns) for row in self):
+            return {
+                'primary_key': self.primary_key,
+                'columns': columns,
+                'values': [[row[column] for row in self] for column in columns]
+            }
+        return { 'primary_key': self.primary_key, 'rows': list(self) }
+
+    def __setstate__(self, state):
+        self.primary_key = state['primary_key']
+        if 'rows' in state:
+            rows = state['rows']
+        else:
+            columns = state['columns']
+            rows = [dict(zip(columns, values)) for values in zip(*state['values'])]
+        self._rows = { row[self.primary_key]: row for row in rows }
+
     def remove(self, key_value):
         """Remove a row from the dataset
 
@@ -58,13 +144,15 @@ class Dataset:
         self.primary_key = primary_key
         self._rows = { row[self.primary_key]: row for row in self._rows.values() }
     
-    def add_property(self, name: str, **kwargs):
+    def add_property(self, name: str, expression: Expression | None = None, **kwargs):
         """Add a property to each row of the dataset
         
-        Either value or func should be set. If neither is set default will be 0.
+        Either expression, value or func should be set. If none are set default will be 0.
+        eg: dataset.add_property('density', col('count') / col('area'))
 
         Args:
             name (str): The name of the new property
+            expression (Expression, optional): An expression calculated for all rows at once. See data_wrangler.expression.col
         Kwargs:
             value (Any): The default value of the property
             func (Callable[[Row], Any]): The function to generate values. Is given the row
@@ -73,7 +161,10 @@ class Dataset:
         if name in self.get_column_names():
             raise Exception(f"Cannot add property {name} because it already exists in the dataset.")
             
-        if "value" in kwargs:  
+        if expression is not None:
+            for row, value in zip(self, expression.evaluate(self).tolist()):
+                row[name] = value
+        elif "value" in kwargs:  
             for row in self:
                 row[name] = copy(kwargs["value"])
         elif "func" in kwargs:
@@ -126,37 +217,65 @@ class Dataset:
             row[new_name] = row[original_name]
             del row[original_name]
             
-    def convert_property(self, field_name: str, conversion: ConversionFunction):
+    def convert_property(self, field_name: str, conversion: ConversionFunction | Expression):
         """Apply a conversion function to a property
         
         Useful to change the type of a property
         eg: dataset.convert_property('some_property', int) to convert the type of 'some_property' to int
+        or dataset.convert_property('some_property', col('some_property').astype(int)) to convert all the rows at once
 
         Args:
             field_name (str): The name of the property to convert
-            conversion (ConversionFunction): The function to apply
+            conversion (ConversionFunction | Expression): The function to apply or an expression giving the new values
         """
-        for row in self:
-            row[field_name] = conversion(row[field_name])
-            
-        if field_name == self.primary_key:
-            new_rows = { row[self.primary_key]: row for row in self._rows.values() }
-            
-            if len(new_rows) != len(self._rows):
+        rows = self._convert({ field_name: conversion })
+        if rows is not None:
+            # Checked before the rows are replaced so rows with the same new key aren't lost
+            if len(rows) != len(self._rows):
                 raise Exception("Conversion resulted in non unique primary key")
-            self._rows = new_rows
-            self.convert_properties({})
+            self._rows = rows
             
-    # @deprecated(reason="Use convert_property for each property instead", version="0.0.1")
-    def convert_properties(self, conversions: dict[str, ConversionFunction]):
-        for row in self:
-            for field_name in conversions:
-                row[field_name] = conversions[field_name](row[field_name])
+    def convert_properties(self, conversions: dict[str, ConversionFunction | Expression]):
+        """Apply conversion functions to several properties
+
+        Expressions are all evaluated before any property is changed, so they see the original values
+
+        Args:
+            conversions (dict[str, ConversionFunction | Expression]): The function or expression for each property
+        """
+        rows = self._convert(conversions)
+        if rows is not None:
+            self._rows = rows
+
+    def _convert(self, conversions: dict[str, ConversionFunction | Expression]) -> dict[Any, Row] | None:
+        """Apply conversions to the rows
+
+        Returns:
+            dict[Any, Row] | None: The rows keyed by their new primary keys if the primary key was converted, otherwise None
+        """
+        expressions = { name: conversion for name, conversion in conversions.items() if isinstance(conversion, Expression) }
+        functions = { name: conversion for name, conversion in conversions.items() if not isinstance(conversion, Expression) }
+
+        if expressions:
+            columns = {}
+            values = { name: expression.evaluate(self, columns).tolist() for name, expression in expressions.items() }
+            for name, column in values.items():
+                for row, value in zip(self, column):
+                    row[name] = value
+
+        if functions:
+            for row in self:
+                for field_name in functions:
+                    row[field_name] = functions[field_name](row[field_name])
                 
         if self.primary_key in conversions:
-            self._rows = { row[self.primary_key]: row for row in self._rows.values() }
+            return { row[self.primary_key]: row for row in self._rows.values() }
+        return None
             
-    def match_closest(self, other_data: Dataset, distance_func: Callable[[Row, Row], float], on_match: Callable[[Row, Row, float], None], distance_limit: float=float('inf')):
+    def match_closest(
+        self, other_data: Dataset, distance_func: Callable[[Any, Any], float], on_match: Callable[[Row, Row, float], None],
+        distance_limit: float=float('inf'), record_fields: Sequence[str] | None = None
+    ):
         """ Pair all the nodes in one data set to the closest node in another dataset
         
         !WARNING: Creates a cross product between the two data sets. May run slowly for large datasets.
@@ -166,30 +285,40 @@ class Dataset:
             distance_func (Callable[[Row, Row], float]): The function to use for calculating distance between two rows
             on_match (Callable[[Row, Row, float], None]): The function to run when a row is matched with its closest row
             distance_limit (float): The maximum distance beyond which a match should not be made
+            record_fields (Sequence[str], optional): If set, distance_func is given records of these fields (see to_records)
+                instead of rows, which makes the cross product much cheaper. on_match is still given the rows.
         """
+        with stage('match_closest', rows=len(self)), progress('match_closest', len(self)) as tracker:
+            if record_fields:
+                rows_1, rows_2 = list(self), list(other_data)
+                items_1 = list(self.to_records(record_fields).values())
+                items_2 = list(other_data.to_records(record_fields).values())
+            else:
+                rows_1 = rows_2 = None
+                items_1, items_2 = list(self), list(other_data)
         
-        # Match for each node in this dataset
-        for i, row_1 in enumerate(self):
-            closest = None
-            b_dist = distance_limit
+            # Match for each node in this dataset
+            for i, item_1 in enumerate(items_1):
+                closest = -1
+                b_dist = distance_limit
             
-            # Find the closest node in data set 2
-            for row_2 in other_data:
-                distance = distance_func(row_1, row_2)
+                # Find the closest node in data set 2
+                for j, item_2 in enumerate(items_2):
+                    distance = distance_func(item_1, item_2)
                     
-                # Update the closest node
-                if distance < b_dist:
-                    closest = row_2
-                    b_dist = distance
+                    # Update the closest node
+                    if distance < b_dist:
+                        closest = j
+                        b_dist = distance
               
-            # Write the information about the closest node to [row_1]
-            if closest != None:
-                on_match(row_1, closest, b_dist)
-            
-            # Log the progress
-            if i % 100 == 0:
-                print(f"\r    Matched {i} nodes. {(i / len(self)):.0%} {' ' * 10}", end='')
-        print(f"\r    Matched {len(self)} nodes. 100% {' ' * 10}")
+                # Write the information about the closest node to [row_1]
+                if closest != -1:
+                    if rows_1 is not None and rows_2 is not None:
+                        on_match(rows_1[i], rows_2[closest], b_dist)
+                    else:
+                        on_match(item_1, items_2[closest], b_dist)
+
+                tracker.advance()
         
     def match_closest_p_norm(
         self, other_data: Dataset, match_keys: list[str | tuple[str, str]], on_match: Callable[[Row, Row, float], None], p_norm: float=2, distance_limit: float=float('inf')
@@ -254,23 +383,78 @@ class Dataset:
             if count_field:
                 row_2[count_field] = row_2[count_field] + increment
             
-        def distance(row_1: Row, row_2: Row):
-            p1 = (row_1['latitude'], row_1['longitude'])
-            p2 = (row_2['latitude'], row_2['longitude'])
-            
-            return haversine(p1, p2, unit=Unit.METERS)
-        
-        self.match_closest(other_data, distance, on_match, distance_limit=distance_limit)
+        _check_lat_lng(self)
+        _check_lat_lng(other_data)
+        self.match_closest(other_data, _lat_lng_distance, on_match, distance_limit=distance_limit, record_fields=('latitude', 'longitude'))
         
     def match_lat_lng_custom(self, other_data: Dataset, on_match, distance_limit=float('inf')):
-        def distance(row_1: Row, row_2: Row):
-            p1 = (row_1['latitude'], row_1['longitude'])
-            p2 = (row_2['latitude'], row_2['longitude'])
-            
-            return haversine(p1, p2, unit=Unit.METERS)
-        
-        self.match_closest(other_data, distance, on_match, distance_limit=distance_limit)
+        _check_lat_lng(self)
+        _check_lat_lng(other_data)
+        self.match_closest(other_data, _lat_lng_distance, on_match, distance_limit=distance_limit, record_fields=('latitude', 'longitude'))
         
+    def group_by(self, key: str) -> GroupBy:
+        """Group the rows on the value of a column to aggregate them. See data_wrangler.aggregation
+
+        eg: dataset.group_by('junction_id').agg({ 'count': count(), 'total': sum('value') })
+
+        Args:
+            key (str): The column to group on
+
+        Returns:
+            GroupBy: The groups
+        """
+        return GroupBy(self, key)
+
+    def join(self, other: Dataset, on: str, other_on: str | None = None, columns: Sequence[str] | None = None, fill: Any = None):
+        """Add columns of another dataset to the matching rows of this dataset
+
+        Rows are matched where row[on] == other_row[other_on] using a hash lookup, so it takes linear time. Each row is matched
+        with at most one row of [other]. Rows without a match get [fill] for every new column. Columns that already exist are replaced.
+
+        Args:
+            other (Dataset): The dataset to take the columns from
+            on (str): The column of this dataset to match on
+            other_on (str, optional): The column of [other] to match on. Its values must be unique. Defaults to the primary key of [other].
+            columns (Sequence[str], optional): The columns to add. Defaults to all the columns of [other] except [other_on].
+            fill (Any, optional): The value to use for rows with no match. Defaults to None.
+        """
+        if other_on is None or other_on == other.primary_key:
+            other_on = other.primary_key
+            index = other._rows
+        else:
+            index = { row[other_on]: row for row in other }
+            if len(index) != len(other):
+                raise Exception(f"Cannot join on {other_on} because its values are not unique")
+
+        if columns is None:
+            columns = [name for name in other.get_column_names() if name != other_on]
+
+        for row in self:
+            match = index.get(row[on])
+            if match is None:
+                for name in columns:
+                    row[name] = copy(fill)
+            else:
+                for name in columns:
+                    row[name] = match[name]
+
+    def to_records(self, fields: Sequence[str], name: str = 'Record') -> dict[Any, tuple]:
+        """Get a compact, read-only copy of some of the columns
+
+        Each row becomes a record (a named tuple) holding only [fields], in that order. Reading record[i] is much cheaper than
+        reading row[field] and the records use far less memory than rows, so use them in loops that read the same rows many times.
+        Changes to the records are not written back to the dataset.
+
+        Args:
+            fields (Sequence[str]): The columns to copy
+            name (str, optional): The name of the record class. Defaults to 'Record'.
+
+        Returns:
+            dict[Any, tuple]: The records keyed by primary key, in the same order as the rows
+        """
+        make = record_type(fields, name)._make
+        return { key: make([row[field] for field in fields]) for key, row in self._rows.items() }
+
     def get_column_names(self):
         """Get the names of the columns in the dataset
         
@@ -304,14 +488,20 @@ class Dataset:
             
         self._rows.update(other._rows)
         
-    def filter(self, filter: Callable[[Row], bool]):
+    def filter(self, filter: Callable[[Row], bool] | Expression):
         """Filter rows from the dataset
         
         The filter function is run for each of the rows. If it returns False the row is removed from the dataset.
+        An expression is evaluated for all the rows at once instead. eg: dataset.filter(col('junction_id') != 0)
 
         Args:
-            filter (Callable[[Row], bool]): The filter function
+            filter (Callable[[Row], bool] | Expression): The filter function or expression
         """
+        if isinstance(filter, Expression):
+            keep = filter.evaluate(self).astype(bool).tolist()
+            self._rows = dict(compress(self._rows.items(), keep))
+            return
+
         toDelete = []
         for row in self:
             if not filter(row):
@@ -320,13 +510,16 @@ class Dataset:
             del self._rows[row[self.primary_key]]
         
     def write_to_file(self, filename: str, delimiter: str = ',', columnnames=None, write_header = True):
-        """ Write the dataset to a csv file
+        """ Write the dataset to a csv file, or to a Parquet file if the name ends in .parquet
+
+        Parquet files keep the types of the values, including lists like neighbors and land_uses, and can be read one column
+        at a time. They require pyarrow.
 
         Args:
-            filename (str): The name of the csv file
-            delimiter (str, optional): The delimiter to use for separating values. Defaults to ','.
+            filename (str): The name of the csv or Parquet file
+            delimiter (str, optional): The delimiter to use for separating values. Defaults to ','. Only used for csv files.
             fieldnames (list[str], optional): The fieldnames to write. If not provided then writes all values.
-            write_header (bool, optional): Whether or not the header should be written. Defaults to True.
+            write_header (bool, optional): Whether or not the header should be written. Defaults to True. Only used for csv files.
         """
         if len(self) == 0:
             print("No data to write!")
@@ -334,15 +527,48 @@ class Dataset:
         
         if columnnames == None:
             columnnames = self.get_column_names()
-        
-        with open(filename, 'w+', newline='', encoding='utf-8-sig') as out_file:
-            writer = csv.DictWriter(out_file, fieldnames=columnnames, delimiter=delimiter, quoting=csv.QUOTE_MINIMAL)
-            
-            if write_header:
-                writer.writeheader()
-                
-            writer.writerows(self._rows.values())
+
+        with stage(f'write_to_file:{os.path.basename(filename)}', rows=len(self)):
+            if is_columnar_file(filename):
+                self._write_parquet(filename, columnnames)
+                return
+
+            with open(filename, 'w+', newline='', encoding='utf-8-sig') as out_file:
+                writer = csv.DictWriter(out_file, fieldnames=columnnames, delimiter=delimiter, quoting=csv.QUOTE_MINIMAL)
+
+                if write_header:
+                    writer.writeheader()
+
+                writer.writerows(self._rows.values())
     
+    def _write_parquet(self, filename: str, columnnames: Sequence[str]):
+        _require_pyarrow()
+
+        arrays, tuple_columns = [], []
+        for name in columnnames:
+            array, has_tuples = _arrow_column([row.get(name) for row in self._rows.values()])
+            arrays.append(array)
+            if has_tuples: tuple_columns.append(name)
+
+        table = pa.Table.from_arrays(arrays, names=list(columnnames))
+        table = table.replace_schema_metadata({ TUPLE_COLUMNS_KEY: ','.join(tuple_columns).encode() })
+        pq.write_table(table, filename)
+
+    @staticmethod
+    def _read_parquet(filename: str, columns: Sequence[str] | None) -> list[Row]:
+        _require_pyarrow()
+
+        table = pq.read_table(filename, columns=list(columns) if columns is not None else None)
+        metadata = table.schema.metadata or {}
+        tuple_columns = set(filter(None, metadata.get(TUPLE_COLUMNS_KEY, b'').decode().split(',')))
+
+        data = table.to_pydict()
+        for name in tuple_columns & set(data):
+            data[name] = [None if value is None else [tuple(item.values()) for item in value] for value in data[name]]
+
+        names = list(data)
+        return [dict(zip(names, values)) for values in zip(*data.values())]
+
     @staticmethod
     def cross_data(data_1: Dataset, data_2: Dataset, func: Callable[[Row, Row], None]):
         """ Run a function on the cross product of two data sets
@@ -362,7 +588,10 @@ class Dataset:
                 func(row_1, row_2)
     
     @staticmethod
-    def load_file(filename: str, conversion_map: ConversionMap | None = None, primary_key='id', delimiter: str =',', fieldnames: Sequence[str] | None=None, has_header=True, primary_key_start=0):
+    def load_file(
+        filename: str, conversion_map: ConversionMap | None = None, primary_key='id', delimiter: str =',', fieldnames: Sequence[str] | None=None,
+        has_header=True, primary_key_start=0, columns: Sequence[str] | None = None, on_bad_rows: str = 'raise'
+    ):
         """Load data from a csv file
         
         WARNING: conversion_map is deprecated. Don't use conversion_map instead use conver_property() and rename_property()
@@ -390,17 +619,52 @@ class Dataset:
             delimiter (str, optional): The delimiter used by the csv file. Defaults to ','.
             fieldnames (Sequence[str] | None): The names to use for the fields. Defaults to None.
             has_header (boolean): Whether or not there is a header row in the file. Must be true if fieldnames is None.
+            columns (Sequence[str], optional): Only load these columns (plus the primary key if the file has one). Parquet files only
+                read these columns from disk. Defaults to None, i.e. all columns.
+            on_bad_rows (str, optional): What to do with csv rows that have values the conversions fail on. 'raise' raises one exception
+                listing all of them, 'drop' leaves them out and prints a summary. Defaults to 'raise'.
 
         Returns:
             RowData: The loaded data
         """        
         
+        with stage(f'load_file:{os.path.basename(filename)}') as timer:
+            if is_columnar_file(filename):
+                data = Dataset._load_parquet(filename, conversion_map, primary_key, primary_key_start, columns)
+            else:
+                data = Dataset._load_csv(filename, conversion_map, primary_key, delimiter, fieldnames, has_header, primary_key_start, columns, on_bad_rows)
+            timer.rows = len(data)
+        return data
+
+    @staticmethod
+    def _load_csv(
+        filename: str, conversion_map: ConversionMap | None, primary_key: str, delimiter: str, fieldnames: Sequence[str] | None,
+        has_header: bool, primary_key_start: int, columns: Sequence[str] | None, on_bad_rows: str
+    ) -> Dataset:
         # Make sure there is fieldname information somewhere
         if (fieldnames == None and not has_header):
             raise Exception("If fieldnames is None then has_header must be True")
         
         # Open the file
         with open(filename, 'r', encoding='utf-8-sig') as input_file:
+            if Schema.supports(conversion_map):
+                # Resolve the columns once and convert a column at a time
+                reader = csv.reader(input_file, quoting=csv.QUOTE_MINIMAL, delimiter=delimiter)
+                if has_header:
+                    header = next(reader, [])
+                    if fieldnames is None:
+                        fieldnames = header
+
+                keep = None
+                if columns is not None:
+                    unknown = [name for name in columns if name not in fieldnames]   # type: ignore
+                    if unknown:
+                        raise Exception(f"{unknown} are not columns of {filename}. The availiable fieldnames are {list(fieldnames)}")   # type: ignore
+                    keep = [*([primary_key] if primary_key in fieldnames and primary_key not in columns else []), *columns]    # type: ignore
+
+                data = Schema(conversion_map, on_bad_rows).read(reader, fieldnames, primary_key, primary_key_start, keep)   # type: ignore
+                return Dataset(data, primary_key)
+
             data = []
             
             # Read each row of the file
@@ -408,34 +672,54 @@ class Dataset:
             # Read the header if necessary
             if(fieldnames != None and has_header):
                 next(rows)
+            file_fieldnames = rows.fieldnames or []
+
+            if columns is not None:
+                keep = [*([primary_key] if primary_key in file_fieldnames and primary_key not in columns else []), *columns]
+                rows = ({ name: row[name] for name in keep } for row in rows)   # type: ignore
             
-            if conversion_map != None:
-                # Make all conversions using IndexedConversionMap
-                conversions, required_fieldnames = Dataset._fix_conversion(conversion_map)
-                
-                for req_name in required_fieldnames:
-                    if req_name not in rows.fieldnames:
-                        print(f"{req_name} is not a valid fieldname. The availiable fieldnames are {rows.fieldnames}")
+            # RowFunctions need the whole row so conversions are made row by row
+            conversions, required_fieldnames = Dataset._fix_conversion(conversion_map)   # type: ignore
+            
+            for req_name in required_fieldnames:
+                if req_name not in file_fieldnames:
+                    print(f"{req_name} is not a valid fieldname. The availiable fieldnames are {file_fieldnames}")
+            
+            # Read each row
+            for i, row in enumerate(rows):
+                # Apply the conversion to the row to get a result
+                result = { key: conversions[key](row, i) for key in conversions }
                 
-                # Read each row
-                for i, row in enumerate(rows):
-                    # Apply the conversion to the row to get a result
-                    result = { key: conversions[key](row, i) for key in conversions }
-                    
-                    if primary_key not in result:
-                        result[primary_key] = i + primary_key_start
-                    
-                    data.append(result)
-            else:
-                data = list(rows)
+                if primary_key not in result:
+                    result[primary_key] = i + primary_key_start
                 
-                # Generate a primary key if it is not in the data
-                if len(data) > 0 and primary_key not in data[0]:
-                    for i, row in enumerate(data):
-                        row[primary_key] = i + primary_key_start
+                data.append(result)
                 
             return Dataset(data, primary_key)
         
+    @staticmethod
+    def _load_parquet(filename: str, conversion_map: ConversionMap | None, primary_key: str, primary_key_start: int, columns: Sequence[str] | None) -> Dataset:
+        """Load a Parquet file written by write_to_file. The values already have their types so conversions are usually unnecessary."""
+        _require_pyarrow()
+        available = pq.read_schema(filename).names
+
+        if columns is not None:
+            columns = [*([primary_key] if primary_key in available and primary_key not in columns else []), *columns]
+        elif conversion_map is not None and not any(isinstance(conversion, RowFunction) for conversion in conversion_map.values()):
+            # Only read the columns the conversions use. RowFunctions can use any column.
+            columns = [name for name in Dataset._fix_conversion(conversion_map)[1] if name in available]
+
+        rows = Dataset._read_parquet(filename, columns)
+        if conversion_map is not None:
+            conversions, _ = Dataset._fix_conversion(conversion_map)
+            rows = [{ key: conversions[key](row, i) for key in conversions } for i, row in enumerate(rows)]
+
+        if len(rows) > 0 and primary_key not in rows[0]:
+            for i, row in enumerate(rows):
+                row[primary_key] = i + primary_key_start
+
+        return Dataset(rows, primary_key)
+
     @staticmethod
     def _fix_conversion(conversions: ConversionMap) -> tuple[dict[str, Callable[[Row, int], Any]], list[str]]:
         """Modify a ConversionMap to only use IndexedConversionFunctions   
@@ -0,0 +1,325 @@
+from __future__ import annotations
+
+import os
+import json
+import numpy as np
+
+from abc import ABC
+from abc import abstractmethod
+from time import sleep
+from collections import OrderedDict
+from collections.abc import Sequence
+from concurrent.futures import ThreadPoolExecutor
+
+from .files import atomic_write
+
+try:
+    import rasterio
+except ImportError:
+    rasterio = None
+
+try:
+    import requests
+except ImportError:
+    requests = None
+
+TILE_EXTENSIONS = ('.asc', '.tif', '.tiff')
+
+def rasterio_available() -> bool:
+    """Whether rasterio is installed so GeoTIFF tiles can be read"""
+    return rasterio is not None
+
+class DemTile:
+    def __init__(self, filename: str):
+        """A tile of a digital elevation model
+
+        The tile must be in longitude/latitude coordinates. ESRI ASCII grids (.asc) are read directly, GeoTIFFs (.tif) require rasterio.
+        The first time the values of a tile are read they are written to a .npy file next to the tile, which is memory-mapped from then on.
+
+        Args:
+            filename (str): The path of the tile
+        """
+        self.filename = filename
+        self.cache_filename = os.path.splitext(filename)[0] + '.npy'
+
+        if filename.lower().endswith('.asc'):
+            header = _read_ascii_header(filename)
+            self.columns = int(header['ncols'])
+            self.rows = int(header['nrows'])
+            self.cell_size = float(header['cellsize'])
+            self.nodata = float(header.get('nodata_value', -9999))
+            self._header_lines = len(header)
+
+            if 'xllcenter' in header:
+                self.left = float(header['xllcenter']) - self.cell_size / 2
+                self.bottom = float(header['yllcenter']) - self.cell_size / 2
+            else:
+                self.left = float(header['xllcorner'])
+                self.bottom = float(header['yllcorner'])
+        else:
+            if rasterio is None:
+                raise Exception(f"Reading {filename} requires rasterio. Install it with pip install -r requirements-optional.txt or convert the tile to an ASCII grid.")
+            with rasterio.open(filename) as raster:
+                self.columns = raster.width
+                self.rows = raster.height
+                self.cell_size = raster.transform.a
+                self.nodata = raster.nodata if raster.nodata is not None else np.nan
+                self.left = raster.bounds.left
+                self.bottom = raster.bounds.bottom
+
+        self.right = self.left + self.columns * self.cell_size
+        self.top = self.bottom + self.rows * self.cell_size
+
+    def contains(self, longitudes: np.ndarray, latitudes: np.ndarray) -> np.ndarray:
+        """Which of the points are inside the tile"""
+        return (longitudes >= self.left) & (longitudes <= self.right) & (latitudes >= self.bottom) & (latitudes <= self.top)
+
+    def read(self) -> np.ndarray:
+        """Get the elevations of the tile as a memory-mapped array with the first row at the top. Missing values are NaN."""
+        if not os.path.exists(self.cache_filename) or os.path.getmtime(self.cache_filename) < os.path.getmtime(self.filename):
+            if self.filename.lower().endswith('.asc'):
+                values = np.loadtxt(self.filename, skiprows=self._header_lines, dtype=np.float32, ndmin=2)
+            else:
+                with rasterio.open(self.filename) as raster:
+                    values = raster.read(1).astype(np.float32)
+            values[values == self.nodata] = np.nan
+
+            # An interrupted write mustn't be mistaken for a cached tile
+            with atomic_write(self.cache_filename, 'wb') as cache_file:
+                np.save(cache_file, values)
+
+        return np.load(self.cache_filename, mmap_mode='r')
+
+    def sample(self, values: np.ndarray, longitudes: np.ndarray, latitudes: np.ndarray) -> np.ndarray:
+        """Bilinearly interpolate the elevations of points inside the tile
+
+        Args:
+            values (np.ndarray): The values of the tile as returned by read
+            longitudes (np.ndarray): The longitudes of the points
+            latitudes (np.ndarray): The latitudes of the points
+
+        Returns:
+            np.ndarray: The elevations. NaN where any of the surrounding cells has no value.
+        """
+        # Position relative to the cell centres
+        column = np.clip((longitudes - self.left) / self.cell_size - 0.5, 0, self.columns - 1)
+        row = np.clip((self.top - latitudes) / self.cell_size - 0.5, 0, self.rows - 1)
+
+        column_0 = np.floor(column).astype(np.intp)
+        row_0 = np.floor(row).astype(np.intp)
+        column_1 = np.minimum(column_0 + 1, self.columns - 1)
+        row_1 = np.minimum(row_0 + 1, self.rows - 1)
+        dx = column - column_0
+        dy = row - row_0
+
+        top = values[row_0, column_0] * (1 - dx) + values[row_0, column_1] * dx
+        bottom = values[row_1, column_0] * (1 - dx) + values[row_1, column_1] * dx
+        return top * (1 - dy) + bottom * dy
+
+class DemTileSet:
+    def __init__(self, filenames: Sequence[str], max_open_tiles: int = 16):
+        """A digital elevation model made up of any number of tiles
+
+        Args:
+            filenames (Sequence[str]): The paths of the tiles
+            max_open_tiles (int, optional): The number of tiles to keep mapped between samples. Defaults to 16.
+        """
+        if not filenames:
+            raise Exception("A DEM needs at least one tile")
+        self.tiles = [DemTile(filename) for filename in filenames]
+        self.max_open_tiles = max_open_tiles
+        self._open_tiles: OrderedDict[int, np.ndarray] = OrderedDict()
+
+    @staticmethod
+    def tile_filenames(folder: str) -> list[str]:
+        """Get the paths of the tiles in a folder. Empty if the folder doesn't exist."""
+        if not os.path.isdir(folder): return []
+        return sorted(
+            os.path.join(folder, name) for name in os.listdir(folder) if name.lower().endswith(TILE_EXTENSIONS)
+        )
+
+    @staticmethod
+    def from_folder(folder: str, max_open_tiles: int = 16) -> DemTileSet:
+        """Use every tile in a folder"""
+        filenames = DemTileSet.tile_filenames(folder)
+        if not filenames:
+            raise Exception(f"No DEM tiles ({', '.join(TILE_EXTENSIONS)} files) were found in {os.path.abspath(folder)}")
+        return DemTileSet(filenames, max_open_tiles)
+
+    def _values(self, tile_index: int) -> np.ndarray:
+        if tile_index in self._open_tiles:
+            self._open_tiles.move_to_end(tile_index)
+        else:
+            self._open_tiles[tile_index] = self.tiles[tile_index].read()
+            if len(self._open_tiles) > self.max_open_tiles:
+                self._open_tiles.popitem(last=False)
+        return self._open_tiles[tile_index]
+
+    def sample(self, longitudes: Sequence[float], latitudes: Sequence[float]) -> np.ndarray:
+        """Get the elevations of points
+
+        Args:
+            longitudes (Sequence[float]): The longitudes of the points
+            latitudes (Sequence[float]): The latitudes of the points
+
+        Returns:
+            np.ndarray: The elevations. NaN for points outside every tile or on missing values.
+        """
+        longitudes = np.asarray(longitudes, dtype=float)
+        latitudes = np.asarray(latitudes, dtype=float)
+
+        elevations = np.full(len(longitudes), np.nan)
+        remaining = np.ones(len(longitudes), dtype=bool)
+        for i, tile in enumerate(self.tiles):
+            inside = remaining & tile.contains(longitudes, latitudes)
+            if not inside.any(): continue
+
+            elevations[inside] = tile.sample(self._values(i), longitudes[inside], latitudes[inside])
+            # Points on the edge between tiles are sampled from the first tile that has a value
+            remaining[inside] = np.isnan(elevations[inside])
+
+        return elevations
+
+def _read_ascii_header(filename: str) -> dict[str, str]:
+    """Read the 'key value' header lines at the start of an ESRI ASCII grid"""
+    header = {}
+    with open(filename, 'r') as file:
+        for line in file:
+            parts = line.split()
+            if len(parts) != 2 or not parts[0][0].isalpha(): break
+            header[parts[0].lower()] = parts[1]
+    return header
+
+def segment_slope(start_elevation: float | None, end_elevation: float | None, length: float | None) -> float | None:
+    """The slope of a segment as the change in elevation over its length. None if any value is missing or the length is 0."""
+    if start_elevation is None or end_elevation is None or not length:
+        return None
+    if np.isnan(start_elevation) or np.isnan(end_elevation):
+        return None
+    return (end_elevation - start_elevation) / length
+
+class ElevationProvider(ABC):
+    """Looks up the elevations of points. Subclasses implement lookup."""
+
+    @abstractmethod
+    def lookup(self, longitudes: Sequence[float], latitudes: Sequence[float]) -> list[float | None]:
+        """Get the elevations of points
+
+        Args:
+            longitudes (Sequence[float]): The longitudes of the points
+            latitudes (Sequence[float]): The latitudes of the points
+
+        Returns:
+            list[float | None]: The elevations. None where the elevation is unknown.
+        """
+
+class DemElevationProvider(ElevationProvider):
+    def __init__(self, dem: DemTileSet):
+        """Looks up elevations in local DEM tiles
+
+        Args:
+            dem (DemTileSet): The tiles
+        """
+        self.dem = dem
+
+    def lookup(self, longitudes: Sequence[float], latitudes: Sequence[float]) -> list[float | None]:
+        return [None if np.isnan(elevation) else float(elevation) for elevation in self.dem.sample(longitudes, latitudes)]
+
+class HttpElevationProvider(ElevationProvider):
+    def __init__(self, url: str, batch_size: int = 1000, workers: int = 4, max_retries: int = 5, retry_delay: float = 1.0, timeout: float = 60):
+        """Looks up elevations with an Open-Elevation compatible service
+
+        The points are sent in batches, several at a time. Batches that fail are retried with exponential backoff.
+
+        Args:
+            url (str): The lookup url. eg: https://api.open-elevation.com/api/v1/lookup
+            batch_size (int, optional): The number of points per request. Defaults to 1000.
+            workers (int, optional): The number of requests to send at once. Defaults to 4.
+            max_retries (int, optional): The number of times a batch is retried. Defaults to 5.
+            retry_delay (float, optional): The number of seconds to wait before the first retry. The delay doubles after each
+                retry. Defaults to 1.0.
+            timeout (float, optional): The number of seconds to wait for a response. Defaults to 60.
+        """
+        if requests is None:
+            raise Exception("HttpElevationProvider requires requests")
+        self.url = url
+        self.batch_size = batch_size
+        self.workers = workers
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.timeout = timeout
+
+    def _lookup_batch(self, locations: list[dict[str, float]]) -> list[float | None]:
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = requests.post(self.url, json={'locations': locations}, timeout=self.timeout)
+                response.raise_for_status()
+                results = response.json()['results']
+                if len(results) != len(locations):
+                    raise Exception(f"Expected {len(locations)} elevations but got {len(results)}")
+                return [result['elevation'] for result in results]
+            except (requests.RequestException, ValueError, KeyError) as error:
+                if attempt == self.max_retries: raise
+
+                delay = self.retry_delay * (2 ** attempt)
+                print(f"    {type(error).__name__}: {error}. Retrying in {delay:g}s ({attempt + 1}/{self.max_retries})")
+                sleep(delay)
+        return []
+
+    def lookup(self, longitudes: Sequence[float], latitudes: Sequence[float]) -> list[float | None]:
+        locations = [{'longitude': float(longitude), 'latitude': float(latitude)} for longitude, latitude in zip(longitudes, latitudes)]
+        batches = [locations[i:i + self.batch_size] for i in range(0, len(locations), self.batch_size)]
+
+        with ThreadPoolExecutor(self.workers) as executor:
+            results = list(executor.map(self._lookup_batch, batches))
+
+        return [elevation for batch in results for elevation in batch]
+
+class CachedElevationProvider(ElevationProvider):
+    def __init__(self, provider: ElevationProvider, cache_filename: str, precision: int = 6):
+        """Remembers the elevations found by another provider in a file so each point is only looked up once
+
+        Points are keyed on their coordinates rounded to [precision] decimal places. Unknown elevations are not cached.
+
+        Args:
+            provider (ElevationProvider): The provider used for points that aren't in the cache
+            cache_filename (str): The JSON file to keep the elevations in
+            precision (int, optional): The number of decimal places of the keys. Defaults to 6, about 10cm.
+        """
+        self.provider = provider
+        self.cache_filename = cache_filename
+        self.precision = precision
+
+        self._cache: dict[str, float] = {}
+        if os.path.exists(cache_filename):
+            with open(cache_filename, 'r', encoding='utf-8') as cache_file:
+                self._cache = json.load(cache_file)
+
+    def _key(self, longitude: float, latitude: float) -> str:
+        return f'{longitude:.{self.precision}f},{latitude:.{self.precision}f}'
+
+    def lookup(self, longitudes: Sequence[float], latitudes: Sequence[float]) -> list[float | None]:
+        keys = [self._key(longitude, latitude) for longitude, latitude in zip(longitudes, latitudes)]
+
+        # Each missing coordinate is only looked up once even if several points round to it
+        missing = {}
+        for key, longitude, latitude in zip(keys, longitudes, latitudes):
+            if key not in self._cache and key not in missing:
+                missing[key] = (longitude, latitude)
+
+        if missing:
+            print(f"    Looking up {len(missing)} of {len(keys)} elevations")
+            found = self.provider.lookup([point[0] for point in missing.values()], [point[1] for point in missing.values()])
+            self._cache.update({ key: elevation for key, elevation in zip(missing, found) if elevation is not None })
+            self.save()
+
+        return [self._cache.get(key) for key in keys]
+
+    def save(self):
+        """Write the cache to its file"""
+        directory = os.path.dirname(self.cache_filename)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with atomic_write(self.cache_filename) as cache_file:
+            json.dump(self._cache, cache_file)
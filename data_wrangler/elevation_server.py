@@ -0,0 +1,129 @@
+"""A local stand-in for an Open-Elevation compatible service
+
+Answers POST /api/v1/lookup with {'locations': [{'latitude', 'longitude'}, ...]} from an ElevationProvider or a function of the
+coordinates, so elevation lookups can be developed and checked without network access.
+
+    python -m data_wrangler.elevation_server --port 8080 --dem data/original_data/dem
+"""
+
+from __future__ import annotations
+
+import json
+import argparse
+import threading
+
+from typing import Callable
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+
+from .elevation import ElevationProvider
+from .elevation import DemElevationProvider
+from .elevation import DemTileSet
+
+LOOKUP_PATH = '/api/v1/lookup'
+
+class StubElevationServer:
+    def __init__(self, elevation: ElevationProvider | Callable[[float, float], float | None], host: str = '127.0.0.1', port: int = 0):
+        """Serve elevations in a background thread
+
+        Args:
+            elevation (ElevationProvider | Callable[[float, float], float | None]): Where the elevations come from. Either a
+                provider or a function taking a longitude and latitude.
+            host (str, optional): The address to listen on. Defaults to '127.0.0.1'.
+            port (int, optional): The port to listen on. Defaults to 0, i.e. any free port.
+        """
+        self.elevation = elevation
+        # The number of requests and the number of locations that have been looked up. Useful for checking caching and batching.
+        self.request_count = 0
+        self.location_count = 0
+        # The (longitude, latitude) points of each request that was answered
+        self.requests: list[list[tuple[float, float]]] = []
+        # The number of upcoming requests to answer with 503 Service Unavailable, to check that clients retry
+        self.failures = 0
+        self._lock = threading.Lock()
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                if self.path != LOOKUP_PATH:
+                    self.send_error(404)
+                    return
+
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                if server._fail():
+                    self.send_error(503)
+                    return
+
+                locations = body['locations']
+                elevations = server._lookup([location['longitude'] for location in locations], [location['latitude'] for location in locations])
+
+                response = json.dumps({
+                    'results': [location | {'elevation': elevation} for location, elevation in zip(locations, elevations)]
+                }).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(response)))
+                self.end_headers()
+                self.wfile.write(response)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        """The lookup url of the server"""
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}{LOOKUP_PATH}'
+
+    def _fail(self) -> bool:
+        """Whether to fail the current request"""
+        with self._lock:
+            if self.failures <= 0: return False
+            self.failures -= 1
+            return True
+
+    def _lookup(self, longitudes: list[float], latitudes: list[float]) -> list[float | None]:
+        with self._lock:
+            self.request_count += 1
+            self.location_count += len(longitudes)
+            self.requests.append(list(zip(longitudes, latitudes)))
+
+        if isinstance(self.elevation, ElevationProvider):
+            return self.elevation.lookup(longitudes, latitudes)
+        return [self.elevation(longitude, latitude) for longitude, latitude in zip(longitudes, latitudes)]
+
+    def start(self) -> StubElevationServer:
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> StubElevationServer:
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve elevations from local DEM tiles, or 0 everywhere, like an Open-Elevation service")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--dem', help="The folder of DEM tiles to serve. Every elevation is 0 if not given")
+    args = parser.parse_args()
+
+    elevation = DemElevationProvider(DemTileSet.from_folder(args.dem)) if args.dem else (lambda longitude, latitude: 0.0)
+    server = StubElevationServer(elevation, args.host, args.port)
+    print(f"Serving elevations at {server.url}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+if __name__ == "__main__":
+    main()
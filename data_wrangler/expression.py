@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import operator
+import numpy as np
+
+from abc import ABC
+from abc import abstractmethod
+from typing import Any
+from typing import Callable
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .dataset import Dataset
+
+class Expression(ABC):
+    """A calculation over the columns of a dataset that is evaluated for all rows at once with numpy
+
+    Build expressions with col and the usual operators. Use & | ~ instead of and, or, not.
+    eg: (col('latitude') != 0) | (col('longitude') != 0)
+
+    Gathering the columns into numpy and writing the results back costs more than it saves for conversions, comparisons and
+    simple arithmetic, which are faster as plain functions and lambdas. parse_list is much faster than literal_eval.
+    """
+
+    def evaluate(self, data: Dataset, columns: dict[str, np.ndarray] | None = None) -> np.ndarray:
+        """Get the value of the expression for every row of a dataset
+
+        Args:
+            data (Dataset): The dataset
+            columns (dict[str, np.ndarray], optional): Columns that have already been read. Columns that are read are added to it.
+
+        Returns:
+            np.ndarray: The values in the order of the rows
+        """
+        if columns is None: columns = {}
+        values = self._evaluate(data, columns)
+        if np.ndim(values) == 0:
+            return np.full(len(data), values, dtype=object if isinstance(values, str) else None)
+        return values
+
+    @abstractmethod
+    def _evaluate(self, data: Dataset, columns: dict[str, np.ndarray]) -> Any:
+        """Get the value of the expression for every row, or a single value for all of them"""
+
+    def _operation(self, function: Callable, *others: Any) -> Expression:
+        return _Operation(function, [self, *others])
+
+    def __eq__(self, other): return self._operation(operator.eq, other)       # type: ignore
+    def __ne__(self, other): return self._operation(operator.ne, other)       # type: ignore
+    def __lt__(self, other): return self._operation(operator.lt, other)
+    def __le__(self, other): return self._operation(operator.le, other)
+    def __gt__(self, other): return self._operation(operator.gt, other)
+    def __ge__(self, other): return self._operation(operator.ge, other)
+
+    def __add__(self, other): return self._operation(operator.add, other)
+    def __sub__(self, other): return self._operation(operator.sub, other)
+    def __mul__(self, other): return self._operation(operator.mul, other)
+    def __truediv__(self, other): return self._operation(operator.truediv, other)
+    def __floordiv__(self, other): return self._operation(operator.floordiv, other)
+    def __mod__(self, other): return self._operation(operator.mod, other)
+    def __pow__(self, other): return self._operation(operator.pow, other)
+    def __radd__(self, other): return _Operation(operator.add, [other, self])
+    def __rsub__(self, other): return _Operation(operator.sub, [other, self])
+    def __rmul__(self, other): return _Operation(operator.mul, [other, self])
+    def __rtruediv__(self, other): return _Operation(operator.truediv, [other, self])
+    def __neg__(self): return self._operation(operator.neg)
+    def __abs__(self): return self._operation(np.abs)
+
+    def __and__(self, other): return self._operation(np.logical_and, other)
+    def __or__(self, other): return self._operation(np.logical_or, other)
+    def __invert__(self): return self._operation(np.logical_not)
+
+    def __bool__(self):
+        raise Exception("Expressions can't be used as booleans. Use & | ~ instead of and, or, not.")
+
+    __hash__ = None   # type: ignore
+
+    def astype(self, dtype: type) -> Expression:
+        """Convert the values. eg: col('id').astype(int)"""
+        return self._operation(lambda values: np.asarray(values).astype(dtype))
+
+    def isin(self, values) -> Expression:
+        """Whether each value is one of [values]"""
+        values = set(values)
+        return self.map(lambda value: value in values, dtype=bool)
+
+    def isnull(self) -> Expression:
+        """Whether each value is None or ''"""
+        return self.map(lambda value: value is None or value == '', dtype=bool)
+
+    def len(self) -> Expression:
+        """The length of each value. eg: the number of items in a list column"""
+        return self.map(len, dtype=np.intp)
+
+    def parse_list(self, field: int | None = None) -> Expression:
+        """Parse list literals written by write_to_file, eg: '[3029, 3218]', "['S110', 'S200']" or '[(24, 774.7, 7756)]'.
+        The whole column is parsed at once. See data_wrangler.list_literals
+
+        Args:
+            field (int, optional): Only keep this position of each tuple. Defaults to None, i.e. the whole tuples.
+        """
+        from .list_literals import parse_lists
+        return self._operation(lambda values: _to_array(parse_lists(values).lists(field)))
+
+    def map(self, function: Callable[[Any], Any], dtype: Any = None) -> Expression:
+        """Apply a Python function to each value. Use for calculations numpy can't do in bulk.
+
+        Args:
+            function (Callable[[Any], Any]): The function
+            dtype (Any, optional): The type of the results. Defaults to None, i.e. inferred from the results.
+        """
+        def apply(values):
+            results = [function(value) for value in values]
+            return np.array(results, dtype=dtype) if dtype is not None else _to_array(results)
+        return self._operation(apply)
+
+class _Column(Expression):
+    def __init__(self, name: str):
+        self.name = name
+
+    def _evaluate(self, data: Dataset, columns: dict[str, np.ndarray]) -> Any:
+        if self.name not in columns:
+            columns[self.name] = _to_array(list(map(operator.itemgetter(self.name), data)))
+        return columns[self.name]
+
+    def __repr__(self):
+        return f'col({self.name!r})'
+
+class _Operation(Expression):
+    def __init__(self, function: Callable, operands: list[Any]):
+        self.function = function
+        self.operands = operands
+
+    def _evaluate(self, data: Dataset, columns: dict[str, np.ndarray]) -> Any:
+        return self.function(*(
+            operand._evaluate(data, columns) if isinstance(operand, Expression) else operand for operand in self.operands
+        ))
+
+def col(name: str) -> Expression:
+    """Refer to a column of a dataset in an expression
+
+    Args:
+        name (str): The name of the column
+
+    Returns:
+        Expression: The column
+    """
+    return _Column(name)
+
+def _to_array(values: list[Any]) -> np.ndarray:
+    """Convert the values of a column to an array. Numeric columns get a numeric type, anything else is kept as Python objects."""
+    try:
+        array = np.array(values)
+        if array.ndim == 1 and array.dtype.kind in 'biuf':
+            return array
+    except ValueError:
+        # Lists of different lengths
+        pass
+
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+import os
+
+from contextlib import contextmanager
+from typing import IO
+from typing import Iterator
+
+@contextmanager
+def atomic_write(filename: str, mode: str = 'w', encoding: str = 'utf-8') -> Iterator[IO]:
+    """Open a file that replaces [filename] in one step when the block ends
+
+    The data is written to a temporary file next to [filename], which is only moved over it if the block finishes without an
+    exception, so readers and interrupted runs never see a half written file.
+    eg: with atomic_write('checkpoint.json') as checkpoint_file: json.dump(progress, checkpoint_file)
+
+    Args:
+        filename (str): The file to write
+        mode (str, optional): 'w' for text or 'wb' for bytes. Defaults to 'w'.
+        encoding (str, optional): The encoding of text files. Defaults to 'utf-8'.
+
+    Yields:
+        IO: The temporary file to write to
+    """
+    # The process id keeps processes writing the same file at once from sharing a temporary file
+    temp_filename = f'{filename}.{os.getpid()}.tmp'
+    try:
+        with open(temp_filename, mode, encoding=None if 'b' in mode else encoding) as temp_file:
+            yield temp_file
+        os.replace(temp_filename, filename)
+    finally:
+        if os.path.exists(temp_filename):
+            os.remove(temp_filename)
@@ -1,89 +1,179 @@
+from time import sleep
+
 from neo4j import Session
+from neo4j.exceptions import TransientError, ServiceUnavailable, SessionExpired
 
 from .category import Category
 from .relationship import Relationship
+from .checkpoint import Checkpoint
+from .instrumentation import stage
+from .progress import progress
+
+# Errors that are worth retrying because they are caused by the connection or the database state, not by the query
+RETRYABLE_ERRORS = (TransientError, ServiceUnavailable, SessionExpired)
+
+# The label of the nodes that record the committed rows of each key in the database itself, see GraphWriter
+CHECKPOINT_LABEL = 'LoadCheckpoint'
+
+# Added to the batch queries when there is a checkpoint so the batch and the record of it are committed together
+CHECKPOINT_CLAUSE = (
+    f'WITH count(*) AS written '
+    f'MERGE (checkpoint: {CHECKPOINT_LABEL} {{key: $checkpoint_key}}) '
+    f'SET checkpoint.rows = $checkpoint_rows'
+)
 
 class GraphWriter:
 
-    def __init__(self, session: Session):
+    def __init__(self, session: Session, checkpoint: Checkpoint | None = None, max_retries: int = 5, retry_delay: float = 1.0):
+        """ Create a writer for a Neo4j session
+
+        Args:
+            session (Session): The session to write with
+            checkpoint (Checkpoint, optional): Where to record committed batches. If given, batches that have already
+                been committed are skipped. Each batch also records its rows in a LoadCheckpoint node in the same transaction,
+                so a batch that was committed just before the load was interrupted isn't written twice even if it is missing
+                from the checkpoint file. Defaults to None, i.e. everything is written.
+            max_retries (int, optional): The number of times a batch is retried after a transient error. Defaults to 5.
+            retry_delay (float, optional): The number of seconds to wait before the first retry. The delay doubles after each
+                retry. Defaults to 1.0.
+        """
         self._session = session
-    
-    def write_category(self, category: Category):
+        self.checkpoint = checkpoint
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+
+    def _run_batch(self, query: str, **parameters):
+        """ Run a query, retrying with exponential backoff when a transient error occurs
+
+        The query is run in a single auto-commit transaction and the result is consumed, so the batch is either
+        completely committed or not at all when this returns or raises.
+
+        Args:
+            query (str): The query to run
+            parameters: The parameters of the query
+        """
+        for attempt in range(self.max_retries + 1):
+            try:
+                self._session.run(query, **parameters).consume()  # type: ignore
+                return
+            except RETRYABLE_ERRORS as error:
+                if attempt == self.max_retries: raise
+
+                delay = self.retry_delay * (2 ** attempt)
+                print(f"\n    {type(error).__name__}: {error}. Retrying in {delay:g}s ({attempt + 1}/{self.max_retries})")
+                sleep(delay)
+
+    def _record_batch(self, key: str, row_count: int):
+        if self.checkpoint: self.checkpoint.record_batch(key, row_count)
+
+    def _batch_query(self, query: str) -> str:
+        return f'{query} {CHECKPOINT_CLAUSE}' if self.checkpoint else query
+
+    def _checkpoint_parameters(self, key: str, rows: int) -> dict:
+        return { 'checkpoint_key': key, 'checkpoint_rows': rows } if self.checkpoint else {}
+
+    def _start(self, key: str) -> int:
+        """The number of rows of a key that have already been committed"""
+        if not self.checkpoint: return 0
+
+        # The database has the last word since a batch is committed before it is recorded in the file
+        record = self._session.run(
+            f'MATCH (checkpoint: {CHECKPOINT_LABEL} {{key: $key}}) RETURN checkpoint.rows AS rows', key=key   # type: ignore
+        ).single()
+        if record is None or record['rows'] is None:
+            return self.checkpoint.completed_rows(key)
+
+        if record['rows'] != self.checkpoint.completed_rows(key):
+            self.checkpoint.set_completed_rows(key, record['rows'])
+        return record['rows']
+
+    def clear_checkpoints(self):
+        """Delete the LoadCheckpoint nodes once the load has finished so they aren't shown with the data"""
+        self._session.run(f'MATCH (checkpoint: {CHECKPOINT_LABEL}) DELETE checkpoint')   # type: ignore
+
+    def _mark_done(self, key: str):
+        if self.checkpoint: self.checkpoint.mark_done(key)
+
+    def write_category(self, category: Category, batch_size: int | None = None):
         """ Write a category to Neo4j
 
+        The nodes are projected and sent in batches. Each batch is fully consumed by the database before the next one is
+        projected so that only one batch is held in memory and sent over the connection at a time.
+
+        If the writer has a checkpoint, batches that were already committed are skipped and each new batch is recorded.
+
         Args:
-            category_handle (CategoryHandle): The category to write
+            category (Category): The category to write
+            batch_size (int, optional): The number of nodes to send at once. Defaults to the batch size of the category.
         """
-        
-        # Get a list of the properties for the nodes
-        properties = category.get_nodes_properties()
+        key = f'category:{category.name}'
+        if self.checkpoint and self.checkpoint.is_done(key): return
+        start = self._start(key)
 
+        # Each batch is written in a single transaction so a failed batch can be retried without creating duplicates
         # Should be a literal string, not an f-string but this was the only way I could find to set the category
-        query = (
+        query = self._batch_query(
         f"UNWIND $properties AS props "
-        f'CALL {{'
-        f'    WITH props '
-        f'    CREATE (n: {category.name}) '
-        f'    SET n = properties(props) '
-        f'}} IN TRANSACTIONS'
+        f'CREATE (n: {category.name}) '
+        f'SET n = properties(props)'
         )
 
-        # Execute the query
-        self._session.run(
-            query,                      # type: ignore  # Ignoring because it wants a literal string not an f-string
-            properties = properties
-        )
+        # Execute the query for each batch
+        with stage(f'write_category:{category.name}') as timer:
+            for properties in category.iter_nodes_properties(batch_size, start=start):
+                start += len(properties)
+                self._run_batch(query, properties = properties, **self._checkpoint_parameters(key, start))
+                self._record_batch(key, len(properties))
+                timer.add_rows(len(properties))
+        self._mark_done(key)
 
     def write_relation(self, relationship: Relationship, batch_size=1000):
         """ Write a relationship to Neo4j
 
+        If the writer has a checkpoint, batches that were already committed are skipped and each new batch is recorded.
+
         Args:
-            relation_handle (RelationshipHandle): The relationship to write
+            relationship (Relationship): The relationship to write
             batch_size (int, optional): A number of nodes to write the connection for at once. Defaults to 1000.
         """
+        key = f'relationship:{relationship.name}'
+        if self.checkpoint and self.checkpoint.is_done(key): return
+        start = self._start(key)
+
         category1 = relationship.category_1
         category2 = relationship.category_2
 
         # Create the links between categories
-        links = relationship.get_links();
+        with stage(f'get_links:{relationship.name}') as timer:
+            links = relationship.get_links();
+            timer.rows = len(links)
 
         # Create the where clauses for the query
         where_1 = f"WHERE n1.{category1.data.primary_key} = row[0]"
         where_2 = f"WHERE n2.{category2.data.primary_key} = row[1]"
 
         # Create the query
+        # Each batch is written in a single transaction so a failed batch can be retried without creating duplicates
         # Should be a literal string, not an f-string but this was the only way I could find to set the category
-        query = (
+        query = self._batch_query(
         f'UNWIND $data AS row '
-        f'CALL {{ '
-        f'    WITH row '
-        f'    MATCH (n1: {category1.name}) {where_1} '
-        f'    WITH row, n1 '
-        f'    MATCH (n2: {category2.name}) {where_2} '
-        f'    CREATE (n1)-[r:{relationship.name}]->(n2) '
-        f'    SET r = properties(row[2]) '
-        f'}} IN TRANSACTIONS'
+        f'MATCH (n1: {category1.name}) {where_1} '
+        f'WITH row, n1 '
+        f'MATCH (n2: {category2.name}) {where_2} '
+        f'CREATE (n1)-[r:{relationship.name}]->(n2) '
+        f'SET r = properties(row[2])'
         )
 
         # Run the query for each batch
-        for batch in range(0, len(links), batch_size):
-            sub_link_values = links[batch:batch + batch_size]
-            # print(sub_link_values[0])
-            
-            try:
-                self._session.run(
-                    query, # type: ignore
-                    data = sub_link_values
-                )
-            except:
-                print("Could not run write relation.")
-                exit(-1)
-            
-            # Update the progress information
-            print(f"\rWriting {relationship.name} {((batch + len(sub_link_values)) / len(links)):.0%}" + (" " * 10), end='')
-        print(f"\rWriting {relationship.name} 100%" + (" " * 10))
-        
-        
+        with stage(f'write_relation:{relationship.name}', rows=len(links) - start), progress(f'write_relation:{relationship.name}', len(links) - start) as tracker:
+            for batch in range(start, len(links), batch_size):
+                sub_link_values = links[batch:batch + batch_size]
+
+                self._run_batch(query, data = sub_link_values, **self._checkpoint_parameters(key, batch + len(sub_link_values)))
+                self._record_batch(key, len(sub_link_values))
+                tracker.advance(len(sub_link_values))
+        self._mark_done(key)
+
     def clear_category(self, category: Category):
         """ Delete all nodes in a category from the Neo4j database
         
@@ -0,0 +1,290 @@
+from __future__ import annotations
+
+import os
+import sys
+import json
+import time
+import atexit
+import threading
+import multiprocessing
+
+from typing import Any
+from contextlib import contextmanager
+from collections.abc import Iterator
+
+from .files import atomic_write
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# If set, the stages recorded by a script are written to this file when it exits. Pipeline uses it to collect the stages of each script.
+REPORT_ENVIRONMENT_VARIABLE = 'DATA_WRANGLER_REPORT'
+
+class StageRecord:
+    def __init__(self, path: str):
+        """The totals of every run of a named stage
+
+        Args:
+            path (str): The name of the stage after the names of the stages it ran in, joined by '/'. eg: 'load_data/write_category:Crime'
+        """
+        self.path = path
+        self.calls = 0
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.rows: int | None = None
+        self.peak_rss_bytes: int | None = None
+
+    def add(self, wall_seconds: float, cpu_seconds: float, rows: int | None, peak_rss_bytes: int | None, calls: int = 1):
+        self.calls += calls
+        self.wall_seconds += wall_seconds
+        self.cpu_seconds += cpu_seconds
+        if rows is not None:
+            self.rows = (self.rows or 0) + rows
+        if peak_rss_bytes is not None:
+            self.peak_rss_bytes = max(self.peak_rss_bytes or 0, peak_rss_bytes)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            'stage': self.path,
+            'calls': self.calls,
+            'wall_seconds': self.wall_seconds,
+            'cpu_seconds': self.cpu_seconds,
+            'rows': self.rows,
+            'rows_per_second': self.rows / self.wall_seconds if self.rows is not None and self.wall_seconds > 0 else None,
+            'peak_rss_bytes': self.peak_rss_bytes
+        }
+
+class StageTimer:
+    def __init__(self, path: str, rows: int | None):
+        """A run of a stage that hasn't finished. Set rows once the number of rows is known."""
+        self.path = path
+        self.rows = rows
+        self.peak_rss_bytes: int | None = None
+        self._start = time.perf_counter()
+        self._start_cpu = time.process_time()
+
+    def add_rows(self, count: int):
+        self.rows = (self.rows or 0) + count
+
+class Instrumentation:
+    def __init__(self):
+        """Records the wall time, CPU time, rows and peak memory of named stages of a run
+
+        Stages can be nested and are named by their path, so the same function run inside different stages is reported separately.
+        Runs of the same stage are added together. The peak memory of a stage is the largest resident set size of the process while
+        it ran. Where the peak can't be reset (anywhere but Linux) it is the largest since the process started.
+        """
+        self.started = time.time()
+        self.records: dict[str, StageRecord] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._open: list[StageTimer] = []
+        # Resetting the peak of a stage also resets the peak the system keeps for the process, so the largest is kept here
+        self._peak_rss_bytes: int | None = None
+        # The latest progress of each task, see data_wrangler.progress
+        self.progress: dict[str, dict[str, Any]] = {}
+
+    def _stack(self) -> list[StageTimer]:
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    @contextmanager
+    def stage(self, name: str, rows: int | None = None) -> Iterator[StageTimer]:
+        """Record a stage
+
+        Example::
+
+            with instrumentation().stage('match_crimes') as timer:
+                crimes.match_lat_lng(junctions, ...)
+                timer.rows = len(crimes)
+
+        Args:
+            name (str): The name of the stage
+            rows (int, optional): The number of rows the stage processes, if it is known before it starts. Defaults to None.
+
+        Yields:
+            StageTimer: The running stage
+        """
+        stack = self._stack()
+        path = f'{stack[-1].path}/{name}' if stack else name
+        with self._lock:
+            self._sample_peak()
+            timer = StageTimer(path, rows)
+            self._open.append(timer)
+            # Added now so that stages are reported in the order they started
+            self.records.setdefault(path, StageRecord(path))
+        stack.append(timer)
+        try:
+            yield timer
+        finally:
+            stack.pop()
+            wall_seconds = time.perf_counter() - timer._start
+            cpu_seconds = time.process_time() - timer._start_cpu
+            with self._lock:
+                self._sample_peak()
+                # The stage is gone if the instrumentation was cleared while it ran
+                if timer in self._open:
+                    self._open.remove(timer)
+                    self.records[path].add(wall_seconds, cpu_seconds, timer.rows, timer.peak_rss_bytes)
+
+    def _sample_peak(self):
+        """Add the peak memory since the last sample to every open stage and start measuring a new peak"""
+        peak = peak_rss()
+        if peak is None: return
+        self._peak_rss_bytes = max(self._peak_rss_bytes or 0, peak)
+        for timer in self._open:
+            timer.peak_rss_bytes = max(timer.peak_rss_bytes or 0, peak)
+        _reset_peak_rss()
+
+    def add(self, path: str, wall_seconds: float, cpu_seconds: float, rows: int | None = None, peak_rss_bytes: int | None = None, calls: int = 1):
+        """Add a stage that was measured somewhere else, eg: in another process
+
+        Args:
+            path (str): The name of the stage after the names of the stages it ran in, joined by '/'
+            wall_seconds (float): The time it took
+            cpu_seconds (float): The CPU time it used
+            rows (int, optional): The number of rows it processed. Defaults to None.
+            peak_rss_bytes (int, optional): The peak memory of the process that ran it. Defaults to None.
+            calls (int, optional): The number of times it ran. Defaults to 1.
+        """
+        with self._lock:
+            self.records.setdefault(path, StageRecord(path)).add(wall_seconds, cpu_seconds, rows, peak_rss_bytes, calls)
+
+    def merge(self, stages: list[dict[str, Any]], prefix: str | None = None):
+        """Add the stages of another report, eg: from a worker process or a script run by a pipeline
+
+        Args:
+            stages (list[dict[str, Any]]): The 'stages' of the report
+            prefix (str, optional): A stage to put them in. Defaults to None, i.e. the stage open in this thread if there is one.
+        """
+        if prefix is None and self._stack():
+            prefix = self._stack()[-1].path
+        for stage in stages:
+            path = f"{prefix}/{stage['stage']}" if prefix else stage['stage']
+            self.add(path, stage['wall_seconds'], stage['cpu_seconds'], stage['rows'], stage['peak_rss_bytes'], stage['calls'])
+
+    def set_progress(self, task: str, progress: dict[str, Any]):
+        """Keep the latest progress of a task in the report
+
+        Args:
+            task (str): The name of the task
+            progress (dict[str, Any]): Its rows done, total, rows per second, estimated seconds left, etc.
+        """
+        with self._lock:
+            self.progress[task] = progress
+
+    def clear(self):
+        """Forget the recorded stages, including the ones that are still running
+
+        A process forked from one with running stages should clear them before recording its own.
+        """
+        with self._lock:
+            self.records = {}
+            self.progress = {}
+            self._open = []
+            self._local = threading.local()
+            self.started = time.time()
+
+    def report(self) -> dict[str, Any]:
+        """Get the recorded stages
+
+        Returns:
+            dict[str, Any]: When the run started, how long it has taken, the peak memory of the process, the totals of each
+                stage in the order they started and the latest progress of each task
+        """
+        with self._lock:
+            stages = [record.to_dict() for record in self.records.values()]
+            progress = dict(self.progress)
+        return {
+            'started': time.strftime('%Y-%m-%dT%H:%M:%S%z', time.localtime(self.started)),
+            'wall_seconds': time.time() - self.started,
+            'cpu_seconds': time.process_time(),
+            'peak_rss_bytes': max((peak for peak in (peak_rss(), self._peak_rss_bytes) if peak is not None), default=None),
+            'pid': os.getpid(),
+            'command': sys.argv,
+            'stages': stages,
+            'progress': progress
+        }
+
+    def write_report(self, filename: str):
+        """Write the report to a json file"""
+        with atomic_write(filename) as report_file:
+            json.dump(self.report(), report_file, indent=4)
+
+    def summary_table(self) -> str:
+        """Get a table of the recorded stages with nested stages indented"""
+        return summary_table(self.report()['stages'])
+
+_instrumentation = Instrumentation()
+
+def instrumentation() -> Instrumentation:
+    """Get the instrumentation shared by data_wrangler and the scripts that use it"""
+    return _instrumentation
+
+def stage(name: str, rows: int | None = None):
+    """Record a stage with the shared instrumentation. See Instrumentation.stage"""
+    return _instrumentation.stage(name, rows)
+
+def summary_table(stages: list[dict[str, Any]]) -> str:
+    """Make a table of stages from a report
+
+    Args:
+        stages (list[dict[str, Any]]): The 'stages' of a report
+
+    Returns:
+        str: The table
+    """
+    lines = [f"{'stage':<56} {'calls':>6} {'wall s':>9} {'cpu s':>9} {'rows':>11} {'rows/s':>11} {'peak MiB':>9}"]
+    for stage in stages:
+        depth = stage['stage'].count('/')
+        name = '  ' * depth + stage['stage'].rsplit('/', 1)[-1]
+        rows = f"{stage['rows']:,}" if stage['rows'] is not None else ''
+        rate = f"{stage['rows_per_second']:,.0f}" if stage['rows_per_second'] is not None else ''
+        peak = f"{stage['peak_rss_bytes'] / 2**20:.0f}" if stage['peak_rss_bytes'] is not None else ''
+        lines.append(f"{name[:56]:<56} {stage['calls']:>6} {stage['wall_seconds']:>9.2f} {stage['cpu_seconds']:>9.2f} {rows:>11} {rate:>11} {peak:>9}")
+    return '\n'.join(lines)
+
+def format_duration(seconds: float) -> str:
+    """Format a number of seconds as minutes:seconds, eg: 95 is '1:35'"""
+    minutes, seconds = divmod(int(seconds), 60)
+    return f"{minutes}:{seconds:02d}"
+
+def peak_rss() -> int | None:
+    """Get the largest resident set size of this process in bytes since the peak was last reset, or None if it isn't available"""
+    try:
+        with open('/proc/self/status', 'r') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return _lifetime_peak_rss()
+
+def _lifetime_peak_rss() -> int | None:
+    if resource is None: return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes and macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+_can_reset_peak = sys.platform.startswith('linux')
+
+def _reset_peak_rss():
+    """Start measuring a new peak, where the system allows it"""
+    global _can_reset_peak
+    if not _can_reset_peak: return
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+    except OSError:
+        _can_reset_peak = False
+
+def _write_report_at_exit():
+    filename = os.environ.get(REPORT_ENVIRONMENT_VARIABLE)
+    # Processes started by multiprocessing inherit the variable but only the script itself should write the report
+    if filename and multiprocessing.parent_process() is None:
+        _instrumentation.write_report(filename)
+
+atexit.register(_write_report_at_exit)
@@ -0,0 +1,215 @@
+from __future__ import annotations
+
+import numpy as np
+
+from ast import literal_eval
+from typing import Any
+from collections.abc import Iterable
+
+# Characters that are removed from tuple lists to leave only the numbers
+_BRACKETS = str.maketrans('', '', '[]()')
+
+class ListColumn:
+    def __init__(self, offsets: np.ndarray, fields: list[np.ndarray], tuples: bool):
+        """A column of lists stored as flat arrays
+
+        The items of row i are at positions offsets[i] to offsets[i + 1] of the flat arrays. Lists of tuples have one flat array per
+        position in the tuples, eg: [(24, 774.7, 7756)] has fields [24], [774.7] and [7756].
+
+        Args:
+            offsets (np.ndarray): Where the items of each row start, followed by the total number of items
+            fields (list[np.ndarray]): The flat arrays
+            tuples (bool): Whether the items are tuples
+        """
+        self.offsets = offsets
+        self.fields = fields
+        self.tuples = tuples
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def lengths(self) -> np.ndarray:
+        """The number of items in each row"""
+        return np.diff(self.offsets)
+
+    def lists(self, field: int | None = None) -> list[list[Any]]:
+        """Get the lists as Python lists
+
+        Args:
+            field (int, optional): Only get this position of each tuple. Defaults to None, i.e. the whole tuples.
+
+        Returns:
+            list[list[Any]]: The list of each row
+        """
+        if not self.fields:
+            return [[] for _ in range(len(self))]
+
+        if field is not None:
+            flat = self.fields[field].tolist()
+        elif self.tuples:
+            flat = list(zip(*(values.tolist() for values in self.fields)))
+        else:
+            flat = self.fields[0].tolist()
+
+        offsets = self.offsets.tolist()
+        return [flat[start:end] for start, end in zip(offsets, offsets[1:])]
+
+def parse_lists(values: Iterable[str | None]) -> ListColumn:
+    """Parse a column of list literals as written by Dataset.write_to_file
+
+    The format is found from the first list that isn't empty. See parse_tuple_lists, parse_number_lists and parse_string_lists.
+
+    Args:
+        values (Iterable[str | None]): The values of the column. Empty values are empty lists.
+
+    Returns:
+        ListColumn: The parsed lists
+    """
+    values = list(values)
+    first = next((value.strip()[1:].lstrip() for value in values if value and value.strip()[1:].lstrip()[:1] not in ('', ']')), '')
+
+    if first.startswith('('):
+        return parse_tuple_lists(values)
+    if first.startswith(("'", '"')):
+        return parse_string_lists(values)
+    return parse_number_lists(values)
+
+def parse_tuple_lists(values: Iterable[str | None]) -> ListColumn:
+    """Parse a column of lists of number tuples, eg: '[(24, 774.7263166, 7756), (5, 347.1479463, 7851)]'
+
+    All the numbers are converted at once by numpy. Each position of the tuples becomes an int array if it only has integers and a
+    float array otherwise. Anything that doesn't fit the format is parsed with ast.literal_eval instead.
+
+    Args:
+        values (Iterable[str | None]): The values of the column. Empty values are empty lists.
+
+    Returns:
+        ListColumn: The parsed lists with one field per position of the tuples
+    """
+    values = list(values)
+    counts = [value.count('(') if value else 0 for value in values]
+    total = sum(counts)
+    if total == 0:
+        return _parse_slowly(values, tuples=True) if any(_has_items(value) for value in values) else _empty(len(values), tuples=True)
+
+    if any(not count and _has_items(value) for value, count in zip(values, counts)):
+        return _parse_slowly(values, tuples=True)
+
+    lists = [value for value, count in zip(values, counts) if count]
+    tokens = ','.join(lists).translate(_BRACKETS).split(',')
+    if len(tokens) % total != 0:
+        return _parse_slowly(values, tuples=True)
+    size = len(tokens) // total
+
+    # Every tuple must have the same size and every bracket must be where a tuple starts or ends
+    for value, count in zip(lists, (count for count in counts if count)):
+        if value.count(',') + 1 != count * size or value.count(')') != count or value.count('[') != 1:
+            return _parse_slowly(values, tuples=True)
+
+    try:
+        fields = [_numbers(tokens[position::size]) for position in range(size)]
+    except (ValueError, OverflowError):
+        return _parse_slowly(values, tuples=True)
+
+    return ListColumn(_offsets(counts), fields, tuples=True)
+
+def parse_number_lists(values: Iterable[str | None]) -> ListColumn:
+    """Parse a column of lists of numbers, eg: '[3029, 3218]'
+
+    Args:
+        values (Iterable[str | None]): The values of the column. Empty values are empty lists.
+
+    Returns:
+        ListColumn: The parsed lists with one field
+    """
+    values = list(values)
+    inners = [value.strip()[1:-1] if value else '' for value in values]
+    counts = [inner.count(',') + 1 if inner.strip() else 0 for inner in inners]
+
+    try:
+        if any(value and (value.strip()[:1] != '[' or value.strip()[-1:] != ']') for value in values):
+            raise ValueError()
+        field = _numbers(','.join(inner for inner, count in zip(inners, counts) if count).split(',')) if sum(counts) else np.array([], dtype=np.int64)
+    except (ValueError, OverflowError):
+        return _parse_slowly(values, tuples=False)
+
+    return ListColumn(_offsets(counts), [field], tuples=False)
+
+def parse_string_lists(values: Iterable[str | None]) -> ListColumn:
+    """Parse a column of lists of strings, eg: "['S110', 'S200', '']"
+
+    Strings that need escaping or are written with double quotes are parsed with ast.literal_eval instead.
+
+    Args:
+        values (Iterable[str | None]): The values of the column. Empty values are empty lists.
+
+    Returns:
+        ListColumn: The parsed lists with one field
+    """
+    values = list(values)
+    flat: list[str] = []
+    counts = []
+    for value in values:
+        inner = value.strip()[1:-1].strip() if value else ''
+        if not inner:
+            counts.append(0)
+            continue
+
+        items = inner[1:-1].split("', '")
+        # Quotes or backslashes inside the strings need the full parser
+        if inner[0] != "'" or inner[-1] != "'" or inner.count("'") != 2 * len(items) or '\\' in inner or '"' in inner:
+            return _parse_slowly(values, tuples=False)
+        flat.extend(items)
+        counts.append(len(items))
+
+    field = np.empty(len(flat), dtype=object)
+    field[:] = flat
+    return ListColumn(_offsets(counts), [field], tuples=False)
+
+def _numbers(tokens: list[str]) -> np.ndarray:
+    """Convert number strings to an int array if they are all integers or a float array if they are all floats
+
+    Raises ValueError when integers and floats are mixed so the types literal_eval would give are kept.
+    """
+    try:
+        return np.array(list(map(int, tokens)), dtype=np.int64)
+    except ValueError:
+        pass
+
+    # Floats are written with a '.' so the count of them is usually enough to tell that none are integers
+    if sum(map(str.count, tokens, '.' * len(tokens))) != len(tokens):
+        if any('.' not in token and 'e' not in token and 'E' not in token and 'n' not in token for token in tokens):
+            raise ValueError("Integers and floats are mixed")
+    return np.array(list(map(float, tokens)), dtype=np.float64)
+
+def _offsets(counts: list[int]) -> np.ndarray:
+    offsets = np.zeros(len(counts) + 1, dtype=np.intp)
+    np.cumsum(counts, out=offsets[1:])
+    return offsets
+
+def _has_items(value: str | None) -> bool:
+    return bool(value and value.strip()[1:-1].strip())
+
+def _empty(row_count: int, tuples: bool) -> ListColumn:
+    return ListColumn(np.zeros(row_count + 1, dtype=np.intp), [], tuples)
+
+def _parse_slowly(values: list[str | None], tuples: bool) -> ListColumn:
+    """Parse each value with ast.literal_eval for lists that don't fit the fast formats"""
+    lists = [literal_eval(value) if _has_items(value) else [] for value in values]
+    for value, parsed in zip(values, lists):
+        if not isinstance(parsed, (list, tuple)):
+            raise Exception(f"{value!r} is not a list")
+
+    flat = [item for items in lists for item in items]
+    counts = [len(items) for items in lists]
+    if tuples and flat and all(isinstance(item, tuple) and len(item) == len(flat[0]) for item in flat):
+        fields = [_object_array(list(position)) for position in zip(*flat)]
+    else:
+        fields, tuples = [_object_array(flat)], False
+    return ListColumn(_offsets(counts), fields, tuples)
+
+def _object_array(values: list[Any]) -> np.ndarray:
+    array = np.empty(len(values), dtype=object)
+    for i, value in enumerate(values):
+        array[i] = value
+    return array
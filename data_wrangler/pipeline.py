@@ -0,0 +1,297 @@
+from __future__ import annotations
+
+import os
+import sys
+import json
+import time
+import hashlib
+import tempfile
+import subprocess
+
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from collections.abc import Sequence
+
+from .instrumentation import Instrumentation
+from .instrumentation import REPORT_ENVIRONMENT_VARIABLE
+from .profiling import PROFILE_ENVIRONMENT_VARIABLE
+
+class Stage:
+    """A step of the data pipeline
+
+    A stage is a script that reads some files and writes some other files. All paths are relative to the root of the pipeline.
+    A file may be both an input and an output of a stage if the stage modifies it in place.
+    """
+
+    def __init__(self, name: str, script: str, inputs: Sequence[str], outputs: Sequence[str], cwd: str | None = None, code: Sequence[str] = ()):
+        """ Declare a stage
+
+        Args:
+            name (str): The name of the stage
+            script (str): The python script that runs the stage
+            inputs (Sequence[str]): The files read by the stage
+            outputs (Sequence[str]): The files written by the stage
+            cwd (str, optional): The directory to run the script from. Defaults to the directory of the script.
+            code (Sequence[str], optional): Other source files the stage depends on. Changing them reruns the stage. Defaults to ().
+        """
+        self.name = name
+        self.script = script
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.cwd = cwd if cwd is not None else os.path.dirname(script)
+        self.code = [script, *code]
+
+class Pipeline:
+    """Runs stages in dependency order, skipping the ones that are up to date
+
+    A stage depends on the last stage declared before it that writes one of its inputs. A stage is up to date when its code,
+    the inputs it does not write itself and the outputs it last wrote all have the same content hashes as after its last
+    successful run. An output that a later stage rewrites in place only has to exist, since the later stage changes it on every
+    run. Stages whose dependencies have finished are run in parallel.
+    """
+
+    def __init__(self, stages: list[Stage], root: str, cache_file: str = '.pipeline_cache.json', report_file: str = 'pipeline_report.json'):
+        """ Create a pipeline
+
+        Args:
+            stages (list[Stage]): The stages in the order they would be run by hand
+            root (str): The directory that all the stage paths are relative to
+            cache_file (str, optional): The file in [root] used to store the hashes of the last runs. Defaults to '.pipeline_cache.json'.
+            report_file (str, optional): The file in [root] used to store the time, CPU time, rows and peak memory of each stage of the
+                last run. Defaults to 'pipeline_report.json'.
+        """
+        self.stages = { stage.name: stage for stage in stages }
+        self.root = root
+        self.cache_file = os.path.join(root, cache_file)
+        self.report_file = os.path.join(root, report_file)
+        self.instrumentation = Instrumentation()
+        # The folder to profile the scripts into, see run
+        self.profile: str | None = None
+        self._cache: dict[str, dict] = {}
+        self._hashes: dict[tuple[str, int, int], str] = {}
+
+        if os.path.exists(self.cache_file):
+            with open(self.cache_file, 'r', encoding='utf-8') as cache:
+                self._cache = json.load(cache)
+
+        # Find the stage that produced each input at the point that a stage runs
+        self.dependencies: dict[str, set[str]] = {}
+        producers: dict[str, str] = {}
+        # The outputs of each stage that a stage declared after it writes again
+        self.rewritten: dict[str, set[str]] = { stage.name: set() for stage in stages }
+        for stage in stages:
+            self.dependencies[stage.name] = { producers[path] for path in stage.inputs if path in producers }
+            for path in stage.outputs:
+                if path in producers:
+                    self.rewritten[producers[path]].add(path)
+                producers[path] = stage.name
+
+    def _path(self, path: str) -> str:
+        return os.path.join(self.root, path)
+
+    def file_hash(self, path: str) -> str | None:
+        """Get the sha256 hash of the contents of a file
+
+        Hashes are remembered for as long as the size and modification time of the file don't change
+
+        Args:
+            path (str): The path of the file relative to the root
+
+        Returns:
+            str | None: The hash. None if the file doesn't exist.
+        """
+        full_path = self._path(path)
+        if not os.path.exists(full_path): return None
+
+        stat = os.stat(full_path)
+        memo_key = (full_path, stat.st_mtime_ns, stat.st_size)
+        if memo_key not in self._hashes:
+            digest = hashlib.sha256()
+            with open(full_path, 'rb') as file:
+                for chunk in iter(lambda: file.read(1 << 20), b''):
+                    digest.update(chunk)
+            self._hashes[memo_key] = digest.hexdigest()
+        return self._hashes[memo_key]
+
+    def stage_key(self, stage: Stage) -> str:
+        """Get the hash of everything a stage depends on other than the files it modifies in place
+
+        Args:
+            stage (Stage): The stage
+
+        Returns:
+            str: The key of the stage
+        """
+        digest = hashlib.sha256()
+        for path in sorted(set(stage.code) | (set(stage.inputs) - set(stage.outputs))):
+            digest.update(f'{path}={self.file_hash(path)}\n'.encode())
+        return digest.hexdigest()
+
+    def is_up_to_date(self, stage: Stage) -> bool:
+        """Check whether a stage would produce the same outputs as it did in its last run
+
+        Args:
+            stage (Stage): The stage
+
+        Returns:
+            bool: True if the stage can be skipped
+        """
+        record = self._cache.get(stage.name)
+        if not record or record['key'] != self.stage_key(stage): return False
+
+        for path in stage.outputs:
+            if path in self.rewritten[stage.name]:
+                # The hash after this stage's last run is gone once a later stage rewrites the file
+                if self.file_hash(path) is None: return False
+            elif record['outputs'].get(path) is None or record['outputs'][path] != self.file_hash(path):
+                return False
+        return True
+
+    def upstream(self, targets: Sequence[str]) -> list[str]:
+        """Get the stages needed to produce [targets], in declaration order
+
+        Args:
+            targets (Sequence[str]): The names of the stages
+
+        Returns:
+            list[str]: The names of the targets and all the stages they depend on
+        """
+        needed = set()
+        pending = list(targets)
+        while pending:
+            name = pending.pop()
+            if name not in self.stages:
+                raise Exception(f"{name} is not a stage. The stages are {list(self.stages)}")
+            if name in needed: continue
+            needed.add(name)
+            pending.extend(self.dependencies[name])
+        return [name for name in self.stages if name in needed]
+
+    def _run_stage(self, stage: Stage, force: bool, dry_run: bool) -> tuple[str, dict | None]:
+        """Run one stage if it is out of date
+
+        Returns:
+            tuple:
+                str: 'skipped', 'ran' or 'would run'
+                dict | None: The record to store in the cache if the stage ran
+        """
+        if not force and self.is_up_to_date(stage): return 'skipped', None
+        if dry_run: return 'would run', None
+
+        missing = [path for path in stage.inputs if self.file_hash(path) is None]
+        if missing:
+            raise Exception(f"Stage {stage.name} is missing inputs: {missing}")
+
+        key = self.stage_key(stage)
+        self._run_script(stage)
+
+        missing = [path for path in stage.outputs if self.file_hash(path) is None]
+        if missing:
+            raise Exception(f"Stage {stage.name} did not write outputs: {missing}")
+
+        return 'ran', {
+            'key': key,
+            'outputs': { path: self.file_hash(path) for path in stage.outputs }
+        }
+
+    def _run_script(self, stage: Stage):
+        """Run the script of a stage and record the time and memory it used along with the stages the script recorded itself"""
+        with tempfile.TemporaryDirectory() as folder:
+            report_file = os.path.join(folder, 'report.json')
+            env = { **os.environ, REPORT_ENVIRONMENT_VARIABLE: report_file }
+            if self.profile:
+                env[PROFILE_ENVIRONMENT_VARIABLE] = self.profile
+            start = time.perf_counter()
+            process = subprocess.Popen(
+                [sys.executable, os.path.abspath(self._path(stage.script))],
+                cwd=self._path(stage.cwd), env=env
+            )
+            usage = None
+            if hasattr(os, 'wait4'):
+                # Waiting this way also gives the CPU time and peak memory of the script
+                _, status, usage = os.wait4(process.pid, 0)
+                process.returncode = os.waitstatus_to_exitcode(status)
+            else:
+                process.wait()
+            wall_seconds = time.perf_counter() - start
+
+            if process.returncode != 0:
+                raise subprocess.CalledProcessError(process.returncode, process.args)
+
+            script_report = None
+            if os.path.exists(report_file):
+                with open(report_file, 'r', encoding='utf-8') as report:
+                    script_report = json.load(report)
+
+        cpu_seconds = script_report['cpu_seconds'] if script_report else 0.0
+        peak_rss_bytes = script_report['peak_rss_bytes'] if script_report else None
+        if usage is not None:
+            cpu_seconds = usage.ru_utime + usage.ru_stime
+            # Linux reports kilobytes and macOS bytes. The script may have reset the peak the system keeps, see Instrumentation.
+            peak_rss_bytes = max(peak_rss_bytes or 0, usage.ru_maxrss if sys.platform == 'darwin' else usage.ru_maxrss * 1024)
+
+        self.instrumentation.add(stage.name, wall_seconds, cpu_seconds, peak_rss_bytes=peak_rss_bytes)
+        if script_report:
+            self.instrumentation.merge(script_report['stages'], prefix=stage.name)
+
+    def _save_cache(self):
+        with open(self.cache_file, 'w', encoding='utf-8') as cache:
+            json.dump(self._cache, cache, indent=4)
+
+    def run(self, targets: Sequence[str] | None = None, force: Sequence[str] = (), jobs: int = 2, dry_run: bool = False,
+            profile: str | None = None) -> bool:
+        """Run the out of date stages needed for [targets]
+
+        Args:
+            targets (Sequence[str], optional): The stages to bring up to date. Defaults to None, i.e. all stages.
+            force (Sequence[str], optional): Stages to run even if they are up to date. Defaults to ().
+            jobs (int, optional): The maximum number of stages to run at once. Defaults to 2.
+            dry_run (bool, optional): Only report which stages would run. Defaults to False.
+            profile (str, optional): A folder to write a profile of each stage that runs to, named after its script. Only scripts
+                that call profile_if_requested are profiled. Defaults to None.
+
+        Returns:
+            bool: True if every stage succeeded
+        """
+        names = self.upstream(targets) if targets else list(self.stages)
+        self.instrumentation.clear()
+        self.profile = os.path.abspath(profile) if profile else None
+        remaining = { name: self.dependencies[name] & set(names) for name in names }
+        finished = set()
+        would_run = set()
+        succeeded = True
+
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            running = {}
+            while remaining or running:
+                # Start every stage whose dependencies have finished
+                if succeeded:
+                    for name in [name for name, deps in remaining.items() if deps <= finished]:
+                        del remaining[name]
+                        # A dry run can't know whether a stage would change its outputs, so anything downstream of a stage that would run is reported as running too
+                        upstream_runs = dry_run and bool(self.dependencies[name] & would_run)
+                        print(f"Starting {name}")
+                        running[executor.submit(self._run_stage, self.stages[name], upstream_runs or name in force, dry_run)] = name
+                if not running: break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        result, record = future.result()
+                    except Exception as error:
+                        print(f"Stage {name} failed: {error}")
+                        succeeded = False
+                        continue
+
+                    if result == 'would run': would_run.add(name)
+                    if record:
+                        self._cache[name] = record
+                        self._save_cache()
+                    print(f"{name}: {result}")
+                    finished.add(name)
+
+        if self.instrumentation.records:
+            print()
+            print(self.instrumentation.summary_table())
+            self.instrumentation.write_report(self.report_file)
+        return succeeded
@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import math
+
+from typing import Sequence
+from typing import TypeAlias
+
+Point: TypeAlias = tuple[float, float]
+Polyline: TypeAlias = list[Point]
+
+def distance(p1: Sequence[float], p2: Sequence[float]) -> float:
+    """Euclidean distance between two points"""
+    return math.sqrt((p1[0] - p2[0]) ** 2 + (p1[1] - p2[1]) ** 2)
+
+class _EndpointIndex:
+    """Snaps points that are within a tolerance of each other to the same node using a grid with cells the size of the tolerance
+    """
+
+    def __init__(self, tolerance: float):
+        self.tolerance = tolerance
+        self._cells: dict[tuple[int, int], list[int]] = {}
+        self.points: list[Sequence[float]] = []
+
+    def node(self, point: Sequence[float]) -> int:
+        """Get the node of a point, creating a new node if there is none within the tolerance"""
+        cell_x = math.floor(point[0] / self.tolerance)
+        cell_y = math.floor(point[1] / self.tolerance)
+
+        # A point within the tolerance must be in the same cell or one of the 8 surrounding cells
+        best, best_dst = -1, self.tolerance
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for node in self._cells.get((cell_x + dx, cell_y + dy), ()):
+                    dst = distance(point, self.points[node])
+                    if dst <= best_dst:
+                        best, best_dst = node, dst
+        if best != -1: return best
+
+        self.points.append(point)
+        self._cells.setdefault((cell_x, cell_y), []).append(len(self.points) - 1)
+        return len(self.points) - 1
+
+def stitch_polylines(pieces: Sequence[Sequence[Sequence[float]]], tolerance: float = 1e-5) -> list[Polyline]:
+    """Join line pieces that share endpoints into continuous polylines
+
+    Endpoints closer than [tolerance] are treated as the same point. Pieces may be in either direction. Where pieces branch,
+    the walk continues along one branch and the other branches become separate polylines. Runs in linear time in the number of pieces.
+
+    Args:
+        pieces (Sequence[Sequence[Sequence[float]]]): The pieces as lists of (x, y) coordinates
+        tolerance (float, optional): The distance within which endpoints are snapped together. Defaults to 1e-5.
+
+    Returns:
+        list[Polyline]: The polylines, longest first
+    """
+    pieces = [piece for piece in pieces if len(piece) > 0]
+    index = _EndpointIndex(tolerance)
+
+    # The nodes at the start and end of each piece and the pieces connected to each node
+    ends = [(index.node(piece[0]), index.node(piece[-1])) for piece in pieces]
+    incident: dict[int, list[int]] = {}
+    for i, (start, end) in enumerate(ends):
+        incident.setdefault(start, []).append(i)
+        incident.setdefault(end, []).append(i)
+
+    used = [False] * len(pieces)
+
+    def walk(node: int) -> Polyline:
+        polyline: Polyline = []
+        while True:
+            piece_index = next((i for i in incident[node] if not used[i]), None)
+            if piece_index is None: return polyline
+            used[piece_index] = True
+
+            start, end = ends[piece_index]
+            piece = [(float(p[0]), float(p[1])) for p in pieces[piece_index]]
+            if start != node:
+                piece.reverse()
+                start, end = end, start
+
+            # Don't repeat the point where the pieces join
+            polyline.extend(piece[1:] if polyline else piece)
+            node = end
+
+    # Start from dead ends first so that walks cover whole lines instead of starting in the middle
+    starts = sorted(incident, key=lambda node: len(incident[node]) % 2 == 0)
+    polylines = []
+    for node in starts:
+        while any(not used[i] for i in incident[node]):
+            polylines.append(walk(node))
+
+    polylines.sort(key=polyline_length, reverse=True)
+    return polylines
+
+def polyline_length(polyline: Polyline) -> float:
+    """The total length of a polyline"""
+    return sum(distance(polyline[i], polyline[i + 1]) for i in range(len(polyline) - 1))
+
+def join_polylines(polylines: Sequence[Polyline]) -> Polyline:
+    """Join polylines into a single sequence of coordinates
+
+    Starting with the first polyline, the closest remaining polyline to either end is repeatedly attached, reversing it if needed.
+    Intended for joining the few polylines returned by stitch_polylines, so it is quadratic in the number of polylines.
+
+    Args:
+        polylines (Sequence[Polyline]): The polylines. The first one is used as the starting point.
+
+    Returns:
+        Polyline: The joined coordinates
+    """
+    if not polylines: return []
+
+    merged = list(polylines[0])
+    remaining = [list(polyline) for polyline in polylines[1:]]
+    while remaining:
+        best_index, best_dst, best_at_end, best_reverse = -1, float('inf'), True, False
+        for i, polyline in enumerate(remaining):
+            for at_end, own_point in ((True, merged[-1]), (False, merged[0])):
+                for reverse, other_point in ((False, polyline[0]), (True, polyline[-1])):
+                    dst = distance(own_point, other_point)
+                    if dst < best_dst:
+                        best_index, best_dst, best_at_end, best_reverse = i, dst, at_end, reverse
+
+        chosen = remaining.pop(best_index)
+        # Attaching to the end needs the chosen polyline to start at its closest point, attaching to the start needs it to end there
+        if best_reverse == best_at_end:
+            chosen.reverse()
+        merged = merged + chosen if best_at_end else chosen + merged
+
+    return merged
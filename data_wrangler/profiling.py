@@ -0,0 +1,192 @@
+from __future__ import annotations
+
+import os
+import sys
+import time
+import pstats
+import runpy
+import cProfile
+import argparse
+import threading
+
+from typing import Any
+from collections import Counter
+from collections.abc import Sequence
+
+# If set, scripts that call profile_if_requested are profiled into this folder. Pipeline sets it for each stage with --profile.
+PROFILE_ENVIRONMENT_VARIABLE = 'DATA_WRANGLER_PROFILE'
+PROFILE_FOLDER = 'profiles'
+
+# The code whose functions are listed after a profile, as well as the script that was profiled
+PROJECT_PACKAGES = ('data_wrangler',)
+
+class Profiler:
+    def __init__(self, folder: str, name: str, interval: float = 0.005, packages: Sequence[str] = PROJECT_PACKAGES, scripts: Sequence[str] = ()):
+        """Profiles the code run by this thread with cProfile and a stack sampler at the same time
+
+        When stopped it writes three files to [folder]:
+
+        - name.prof: The cProfile stats, for pstats, snakeviz, etc.
+        - name.folded: The sampled stacks in the collapsed format read by flamegraph.pl, speedscope and inferno
+        - name.txt: The functions of [packages] and [scripts] that took the most time
+
+        cProfile slows down code that makes many small function calls, so those calls look wider in the flamegraph than they
+        would without it. Processes started by the profiled code aren't profiled.
+
+        Args:
+            folder (str): The folder to write the files to
+            name (str): The name of the files, eg: the name of the script
+            interval (float, optional): The number of seconds between stack samples. Defaults to 0.005.
+            packages (Sequence[str], optional): The packages whose functions are listed. Defaults to ('data_wrangler',).
+            scripts (Sequence[str], optional): Other files whose functions are listed. Defaults to ().
+        """
+        self.folder = folder
+        self.name = name
+        self.interval = interval
+        self.packages = list(packages)
+        self.scripts = [os.path.abspath(script) for script in scripts]
+        self.samples: Counter[str] = Counter()
+        self._profile = cProfile.Profile()
+        self._thread_id: int | None = None
+        self._stopped = threading.Event()
+        self._sampler: threading.Thread | None = None
+        self._base: Any = None
+        self._start = 0.0
+        self.seconds = 0.0
+
+    def start(self, base: Any = None):
+        """Start profiling. The frames of [base], the frame that starts profiling by default, and its callers are left out of the samples."""
+        self._base = base if base is not None else sys._getframe(1)
+        self._thread_id = threading.get_ident()
+        self._stopped.clear()
+        self._sampler = threading.Thread(target=self._sample, name='profiler-sampler', daemon=True)
+        self._start = time.perf_counter()
+        self._sampler.start()
+        self._profile.enable()
+
+    def stop(self):
+        self._profile.disable()
+        self._stopped.set()
+        if self._sampler is not None:
+            self._sampler.join()
+        self.seconds = time.perf_counter() - self._start
+
+    def __enter__(self):
+        self.start(sys._getframe(1))
+        return self
+
+    def __exit__(self, *exception):
+        self.stop()
+        self.write()
+
+    def _sample(self):
+        # The sampler's own frames are never in the sampled thread so they don't need to be filtered out
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)    # type: ignore
+            if frame is not None:
+                self.samples[_folded_stack(frame, self._base)] += 1
+
+    def write(self) -> str:
+        """Write the profile files and return the table of the slowest functions"""
+        os.makedirs(self.folder, exist_ok=True)
+        prefix = os.path.join(self.folder, self.name)
+
+        self._profile.dump_stats(f'{prefix}.prof')
+        with open(f'{prefix}.folded', 'w', encoding='utf-8') as folded:
+            for stack, count in self.samples.most_common():
+                folded.write(f'{stack} {count}\n')
+
+        table = self.hot_functions()
+        with open(f'{prefix}.txt', 'w', encoding='utf-8') as text:
+            text.write(table + '\n')
+        return table
+
+    def hot_functions(self, limit: int = 20) -> str:
+        """Make a table of the functions of the packages and scripts that took the most time, not counting the functions they called"""
+        stats = pstats.Stats(self._profile)
+        return hot_functions(stats.stats, self.packages, self.scripts, limit, self.seconds)   # type: ignore
+
+def hot_functions(stats: dict[tuple[str, int, str], tuple], packages: Sequence[str], scripts: Sequence[str] = (), limit: int = 20,
+                  seconds: float | None = None) -> str:
+    """Make a table of the slowest functions of some packages from cProfile stats
+
+    Args:
+        stats (dict[tuple[str, int, str], tuple]): The stats of a pstats.Stats, keyed by (filename, line, function)
+        packages (Sequence[str]): The packages whose functions are included
+        scripts (Sequence[str], optional): Files whose functions are included. Defaults to ().
+        limit (int, optional): The number of functions to list. Defaults to 20.
+        seconds (float, optional): The length of the profile, to show each function as a share of it. Defaults to None.
+
+    Returns:
+        str: The table, sorted by the time spent in each function itself
+    """
+    package_folders = [f'{os.sep}{package}{os.sep}' for package in packages]
+    rows = []
+    for (filename, line, function), (_, calls, own_time, total_time, _) in stats.items():
+        path = os.path.abspath(filename) if not filename.startswith('<') else filename
+        if not (any(folder in path for folder in package_folders) or path in scripts): continue
+        rows.append((own_time, total_time, calls, f'{_short_path(path)}:{line}({function})'))
+    rows.sort(reverse=True)
+
+    lines = [f"{'own s':>9} {'total s':>9} {'share':>6} {'calls':>11}  function"]
+    for own_time, total_time, calls, function in rows[:limit]:
+        share = f"{own_time / seconds:.0%}" if seconds else ''
+        lines.append(f"{own_time:>9.3f} {total_time:>9.3f} {share:>6} {calls:>11,}  {function}")
+    return '\n'.join(lines)
+
+def profile_if_requested(name: str | None = None, arguments: list[str] | None = None):
+    """Rerun the calling script under a Profiler if it was started with --profile, then exit
+
+    Call this first in the script's if __name__ == "__main__": block, before it parses its own arguments, so importing the script
+    never starts the profiler. --profile is removed from the arguments so the script never sees it. A script run by a Pipeline with
+    --profile is profiled too, see PROFILE_ENVIRONMENT_VARIABLE.
+
+        python cleanup.py --profile
+        python cleanup.py --profile ../profiles
+
+    Args:
+        name (str, optional): The name of the profile files. Defaults to None, i.e. the name of the script.
+        arguments (list[str], optional): The arguments to look for --profile in. Defaults to sys.argv.
+    """
+    arguments = sys.argv if arguments is None else arguments
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument('--profile', nargs='?', const=PROFILE_FOLDER, default=None)
+    known, remaining = parser.parse_known_args(arguments[1:])
+
+    folder = known.profile or os.environ.get(PROFILE_ENVIRONMENT_VARIABLE)
+    if not folder: return
+
+    # The rerun mustn't profile itself again
+    os.environ.pop(PROFILE_ENVIRONMENT_VARIABLE, None)
+    sys.argv[:] = [arguments[0], *remaining]
+
+    script = os.path.abspath(arguments[0])
+    name = name if name is not None else os.path.splitext(os.path.basename(script))[0]
+    profiler = Profiler(folder, name, scripts=[script])
+    print(f"Profiling {name} into {os.path.abspath(folder)}", file=sys.stderr)
+    with profiler:
+        runpy.run_path(script, run_name='__main__')
+
+    print(f"\nSlowest functions of {name} ({profiler.seconds:.1f}s). Also see {os.path.join(folder, name)}.prof and .folded", file=sys.stderr)
+    print(profiler.hot_functions(), file=sys.stderr)
+    sys.exit(0)
+
+def _folded_stack(frame: Any, base: Any = None) -> str:
+    """Get a stack as the ';' separated functions from the outermost call after [base], as used by flamegraph tools"""
+    names = []
+    while frame is not None and frame is not base:
+        code = frame.f_code
+        # The frames runpy uses to rerun a script are the same in every sample
+        if code.co_filename in _RUNPY_FILES:
+            frame = frame.f_back
+            continue
+        names.append(f'{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})'.replace(';', ','))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+_RUNPY_FILES = { runpy.__file__, '<frozen runpy>' }
+
+def _short_path(path: str) -> str:
+    """The last two parts of a path, eg: data_wrangler/dataset.py"""
+    parts = path.replace('\\', '/').split('/')
+    return '/'.join(parts[-2:])
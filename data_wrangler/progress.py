@@ -0,0 +1,253 @@
+from __future__ import annotations
+
+import os
+import sys
+import time
+
+from typing import Any
+
+from .files import atomic_write
+from .instrumentation import instrumentation
+from .instrumentation import format_duration
+
+# 'console' to always print progress, 'silent' to never print it. By default it is only printed to a terminal.
+PROGRESS_ENVIRONMENT_VARIABLE = 'DATA_WRANGLER_PROGRESS'
+# A Prometheus textfile to keep up to date with the progress, eg: in the textfile collector folder of node_exporter
+TEXTFILE_ENVIRONMENT_VARIABLE = 'DATA_WRANGLER_PROGRESS_TEXTFILE'
+
+class ProgressUpdate:
+    def __init__(self, task: str, done: int, total: int | None, seconds: float, finished: bool = False):
+        """How far a task has got
+
+        Args:
+            task (str): The name of the task. eg: 'match_closest'
+            done (int): The number of rows processed so far
+            total (int | None): The number of rows to process if it is known
+            seconds (float): The time since the task started
+            finished (bool, optional): Whether the task has finished. Defaults to False.
+        """
+        self.task = task
+        self.done = done
+        self.total = total
+        self.seconds = seconds
+        self.finished = finished
+
+    @property
+    def rows_per_second(self) -> float | None:
+        return self.done / self.seconds if self.seconds > 0 else None
+
+    @property
+    def fraction(self) -> float | None:
+        return self.done / self.total if self.total else None
+
+    @property
+    def eta_seconds(self) -> float | None:
+        """The estimated time until the task finishes, at the average rate so far"""
+        if self.finished: return 0.0
+        rate = self.rows_per_second
+        if self.total is None or not rate: return None
+        return max(self.total - self.done, 0) / rate
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            'done': self.done,
+            'total': self.total,
+            'seconds': self.seconds,
+            'rows_per_second': self.rows_per_second,
+            'eta_seconds': self.eta_seconds,
+            'finished': self.finished
+        }
+
+class ProgressReporter:
+    """Receives the progress of tasks. Override update to show or export it."""
+
+    def update(self, progress: ProgressUpdate):
+        """Called when a task starts, at most once per interval while it runs and when it finishes
+
+        Args:
+            progress (ProgressUpdate): How far the task has got
+        """
+        pass
+
+class ConsoleProgress(ProgressReporter):
+    def __init__(self, stream: Any = None):
+        """Prints progress to stderr
+
+        A terminal shows one line per task that is rewritten in place. Anything else, like a log file, gets a new line for each update.
+
+        Args:
+            stream (TextIO, optional): Where to print. Defaults to sys.stderr.
+        """
+        self.stream = stream
+
+    def update(self, progress: ProgressUpdate):
+        stream = self.stream if self.stream is not None else sys.stderr
+        parts = [f"{progress.task} {progress.done:,}" + (f"/{progress.total:,}" if progress.total is not None else '')]
+        if progress.fraction is not None:
+            parts.append(f"{progress.fraction:.0%}")
+        if progress.rows_per_second is not None:
+            parts.append(f"{progress.rows_per_second:,.0f} rows/s")
+        if progress.finished:
+            parts.append(f"in {format_duration(progress.seconds)}")
+        elif progress.eta_seconds is not None:
+            parts.append(f"{format_duration(progress.eta_seconds)} left")
+        line = '  '.join(parts)
+
+        if stream.isatty():
+            stream.write(f"\r{line}\033[K" + ('\n' if progress.finished else ''))
+        else:
+            stream.write(f"{line}\n")
+        stream.flush()
+
+class InstrumentationProgress(ProgressReporter):
+    """Keeps the latest progress of each task in the instrumentation report"""
+
+    def update(self, progress: ProgressUpdate):
+        instrumentation().set_progress(progress.task, progress.to_dict())
+
+class PrometheusTextfileProgress(ProgressReporter):
+    def __init__(self, filename: str, job: str | None = None):
+        """Writes the progress of every task to a Prometheus textfile, eg: for the textfile collector of node_exporter
+
+        The file is replaced atomically after every update so the collector never reads it half written.
+
+        Args:
+            filename (str): The file to write. Should end in .prom for node_exporter.
+            job (str, optional): A job label added to every metric. Defaults to None, i.e. the name of the script.
+        """
+        self.filename = filename
+        self.job = job if job is not None else os.path.basename(sys.argv[0] or 'python')
+        self._tasks: dict[str, ProgressUpdate] = {}
+        self._updated: dict[str, float] = {}
+
+    def update(self, progress: ProgressUpdate):
+        self._tasks[progress.task] = progress
+        self._updated[progress.task] = time.time()
+        self.write()
+
+    def write(self):
+        metrics = [
+            ('done', "The number of rows processed so far", lambda progress: progress.done),
+            ('total', "The number of rows the task processes", lambda progress: progress.total),
+            ('rows_per_second', "The average number of rows processed per second", lambda progress: progress.rows_per_second),
+            ('eta_seconds', "The estimated number of seconds until the task finishes", lambda progress: progress.eta_seconds),
+            ('finished', "1 if the task has finished", lambda progress: int(progress.finished)),
+            ('last_update_timestamp_seconds', "When the progress was last updated", lambda progress: self._updated[progress.task])
+        ]
+
+        lines = []
+        for name, description, value in metrics:
+            lines.append(f"# HELP data_wrangler_progress_{name} {description}")
+            lines.append(f"# TYPE data_wrangler_progress_{name} gauge")
+            for task, progress in self._tasks.items():
+                metric = value(progress)
+                if metric is None: continue
+                lines.append(f'data_wrangler_progress_{name}{{job="{_label(self.job)}",task="{_label(task)}"}} {metric!r}')
+
+        with atomic_write(self.filename) as textfile:
+            textfile.write('\n'.join(lines) + '\n')
+
+class Progress:
+    def __init__(self, task: str, total: int | None = None, reporters: list[ProgressReporter] | None = None, interval: float | None = None):
+        """Tracks the progress of a loop and tells the reporters about it at most once per interval
+
+        Example::
+
+            with progress('match_closest', len(rows)) as tracker:
+                for row in rows:
+                    ...
+                    tracker.advance()
+
+        Args:
+            task (str): The name of the task
+            total (int, optional): The number of rows the task processes. Defaults to None, i.e. unknown.
+            reporters (list[ProgressReporter], optional): Where to send the progress. Defaults to the reporters set with configure_progress.
+            interval (float, optional): The least number of seconds between updates. Defaults to the interval set with configure_progress.
+        """
+        self.task = task
+        self.total = total
+        self.done = 0
+        self.reporters = reporters if reporters is not None else _reporters()
+        self.interval = interval if interval is not None else _interval
+        self._start = time.perf_counter()
+        self._next_update = self._start + self.interval
+        self._finished = False
+        self._report(False)
+
+    def advance(self, count: int = 1):
+        """Add to the number of rows processed. Only looks at the time, so it is cheap to call for every row."""
+        self.done += count
+        if self.reporters and time.perf_counter() >= self._next_update:
+            self._report(False)
+
+    def finish(self):
+        """Report that the task has finished. Only the first call does anything."""
+        if self._finished: return
+        self._finished = True
+        self._report(True)
+
+    def _report(self, finished: bool):
+        now = time.perf_counter()
+        self._next_update = now + self.interval
+        if not self.reporters: return
+        update = ProgressUpdate(self.task, self.done, self.total, now - self._start, finished)
+        for reporter in self.reporters:
+            reporter.update(update)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.finish()
+
+_interval = 1.0
+_configured: list[ProgressReporter] | None = None
+
+def configure_progress(reporters: list[ProgressReporter] | None = None, interval: float | None = None):
+    """Set where progress is sent by default
+
+    Args:
+        reporters (list[ProgressReporter], optional): The reporters. Defaults to None, i.e. the default reporters (see default_reporters).
+        interval (float, optional): The least number of seconds between updates of a task. Defaults to None, i.e. unchanged.
+    """
+    global _configured, _interval
+    _configured = reporters
+    if interval is not None:
+        _interval = interval
+
+def default_reporters() -> list[ProgressReporter]:
+    """The reporters used unless others are set with configure_progress
+
+    Progress is always kept in the instrumentation report. It is printed if DATA_WRANGLER_PROGRESS is 'console', or if it isn't set
+    and stderr is a terminal, so scheduled runs are silent. It is written to a Prometheus textfile if DATA_WRANGLER_PROGRESS_TEXTFILE
+    is set.
+    """
+    reporters: list[ProgressReporter] = [InstrumentationProgress()]
+
+    mode = os.environ.get(PROGRESS_ENVIRONMENT_VARIABLE, '').lower()
+    if mode == 'console' or (mode != 'silent' and sys.stderr is not None and sys.stderr.isatty()):
+        reporters.append(ConsoleProgress())
+
+    textfile = os.environ.get(TEXTFILE_ENVIRONMENT_VARIABLE)
+    if textfile:
+        reporters.append(_textfile_reporter(textfile))
+    return reporters
+
+# One reporter per file so the tasks of a run are kept together in it
+_textfile_reporters: dict[str, PrometheusTextfileProgress] = {}
+
+def _textfile_reporter(filename: str) -> PrometheusTextfileProgress:
+    if filename not in _textfile_reporters:
+        _textfile_reporters[filename] = PrometheusTextfileProgress(filename)
+    return _textfile_reporters[filename]
+
+def _reporters() -> list[ProgressReporter]:
+    return _configured if _configured is not None else default_reporters()
+
+def progress(task: str, total: int | None = None) -> Progress:
+    """Track the progress of a task with the default reporters. See Progress"""
+    return Progress(task, total)
+
+def _label(value: str) -> str:
+    """Escape a Prometheus label value"""
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
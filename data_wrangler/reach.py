@@ -0,0 +1,245 @@
+"""Reach of the junctions of the street network
+
+The reach of a junction for a layer, eg: crimes or stores, is the sum of the layer's weight at every junction within a distance
+of it along the streets, each scaled by a kernel of the distance. Reaches are normalized so the largest is 1.
+
+The crime and graffiti pipelines (data_cleanup/reach_calculation.py and data_cleanup/graffiti_reach_calculations.py) use this
+module. It can also be run on its own to calculate any reaches of any junction file:
+
+    python -m data_wrangler.reach
+    python -m data_wrangler.reach --reach graffiti_reach=graffiti_count theft_reach=theft_likelihood:normal:200 --limit 1500
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import math
+import argparse
+
+from heapq import heappush, heappop
+from typing import Any
+from typing import Callable
+from collections.abc import Sequence
+
+from .dataset import Dataset
+from .dataset import parquet_available
+from .expression import col
+from .instrumentation import stage
+from .progress import progress
+
+CLEANED_DATA_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'cleaned_data')
+
+CRIME_SIGMA = 132
+STANDARD_DEVIATION = 400
+LIMIT = 1000
+
+def normal_dst(distance: float, standard_deviation: float) -> float:
+    """The density of a 2D normal distribution at [distance] from its centre"""
+    scale = 1 / (2 * math.pi * (standard_deviation ** 2))
+    power = distance ** 2 / (2 * standard_deviation ** 2)
+    distribution = math.exp(-power)
+    return scale * distribution
+
+def reach_dst(distance: float, scale: float) -> float:
+    """ Calculate a modified version of Borgatti's reach formula
+
+    TODO: Check that convergence is important and that if is whether we actually need to cube the denominator
+    The range formula is:  sumweight * 1 / (dst_scale * dst + 1) ^ 2
+    We have +1 because we want distance of zero to be constant with respect to dst_scale
+    We cube the denominator because this causes it to converge
+    """
+
+    return 1 / ((distance / scale + 1) ** 3)
+
+# The kernels that can be named in a Reach, and so on the command line. Each takes the distance and the scale of the reach.
+KERNELS: dict[str, Callable[[float, float], float]] = {
+    'normal': normal_dst,
+    'borgatti': reach_dst,
+}
+
+class Reach:
+    def __init__(self, name: str, column: str, kernel: str = 'normal', scale: float = STANDARD_DEVIATION):
+        """A reach to calculate
+
+        Args:
+            name (str): The column to write the reach to. eg: 'crime_reach'
+            column (str): The junction column holding the weight of each junction. eg: 'crime_count'
+            kernel (str, optional): The name of the kernel in KERNELS that scales the weights by distance. Defaults to 'normal'.
+            scale (float, optional): The scale of the kernel, eg: the standard deviation of 'normal'. Defaults to 400.
+        """
+        if kernel not in KERNELS:
+            raise Exception(f"{kernel} is not a kernel. The kernels are {list(KERNELS)}")
+        self.name = name
+        self.column = column
+        self.kernel = kernel
+        self.scale = scale
+
+    def weight(self, distance: float) -> float:
+        """The factor the weight of a junction at [distance] is scaled by"""
+        return KERNELS[self.kernel](distance, self.scale)
+
+    @staticmethod
+    def parse(text: str) -> Reach:
+        """Parse a reach written as NAME=COLUMN[:KERNEL[:SCALE]], eg: 'crime_reach=crime_count:normal:132'"""
+        name, separator, spec = text.partition('=')
+        if not separator or not name or not spec:
+            raise Exception(f"{text} is not a reach. Write reaches as NAME=COLUMN[:KERNEL[:SCALE]], eg: crime_reach=crime_count:normal:132")
+        column, kernel, scale = (spec.split(':') + [None, None])[:3]
+        return Reach(name, column, kernel or 'normal', float(scale) if scale else STANDARD_DEVIATION)
+
+    def __repr__(self):
+        return f"Reach('{self.name}', '{self.column}', '{self.kernel}', {self.scale:g})"
+
+# The reaches loaded into Neo4j by data_loading/main.py
+DEFAULT_REACHES = [
+    Reach('crime_reach', 'crime_count', 'normal', CRIME_SIGMA),
+    Reach('store_reach', 'stores_count'),
+    Reach('transit_reach', 'transit_count'),
+    Reach('rapid_transit_reach', 'rapid_transit_count'),
+    Reach('schools_reach', 'schools_count'),
+    Reach('retail_reach', 'retail_count'),
+]
+
+def load_junction_graph(filename: str, reaches: Sequence[Reach] = DEFAULT_REACHES) -> Dataset:
+    """Load junctions with their neighbors parsed and the weight columns of [reaches] converted to numbers
+
+    Args:
+        filename (str): A junction file from data/cleaned_data
+        reaches (Sequence[Reach], optional): The reaches whose weight columns are needed. Defaults to DEFAULT_REACHES.
+
+    Returns:
+        Dataset: The junctions
+    """
+    junctions = Dataset.load_file(filename)
+    junctions.convert_properties({
+        'id': int,
+        **{ reach.column: _number for reach in reaches },
+        'neighbors': col('neighbors').parse_list()
+    })
+    return junctions
+
+def _number(value: Any) -> int | float:
+    """Counts stay integers so they are written back unchanged. Anything else, like a likelihood, is a float."""
+    if isinstance(value, (int, float)): return value
+    try:
+        return int(value)
+    except ValueError:
+        return float(value)
+
+def junction_records(junctions: Dataset, reaches: Sequence[Reach]) -> dict[Any, tuple]:
+    """Get compact (neighbors, weight 1, weight 2, ...) records of the junctions with the weights in the order of [reaches]"""
+    return junctions.to_records(['neighbors', *(reach.column for reach in reaches)], 'JunctionRecord')
+
+def _kernel_groups(reaches: Sequence[Reach]) -> list[tuple[Reach, list[int]]]:
+    """Group the reaches that share a kernel and scale so the kernel is only evaluated once per junction
+
+    Returns:
+        list[tuple[Reach, list[int]]]: A reach of each group and the positions of the weights of the group in the junction records
+    """
+    groups: dict[tuple[str, float], tuple[Reach, list[int]]] = {}
+    for position, reach in enumerate(reaches, start=1):
+        groups.setdefault((reach.kernel, reach.scale), (reach, []))[1].append(position)
+    return list(groups.values())
+
+def calculate_reach(records: dict[Any, tuple], junction_id: Any, reaches: Sequence[Reach], limit: float = LIMIT,
+                    groups: list[tuple[Reach, list[int]]] | None = None) -> dict[str, float]:
+    """Calculate the reaches of one junction, before normalizing
+
+    Visits the junctions within [limit] of the junction along the streets in order of distance. Junctions further than the limit
+    are never queued.
+
+    Args:
+        records (dict[Any, tuple]): The junction records from junction_records
+        junction_id (Any): The id of the junction
+        reaches (Sequence[Reach]): The reaches to calculate, in the order of the weights in the records
+        limit (float, optional): The distance beyond which junctions are not counted. Defaults to 1000.
+        groups (list[tuple[Reach, list[int]]], optional): The kernel groups of [reaches], to avoid grouping them for every
+            junction. Defaults to None.
+
+    Returns:
+        dict[str, float]: The reach of each of [reaches]
+    """
+    groups = groups if groups is not None else _kernel_groups(reaches)
+    kernels = [(KERNELS[reach.kernel], reach.scale, positions) for reach, positions in groups]
+
+    totals = [0.0] * (len(reaches) + 1)
+    distances = { junction_id: 0.0 }
+    visited = set()
+    queue = [(0.0, junction_id)]
+    while queue:
+        distance, junction = heappop(queue)
+        if junction in visited: continue
+        visited.add(junction)
+
+        record = records[junction]
+        for kernel, scale, positions in kernels:
+            factor = kernel(distance, scale)
+            for position in positions:
+                totals[position] += record[position] * factor
+
+        for neighbor, length, _ in record[0]:
+            neighbor_distance = distance + length
+            # Only queue a junction when it is within the limit and closer than it has been found before
+            if neighbor_distance <= limit and neighbor_distance < distances.get(neighbor, math.inf):
+                distances[neighbor] = neighbor_distance
+                heappush(queue, (neighbor_distance, neighbor))
+
+    return { reach.name: totals[position] for position, reach in enumerate(reaches, start=1) }
+
+def normalize_reaches(junctions: Dataset, names: Sequence[str]):
+    """Divide each reach by the largest reach of its column. Columns that are all zero are left as they are."""
+    for name in names:
+        highest = max((junction[name] for junction in junctions), default=0)
+        if not highest: continue
+        for junction in junctions:
+            junction[name] /= highest
+
+def calculate_reaches(junctions: Dataset, reaches: Sequence[Reach] = DEFAULT_REACHES, limit: float = LIMIT, normalize: bool = True):
+    """Calculate the reaches of every junction and write them to the junctions
+
+    Args:
+        junctions (Dataset): The junctions, eg: from load_junction_graph
+        reaches (Sequence[Reach], optional): The reaches to calculate. Defaults to DEFAULT_REACHES.
+        limit (float, optional): The distance beyond which junctions are not counted. Defaults to 1000.
+        normalize (bool, optional): Divide each reach by the largest so they are between 0 and 1. Defaults to True.
+    """
+    with stage('calculate_reaches', rows=len(junctions)), progress('calculate_reaches', len(junctions)) as tracker:
+        records = junction_records(junctions, reaches)
+        groups = _kernel_groups(reaches)
+
+        for junction in junctions:
+            junction.update(calculate_reach(records, junction['id'], reaches, limit, groups))
+            tracker.advance()
+        tracker.finish()
+
+        if normalize:
+            print("Normalizing")
+            normalize_reaches(junctions, [reach.name for reach in reaches])
+        print("Done")
+
+def write_reaches(junctions: Dataset, filename: str):
+    """Write the junctions, and a typed Parquet copy next to a csv file that analysis scripts can read a few columns of quickly"""
+    junctions.write_to_file(filename)
+    if filename.endswith('.csv') and parquet_available():
+        junctions.write_to_file(f'{filename[:-len(".csv")]}.parquet')
+
+def main(arguments: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Calculate the reaches of the junctions of the street network")
+    parser.add_argument('--input', default=os.path.join(CLEANED_DATA_FOLDER, 'junctions.csv'), help="The junction file")
+    parser.add_argument('--output', default=os.path.join(CLEANED_DATA_FOLDER, 'reach_junctions.csv'), help="Where to write the junctions with their reaches")
+    parser.add_argument(
+        '--reach', nargs='+', type=Reach.parse, default=DEFAULT_REACHES,
+        help=f"The reaches to calculate as NAME=COLUMN[:KERNEL[:SCALE]]. The kernels are {list(KERNELS)}. Defaults to the reaches loaded into Neo4j"
+    )
+    parser.add_argument('--limit', type=float, default=LIMIT, help=f"The distance in metres beyond which junctions are not counted. Defaults to {LIMIT}")
+    parser.add_argument('--no-normalize', action='store_true', help="Keep the raw reaches instead of dividing each by the largest")
+    args = parser.parse_args(arguments)
+
+    print(f"Calculating {', '.join(reach.name for reach in args.reach)} within {args.limit:g}m", file=sys.stderr)
+    junctions = load_junction_graph(args.input, args.reach)
+    calculate_reaches(junctions, args.reach, args.limit, normalize=not args.no_normalize)
+    write_reaches(junctions, args.output)
+
+if __name__ == "__main__":
+    main()
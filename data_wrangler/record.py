@@ -0,0 +1,25 @@
+from __future__ import annotations
+
+from functools import lru_cache
+from collections import namedtuple
+from collections.abc import Sequence
+
+@lru_cache(maxsize=None)
+def _record_type(name: str, fields: tuple[str, ...]) -> type:
+    return namedtuple(name, fields, rename=True)
+
+def record_type(fields: Sequence[str], name: str = 'Record') -> type:
+    """Get a compact record class for a set of fields
+
+    Records are named tuples so they have no per-row dictionary. Fields can be read by position (record[0]), which is the cheapest
+    access, or by attribute (record.latitude). Field names that aren't valid identifiers are renamed to _0, _1, ...
+    The same class is returned for the same name and fields.
+
+    Args:
+        fields (Sequence[str]): The names of the fields
+        name (str, optional): The name of the class. Defaults to 'Record'.
+
+    Returns:
+        type: The record class. Create records with RecordClass(*values) or RecordClass._make(values)
+    """
+    return _record_type(name, tuple(fields))
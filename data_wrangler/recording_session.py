@@ -0,0 +1,276 @@
+from __future__ import annotations
+
+import re
+
+from time import perf_counter
+from typing import Any
+from typing import Callable
+
+# The parameter holding the rows of a batch, eg: 'UNWIND $properties AS props'
+_UNWIND = re.compile(r'UNWIND\s+\$(\w+)', re.IGNORECASE)
+# The label written by GraphWriter.write_category and the type written by GraphWriter.write_relation
+_CREATE_NODE = re.compile(r'CREATE\s*\(\s*n\s*:\s*(\w+)\s*\)', re.IGNORECASE)
+_CREATE_RELATIONSHIP = re.compile(r'\[\s*r\s*:\s*(\w+)\s*\]')
+_LABEL = re.compile(r'\(\s*\w*\s*:\s*(\w+)')
+
+class RecordedQuery:
+    def __init__(self, query: str, target: str, rows: int, parameter_bytes: int, round_trip: int, in_transaction: bool):
+        """A query sent to a RecordingSession
+
+        Args:
+            query (str): The Cypher query
+            target (str): What the query writes, see query_target
+            rows (int): The number of rows the query was run for, i.e. the length of the list it unwinds or 1
+            parameter_bytes (int): The estimated size of the parameters when sent to the database, see packed_size
+            round_trip (int): The number of the round trip the query was sent in, starting at 1
+            in_transaction (bool): Whether the query was run in an explicit transaction
+        """
+        self.query = query
+        self.target = target
+        self.rows = rows
+        self.parameter_bytes = parameter_bytes
+        self.round_trip = round_trip
+        self.in_transaction = in_transaction
+        self.seconds = 0.0
+
+    def __repr__(self):
+        return f"RecordedQuery({self.target}, rows={self.rows}, parameter_bytes={self.parameter_bytes})"
+
+class RecordingSession:
+    def __init__(self, session: Any = None):
+        """A stand-in for a neo4j Session that records the queries it is given
+
+        Without a session nothing is sent anywhere and every query returns an empty result, so GraphWriter and load_data can be run
+        without a database. With a session every query is also sent to it, so the same numbers can be compared with a real database.
+
+        A query run on the session is one round trip. A transaction takes one round trip per query and one to commit.
+
+        Args:
+            session (Session, optional): A neo4j session to send the queries to. Defaults to None, i.e. no database.
+        """
+        self.session = session
+        self.queries: list[RecordedQuery] = []
+        self.round_trips = 0
+        self.transactions = 0
+
+    def run(self, query: str, parameters: dict[str, Any] | None = None, **kwparameters) -> Any:
+        """Record a query and run it on the session if there is one
+
+        Args:
+            query (str): The Cypher query
+            parameters (dict[str, Any], optional): The parameters of the query. Defaults to None.
+            kwparameters: More parameters of the query
+
+        Returns:
+            Result: The result of the query. Empty without a session.
+        """
+        record = self._record(query, { **(parameters or {}), **kwparameters }, in_transaction=False)
+        if self.session is None:
+            return _EmptyResult()
+
+        start = perf_counter()
+        result = self.session.run(query, parameters, **kwparameters)
+        record.seconds += perf_counter() - start
+        return _TimedResult(result, record)
+
+    def execute_write(self, transaction_function: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run a function in a write transaction, recording the queries it runs
+
+        Args:
+            transaction_function (Callable[..., Any]): The function. Is given the transaction followed by args and kwargs.
+
+        Returns:
+            Any: What the function returns
+        """
+        return self._transaction('execute_write', transaction_function, args, kwargs)
+
+    def execute_read(self, transaction_function: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run a function in a read transaction, recording the queries it runs. See execute_write."""
+        return self._transaction('execute_read', transaction_function, args, kwargs)
+
+    # The names used by version 4 of the driver, which some of the loading scripts still call
+    write_transaction = execute_write
+    read_transaction = execute_read
+
+    def close(self):
+        if self.session is not None:
+            self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+    def clear(self):
+        """Forget the recorded queries"""
+        self.queries = []
+        self.round_trips = 0
+        self.transactions = 0
+
+    def summary(self) -> dict[str, dict[str, Any]]:
+        """The totals of the recorded queries for each target
+
+        Returns:
+            dict[str, dict[str, Any]]: The number of batches (queries), statements (rows), parameter bytes and seconds spent waiting
+                for the database of each target, in the order they were first written. Each batch is one round trip.
+        """
+        targets: dict[str, dict[str, Any]] = {}
+        for record in self.queries:
+            totals = targets.setdefault(record.target, { 'batches': 0, 'statements': 0, 'parameter_bytes': 0, 'seconds': 0.0 })
+            totals['batches'] += 1
+            totals['statements'] += record.rows
+            totals['parameter_bytes'] += record.parameter_bytes
+            totals['seconds'] += record.seconds
+        return targets
+
+    def totals(self) -> dict[str, Any]:
+        """The totals of all the recorded queries"""
+        return {
+            'queries': len(self.queries),
+            'statements': sum(record.rows for record in self.queries),
+            'parameter_bytes': sum(record.parameter_bytes for record in self.queries),
+            'query_bytes': sum(len(record.query.encode('utf-8')) for record in self.queries),
+            'round_trips': self.round_trips,
+            'transactions': self.transactions,
+            'seconds': sum(record.seconds for record in self.queries)
+        }
+
+    def _transaction(self, method: str, transaction_function: Callable[..., Any], args: tuple, kwargs: dict[str, Any]) -> Any:
+        self.transactions += 1
+        if self.session is None:
+            result = transaction_function(_RecordingTransaction(self, None), *args, **kwargs)
+        else:
+            def recorded(transaction, *args, **kwargs):
+                return transaction_function(_RecordingTransaction(self, transaction), *args, **kwargs)
+            result = getattr(self.session, method)(recorded, *args, **kwargs)
+
+        # Committing is one more round trip
+        self.round_trips += 1
+        return result
+
+    def _record(self, query: str, parameters: dict[str, Any], in_transaction: bool) -> RecordedQuery:
+        self.round_trips += 1
+        unwind = _UNWIND.search(query)
+        rows = parameters.get(unwind.group(1)) if unwind else None
+        record = RecordedQuery(
+            query, query_target(query), len(rows) if isinstance(rows, (list, tuple)) else 1, packed_size(parameters), self.round_trips,
+            in_transaction
+        )
+        self.queries.append(record)
+        return record
+
+class _RecordingTransaction:
+    def __init__(self, session: RecordingSession, transaction: Any):
+        self._session = session
+        self._transaction = transaction
+
+    def run(self, query: str, parameters: dict[str, Any] | None = None, **kwparameters) -> Any:
+        record = self._session._record(query, { **(parameters or {}), **kwparameters }, in_transaction=True)
+        if self._transaction is None:
+            return _EmptyResult()
+
+        start = perf_counter()
+        result = self._transaction.run(query, parameters, **kwparameters)
+        record.seconds += perf_counter() - start
+        return _TimedResult(result, record)
+
+class _EmptyResult:
+    """The result of a query that wasn't sent to a database"""
+
+    def consume(self):
+        return None
+
+    def data(self) -> list[dict[str, Any]]:
+        return []
+
+    def single(self, strict: bool = False):
+        return None
+
+    def __iter__(self):
+        return iter(())
+
+class _TimedResult:
+    """A result that adds the time spent waiting for it to its RecordedQuery"""
+
+    def __init__(self, result: Any, record: RecordedQuery):
+        self._result = result
+        self._record = record
+
+    def consume(self):
+        start = perf_counter()
+        summary = self._result.consume()
+        self._record.seconds += perf_counter() - start
+        return summary
+
+    def __iter__(self):
+        return iter(self._result)
+
+    def __getattr__(self, name):
+        return getattr(self._result, name)
+
+def query_target(query: str) -> str:
+    """Find what a query writes
+
+    Args:
+        query (str): The Cypher query
+
+    Returns:
+        str: 'category:<label>' for the batches of GraphWriter.write_category and 'relationship:<type>' for those of
+            GraphWriter.write_relation, matching the keys of a Checkpoint. 'delete' for deletes and 'query:<label>' for anything
+            else, using the first label in the query.
+    """
+    if 'DELETE' in query.upper():
+        return 'delete'
+    if _UNWIND.search(query):
+        relationship = _CREATE_RELATIONSHIP.search(query)
+        if relationship:
+            return f'relationship:{relationship.group(1)}'
+        node = _CREATE_NODE.search(query)
+        if node:
+            return f'category:{node.group(1)}'
+    label = _LABEL.search(query)
+    return f'query:{label.group(1)}' if label else 'query'
+
+def packed_size(value: Any) -> int:
+    """Estimate the number of bytes a value takes when sent to Neo4j
+
+    Follows the sizes of PackStream, the format used by the Bolt protocol, without encoding anything. Values PackStream can't
+    encode are counted as their string.
+
+    Args:
+        value (Any): The value, eg: the parameters of a query
+
+    Returns:
+        int: The number of bytes
+    """
+    if value is None or isinstance(value, bool):
+        return 1
+    if isinstance(value, int):
+        if -16 <= value < 128: return 1
+        if -128 <= value < 128: return 2
+        if -32768 <= value < 32768: return 3
+        if -2147483648 <= value < 2147483648: return 5
+        return 9
+    if isinstance(value, float):
+        return 9
+    if isinstance(value, str):
+        size = len(value.encode('utf-8'))
+        return _header_size(size) + size
+    if isinstance(value, (bytes, bytearray)):
+        return _header_size(len(value)) + len(value)
+    if isinstance(value, dict):
+        return _header_size(len(value)) + sum(packed_size(key) + packed_size(item) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return _header_size(len(value)) + sum(map(packed_size, value))
+    if hasattr(value, 'item') and not hasattr(value, '__len__'):
+        # numpy scalars
+        return packed_size(value.item())
+    return packed_size(str(value))
+
+def _header_size(length: int) -> int:
+    """The size of the marker and length of a string, list or map"""
+    if length < 16: return 1
+    if length < 256: return 2
+    if length < 65536: return 3
+    return 5
@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+import gc
+
+from typing import Any
+from contextlib import contextmanager
+from collections.abc import Sequence
+from collections.abc import Iterable
+
+from .conversion_functions import Row
+from .conversion_functions import RowFunction
+from .conversion_functions import ConversionMap
+from .conversion_functions import ConversionFunction
+
+class BadRow:
+    def __init__(self, row_number: int, field: str, value: Any, error: Exception):
+        """A value that could not be converted while loading a file
+
+        Args:
+            row_number (int): The number of the row in the file, starting at 1 for the first row after the header
+            field (str): The field in the file
+            value (Any): The value that could not be converted
+            error (Exception): The error raised by the conversion
+        """
+        self.row_number = row_number
+        self.field = field
+        self.value = value
+        self.error = error
+
+    def __repr__(self):
+        return f"row {self.row_number} {self.field}={self.value!r} ({type(self.error).__name__}: {self.error})"
+
+class Schema:
+    def __init__(self, conversion_map: ConversionMap | None = None, on_bad_rows: str = 'raise', max_reported: int = 10):
+        """The columns to load from a csv file and how to convert them, resolved once for the whole file
+
+        Rows are read as lists and each conversion is applied to a whole column at a time instead of looking up fields row by row.
+        Values that can't be converted are collected and reported together once the whole file has been read.
+        RowFunctions need the whole row so they can't be used in a schema.
+
+        Args:
+            conversion_map (ConversionMap, optional): The conversions, as for Dataset.load_file. Defaults to None, i.e. every column as a string.
+            on_bad_rows (str, optional): 'raise' to raise one exception listing the bad rows or 'drop' to leave them out and print a summary.
+                Defaults to 'raise'.
+            max_reported (int, optional): The number of bad rows to show in the report. Defaults to 10.
+        """
+        if on_bad_rows not in ('raise', 'drop'):
+            raise Exception(f"on_bad_rows must be 'raise' or 'drop' not {on_bad_rows}")
+
+        # (output name, field in the file, conversion) for each column
+        self.columns: list[tuple[str, str, ConversionFunction | None]] = []
+        if conversion_map is not None:
+            for name, conversion in conversion_map.items():
+                if isinstance(conversion, RowFunction):
+                    raise Exception(f"{name} uses a RowFunction which can't be used in a Schema")
+                if isinstance(conversion, tuple):
+                    function, field = conversion
+                    self.columns.append((name, field, function))
+                else:
+                    self.columns.append((name, name, conversion))
+
+        self.converts = conversion_map is not None
+        self.on_bad_rows = on_bad_rows
+        self.max_reported = max_reported
+
+    @staticmethod
+    def supports(conversion_map: ConversionMap | None) -> bool:
+        """Whether a conversion map can be used in a Schema, i.e. it has no RowFunctions"""
+        return conversion_map is None or not any(isinstance(conversion, RowFunction) for conversion in conversion_map.values())
+
+    def read(self, rows: Iterable[list[str]], fieldnames: Sequence[str], primary_key: str, primary_key_start: int = 0,
+             keep: Sequence[str] | None = None) -> list[Row]:
+        """Convert the rows of a csv file
+
+        Args:
+            rows (Iterable[list[str]]): The rows after the header, as read by csv.reader
+            fieldnames (Sequence[str]): The names of the fields in the file
+            primary_key (str): The primary key. Numbers starting at primary_key_start are used if it isn't one of the columns.
+            primary_key_start (int, optional): The first generated primary key. Defaults to 0.
+            keep (Sequence[str], optional): Only use these fields of the file, the rest are treated as missing. Defaults to None.
+
+        Returns:
+            list[Row]: The converted rows
+        """
+        with _gc_paused():
+            return self._read(rows, fieldnames, primary_key, primary_key_start, keep)
+
+    def _read(self, rows: Iterable[list[str]], fieldnames: Sequence[str], primary_key: str, primary_key_start: int,
+              keep: Sequence[str] | None) -> list[Row]:
+        records = list(rows)
+        width = len(fieldnames)
+
+        # Ragged files are rare so only check each row when some row isn't the width of the header
+        padded = False
+        extras: dict[int, list[str]] = {}
+        if set(map(len, records)) - { width }:
+            # Blank lines are skipped and short rows are padded with None like csv.DictReader does
+            records = [row for row in records if row]
+            for i, row in enumerate(records):
+                if len(row) < width:
+                    records[i] = row + [None] * (width - len(row))    # type: ignore
+                    padded = True
+                elif len(row) > width:
+                    extras[i] = row[width:]
+
+        positions = { field: position for position, field in enumerate(fieldnames) }
+        missing = [field for _, field, _ in self.columns if field not in positions]
+        if missing:
+            print(f"{missing} are not valid fieldnames and are left empty. The availiable fieldnames are {list(fieldnames)}")
+        if keep is not None:
+            positions = { field: positions[field] for field in keep if field in positions }
+
+        if not self.converts and keep is None:
+            # Every field as a string, so the rows only need names
+            data = [dict(zip(fieldnames, record)) for record in records]
+            for i, extra in extras.items():
+                data[i][None] = extra   # type: ignore
+            if len(data) > 0 and primary_key not in data[0]:
+                for i, row in enumerate(data):
+                    row[primary_key] = i + primary_key_start
+            return data
+
+        if not self.converts:
+            names = list(positions)
+            columns = [_column(records, positions[field]) for field in names]
+            bad_rows: list[BadRow] = []
+        else:
+            names, columns, bad_rows = self._convert_columns(records, positions, padded)
+
+        if primary_key not in names:
+            names.append(primary_key)
+            columns.append(range(primary_key_start, primary_key_start + len(records)))
+
+        data = [dict(zip(names, values)) for values in zip(*columns)]
+
+        if bad_rows:
+            data = self._handle_bad_rows(data, bad_rows)
+
+        return data
+
+    def _convert_columns(self, records: list[list[str]], positions: dict[str, int], padded: bool):
+        names = []
+        columns = []
+        bad_rows = []
+        for name, field, function in self.columns:
+            names.append(name)
+            if field not in positions:
+                columns.append([None] * len(records))
+                continue
+
+            column = _column(records, positions[field])
+            if function is str and not padded:
+                # Already strings
+                columns.append(column)
+                continue
+
+            try:
+                columns.append(list(map(function, column)))     # type: ignore
+            except Exception:
+                # Find every bad value in the column instead of stopping at the first
+                values = []
+                for i, value in enumerate(column):
+                    try:
+                        values.append(function(value))     # type: ignore
+                    except Exception as error:
+                        bad_rows.append(BadRow(i + 1, field, value, error))
+                        values.append(None)
+                columns.append(values)
+
+        return names, columns, bad_rows
+
+    def _handle_bad_rows(self, data: list[Row], bad_rows: list[BadRow]) -> list[Row]:
+        row_numbers = sorted({ bad_row.row_number for bad_row in bad_rows })
+        bad_rows.sort(key=lambda bad_row: bad_row.row_number)
+        fields = sorted({ bad_row.field for bad_row in bad_rows })
+
+        report = f"{len(row_numbers)} rows with values that could not be converted in {fields}"
+        shown = '\n    '.join(map(repr, bad_rows[:self.max_reported]))
+        more = f"\n    ... and {len(bad_rows) - self.max_reported} more" if len(bad_rows) > self.max_reported else ''
+
+        if self.on_bad_rows == 'raise':
+            raise Exception(f"Found {report}:\n    {shown}{more}")
+
+        print(f"Dropped {report}:\n    {shown}{more}")
+        dropped = set(row_numbers)
+        return [row for i, row in enumerate(data) if i + 1 not in dropped]
+
+@contextmanager
+def _gc_paused():
+    """Pause the cyclic garbage collector while building rows
+
+    Loading creates hundreds of thousands of lists and dicts that can't form cycles. Each time enough of them are created the collector
+    walks every object that is still alive, which includes all the rows read so far, so loading slows down as the file gets longer.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+def _column(records: list[list[str]], position: int) -> list[str]:
+    """Get one field of every row"""
+    return [record[position] for record in records]
@@ -8,6 +8,7 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import numpy as np
 
+import os
 import math
 
 sns.set_theme()
@@ -15,11 +16,17 @@ sns.set_context('notebook', font_scale=1.5)
 plt.tight_layout(pad=10);
 
 JUNCTION_FILE = '../data/cleaned_data/junctions.csv'
+JUNCTION_PARQUET = '../data/cleaned_data/junctions.parquet'
 
-junctions = pd.read_csv(JUNCTION_FILE)
-junctions = junctions.loc[ :, [
+COLUMNS = [
     'observation_count', 'crime_count', 'graffiti_count', 'theft_likelihood', 'mischief_likelihood', 'breakins_likelihood', 'assault_likelihood', 'other_likelihood',
-]]
+]
+
+# Only the needed columns are read. The Parquet copy is much faster to read when it is up to date.
+if os.path.exists(JUNCTION_PARQUET) and os.path.getmtime(JUNCTION_PARQUET) >= os.path.getmtime(JUNCTION_FILE):
+    junctions = pd.read_parquet(JUNCTION_PARQUET, columns=COLUMNS)
+else:
+    junctions = pd.read_csv(JUNCTION_FILE, usecols=COLUMNS)[COLUMNS]
 
 counts = junctions.loc[ :, [
     'crime_count', 'graffiti_count', 'theft_likelihood', 'mischief_likelihood', 'breakins_likelihood', 'assault_likelihood', 'other_likelihood'
@@ -124,4 +131,4 @@ def analyze(ax: plt.Axes, data, xlabel, ylabel):
 # sns.heatmap(round(corr, 2), annot=True, cmap='coolwarm', fmt='.2f', linewidths=.05, ax=plt.subplot(2, 2, 2))
 sns.heatmap(round(corr_count, 2), annot=True, cmap='coolwarm', fmt='.2f', linewidths=.05, ax=plt.subplot(1, 1, 1))
 
-plt.show()z
\ No newline at end of file
+plt.show()
\ No newline at end of file
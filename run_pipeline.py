@@ -0,0 +1,171 @@
+### Runs the data pipeline from the original data to the Neo4j database
+### Stages are only rerun when their code or the files they read have changed since their last run
+
+import os
+import argparse
+from glob import glob
+
+from data_wrangler.pipeline import Stage
+from data_wrangler.pipeline import Pipeline
+from data_wrangler.dataset import parquet_available
+from data_wrangler.profiling import PROFILE_FOLDER
+
+# Must match the pattern used by data_cleanup/crime_ingest.py
+CRIME_FILE_PATTERN = 'crime_[0-9][0-9][0-9][0-9].csv'
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+ORIGINAL = 'data/original_data'
+PRE_PROCESSED = 'data/pre_processed_data'
+CLEANED = 'data/cleaned_data'
+
+# Every stage uses data_wrangler so changing it should rerun them
+DATA_WRANGLER = [f'data_wrangler/{name}' for name in sorted(os.listdir(os.path.join(ROOT, 'data_wrangler'))) if name.endswith('.py')]
+
+# Every yearly crime file is read by renaming.py
+CRIME_FILES = [
+    os.path.relpath(path, ROOT).replace(os.sep, '/')
+    for path in sorted(glob(os.path.join(ROOT, ORIGINAL, CRIME_FILE_PATTERN)))
+]
+
+# Every DEM tile is sampled by add_junction_heights.py
+DEM_FILES = [
+    os.path.relpath(path, ROOT).replace(os.sep, '/')
+    for extension in ('asc', 'tif', 'tiff')
+    for path in sorted(glob(os.path.join(ROOT, ORIGINAL, 'dem', f'*.{extension}')))
+]
+
+def parquet_copies(*paths: str) -> list[str]:
+    """The typed Parquet copies that the scripts write next to their csv files. They are only written when pyarrow is installed"""
+    return list(paths) if parquet_available() else []
+
+STAGES = [
+    Stage(
+        'renaming', 'data_cleanup/renaming.py',
+        inputs=[
+            f'{ORIGINAL}/junctions.csv',
+            f'{ORIGINAL}/streetsegments.csv',
+            f'{ORIGINAL}/transitstops.csv',
+            f'{ORIGINAL}/rapid-transit-stations/vancouver_stations.csv',
+            f'{ORIGINAL}/storefronts-inventory.csv',
+            f'{ORIGINAL}/schools.csv',
+            *CRIME_FILES,
+        ],
+        outputs=[
+            f'{PRE_PROCESSED}/junctions.csv',
+            f'{PRE_PROCESSED}/segments.csv',
+            f'{PRE_PROCESSED}/stores.csv',
+            f'{PRE_PROCESSED}/transit.csv',
+            f'{PRE_PROCESSED}/rapid_transit.csv',
+            f'{PRE_PROCESSED}/schools.csv',
+            f'{PRE_PROCESSED}/crimes.csv',
+            # Written by crime_ingest.py to know which crime files are already in crimes.csv
+            f'{PRE_PROCESSED}/crimes.csv.sources.json',
+        ],
+        code=[*DATA_WRANGLER, 'data_cleanup/crime_ingest.py']
+    ),
+    Stage(
+        'businesses', 'data_cleanup/businesses_cleanup.py',
+        inputs=[f'{ORIGINAL}/business-licences.csv'],
+        outputs=[f'{PRE_PROCESSED}/businesses.csv'],
+        code=DATA_WRANGLER
+    ),
+    Stage(
+        'cleanup', 'data_cleanup/cleanup.py',
+        inputs=[
+            f'{PRE_PROCESSED}/crimes.csv',
+            f'{PRE_PROCESSED}/junctions.csv',
+            f'{PRE_PROCESSED}/segments.csv',
+            f'{PRE_PROCESSED}/stores.csv',
+            f'{PRE_PROCESSED}/transit.csv',
+            f'{PRE_PROCESSED}/rapid_transit.csv',
+            f'{PRE_PROCESSED}/schools.csv',
+            f'{PRE_PROCESSED}/businesses.csv',
+        ],
+        outputs=[
+            f'{CLEANED}/junctions.csv',
+            f'{CLEANED}/segments.csv',
+            f'{CLEANED}/crimes.csv',
+            f'{CLEANED}/stores.csv',
+            f'{CLEANED}/transit.csv',
+            f'{CLEANED}/rapid_transit.csv',
+            f'{CLEANED}/schools.csv',
+            f'{CLEANED}/businesses.csv',
+        ],
+        code=[*DATA_WRANGLER, 'data_cleanup/compute_segment_locations.py']
+    ),
+    Stage(
+        'graffiti', 'data_cleanup/graffiti_cleanup.py',
+        inputs=[
+            f'{ORIGINAL}/graffiti.csv',
+            f'{ORIGINAL}/observations.csv',
+            f'{CLEANED}/junctions.csv',
+        ],
+        outputs=[
+            f'{CLEANED}/junctions.csv',
+            *parquet_copies(f'{CLEANED}/junctions.parquet'),
+            f'{CLEANED}/graffiti.csv',
+            f'{CLEANED}/observations.csv',
+        ],
+        code=DATA_WRANGLER
+    ),
+    Stage(
+        'reach', 'data_cleanup/reach_calculation.py',
+        inputs=[f'{CLEANED}/junctions.csv'],
+        outputs=[f'{CLEANED}/reach_junctions.csv', *parquet_copies(f'{CLEANED}/reach_junctions.parquet')],
+        code=DATA_WRANGLER
+    ),
+    Stage(
+        'heights', 'data_cleanup/add_junction_heights.py',
+        inputs=[f'{CLEANED}/reach_junctions.csv', *parquet_copies(f'{CLEANED}/reach_junctions.parquet'), *DEM_FILES],
+        outputs=[f'{CLEANED}/reach_junctions.csv', *parquet_copies(f'{CLEANED}/reach_junctions.parquet')],
+        code=DATA_WRANGLER
+    ),
+    Stage(
+        'transit_lines', 'data_cleanup/rapid_transit_lines.py',
+        inputs=[
+            f'{CLEANED}/rapid-transit-lines/burnaby.json',
+            f'{CLEANED}/rapid-transit-lines/vancouver.json',
+        ],
+        outputs=[f'{CLEANED}/rapid_transit_lines.csv'],
+        code=DATA_WRANGLER
+    ),
+    Stage(
+        'load', 'data_loading/main.py',
+        inputs=[
+            f'{CLEANED}/reach_junctions.csv',
+            f'{CLEANED}/segments.csv',
+            f'{CLEANED}/crimes.csv',
+            f'{CLEANED}/transit.csv',
+            f'{CLEANED}/rapid_transit.csv',
+            f'{CLEANED}/stores.csv',
+            f'{CLEANED}/schools.csv',
+            f'{CLEANED}/businesses.csv',
+            f'{CLEANED}/graffiti.csv',
+            f'{CLEANED}/observations.csv',
+            f'{CLEANED}/rapid_transit_lines.csv',
+        ],
+        outputs=[],
+        cwd='.',
+        code=DATA_WRANGLER
+    ),
+]
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the out of date stages of the data pipeline")
+    parser.add_argument('targets', nargs='*', help=f"The stages to bring up to date along with the stages they depend on. Defaults to all stages. One of {[stage.name for stage in STAGES]}")
+    parser.add_argument('--force', nargs='*', default=[], help="Stages to run even if they are up to date")
+    parser.add_argument('--jobs', type=int, default=2, help="The maximum number of stages to run at once")
+    parser.add_argument('--dry-run', action='store_true', help="Only show which stages would run")
+    parser.add_argument(
+        '--profile', nargs='?', const=PROFILE_FOLDER, default=None,
+        help=f"Profile each stage that runs and write the profiles to this folder. Defaults to {PROFILE_FOLDER}"
+    )
+    args = parser.parse_args()
+
+    pipeline = Pipeline(STAGES, ROOT)
+    if not pipeline.run(args.targets, force=args.force, jobs=args.jobs, dry_run=args.dry_run, profile=args.profile):
+        exit(-1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import pytest
+
+from data_wrangler import Dataset
+from data_wrangler import aggregation as agg
+from data_wrangler.expression import col
+
+def businesses():
+    return Dataset([
+        { 'id': 1, 'junction_id': 10, 'retail': True, 'employees': 3.0, 'age': 5 },
+        { 'id': 2, 'junction_id': 10, 'retail': False, 'employees': 10.0, 'age': 1 },
+        { 'id': 3, 'junction_id': 20, 'retail': True, 'employees': 2.0, 'age': 7 },
+        { 'id': 4, 'junction_id': 10, 'retail': True, 'employees': 1.0, 'age': 2 },
+        { 'id': 5, 'junction_id': 30, 'retail': False, 'employees': 4.0, 'age': 9 },
+    ])
+
+def test_groups_are_keyed_in_order_of_appearance():
+    groups = businesses().group_by('junction_id').agg({ 'count': agg.count() })
+
+    assert groups.primary_key == 'junction_id'
+    assert [(row['junction_id'], row['count']) for row in groups] == [(10, 3), (20, 1), (30, 1)]
+
+def test_count_if_and_sum_if_only_use_rows_meeting_the_condition():
+    groups = businesses().group_by('junction_id').agg({
+        'retail_count': agg.count_if(col('retail')),
+        'retail_employees': agg.sum_if('employees', col('retail')),
+        'old_count': agg.count_if(col('age') >= 5),
+    })
+
+    assert [groups[key]['retail_count'] for key in (10, 20, 30)] == [2, 1, 0]
+    assert [groups[key]['retail_employees'] for key in (10, 20, 30)] == [4.0, 2.0, 0.0]
+    assert [groups[key]['old_count'] for key in (10, 20, 30)] == [1, 1, 1]
+
+def test_sums_of_integers_stay_integers():
+    groups = businesses().group_by('junction_id').agg({ 'total_age': agg.sum('age') })
+
+    assert [groups[key]['total_age'] for key in (10, 20, 30)] == [8, 7, 9]
+    assert all(type(row['total_age']) is int for row in groups)
+
+def test_mean_min_and_max():
+    groups = businesses().group_by('junction_id').agg({
+        'mean_age': agg.mean('age'),
+        'min_age': agg.min('age'),
+        'max_age': agg.max('age'),
+        'retail_mean': agg.mean('employees', col('retail')),
+        'retail_max': agg.max('age', col('retail')),
+    })
+
+    assert groups[10]['mean_age'] == pytest.approx(8 / 3)
+    assert [groups[key]['min_age'] for key in (10, 20, 30)] == [1, 7, 9]
+    assert [groups[key]['max_age'] for key in (10, 20, 30)] == [5, 7, 9]
+
+    # Junction 30 has no retail businesses
+    assert [groups[key]['retail_mean'] for key in (10, 20, 30)] == [2.0, 2.0, None]
+    assert [groups[key]['retail_max'] for key in (10, 20, 30)] == [5, 7, None]
+
+def test_grouping_on_a_missing_column_raises():
+    with pytest.raises(Exception, match="Cannot group on junction"):
+        businesses().group_by('junction')
+
+def test_grouping_an_empty_dataset():
+    groups = Dataset([]).group_by('junction_id').agg({ 'count': agg.count(), 'max_age': agg.max('age') })
+
+    assert len(groups) == 0
@@ -0,0 +1,52 @@
+import os
+import sys
+import json
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'data_cleanup'))
+
+from crime_ingest import ingest_crimes
+
+HEADER = 'TYPE,YEAR,MONTH,DAY,HOUR,MINUTE,HUNDRED_BLOCK,NEIGHBOURHOOD,X,Y\n'
+
+def write_crimes(path, year, count):
+    with open(path, 'w', encoding='utf-8') as crime_file:
+        crime_file.write(HEADER)
+        for i in range(count):
+            crime_file.write(f'Theft from Vehicle,{year},1,{i % 28 + 1},12,0,10XX ALBERNI ST,West End,{491015.9434 + i},5459166.1397\n')
+    return str(path)
+
+def read_table(path):
+    with open(path, 'r', encoding='utf-8-sig') as table:
+        return table.read().splitlines()
+
+def test_new_files_are_appended(tmp_path):
+    first = write_crimes(tmp_path / 'crime_2021.csv', 2021, 3)
+    second = write_crimes(tmp_path / 'crime_2022.csv', 2022, 2)
+    output = str(tmp_path / 'crimes.csv')
+
+    ingest_crimes([first], output)
+    ingest_crimes([first, second], output)
+
+    assert len(read_table(output)) == 1 + 3 + 2
+    with open(f'{output}.sources.json', 'r', encoding='utf-8') as sources:
+        recorded = json.load(sources)
+    assert sorted(recorded['files']) == ['crime_2021.csv', 'crime_2022.csv']
+    assert recorded['size'] == os.path.getsize(output)
+
+def test_interrupted_append_is_removed(tmp_path):
+    first = write_crimes(tmp_path / 'crime_2021.csv', 2021, 3)
+    second = write_crimes(tmp_path / 'crime_2022.csv', 2022, 2)
+    output = str(tmp_path / 'crimes.csv')
+    ingest_crimes([first], output)
+    expected = read_table(output)
+
+    # A run that died while appending the second file, before recording it
+    with open(output, 'a', encoding='utf-8') as table:
+        table.write('Theft from Vehicle,2022,1,1,12,0,10XX ALB')
+
+    ingest_crimes([first, second], output)
+    rows = read_table(output)
+    assert rows[:len(expected)] == expected
+    assert len(rows) == 1 + 3 + 2
+    assert not any('10XX ALB,' in row for row in rows)
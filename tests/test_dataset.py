@@ -0,0 +1,93 @@
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import pytest
+
+from data_wrangler import Dataset
+from data_wrangler.expression import col
+
+def crimes():
+    return Dataset([
+        { 'id': 1, 'category': 'Theft', 'neighbors': [2, 3], 'latitude': 49.2, 'longitude': -123.1, 'count': 4 },
+        { 'id': 2, 'category': 'Mischief', 'neighbors': [1], 'latitude': 0.0, 'longitude': 0.0, 'count': 0 },
+        { 'id': 3, 'category': 'Theft', 'neighbors': [], 'latitude': 49.3, 'longitude': 0.0, 'count': 2 },
+    ])
+
+def test_expression_boolean_operators():
+    data = crimes()
+
+    assert ((col('latitude') != 0) & (col('longitude') != 0)).evaluate(data).tolist() == [True, False, False]
+    assert ((col('latitude') != 0) | (col('longitude') != 0)).evaluate(data).tolist() == [True, False, True]
+    assert (~(col('count') > 1)).evaluate(data).tolist() == [False, True, False]
+
+def test_expression_arithmetic():
+    data = crimes()
+
+    assert (col('count') * 2 + 1).evaluate(data).tolist() == [9, 1, 5]
+    assert (1 - col('count')).evaluate(data).tolist() == [-3, 1, -1]
+
+def test_expression_len_and_isin_on_object_columns():
+    data = crimes()
+
+    assert col('neighbors').len().evaluate(data).tolist() == [2, 1, 0]
+    assert col('category').isin(['Theft', 'Break and Enter']).evaluate(data).tolist() == [True, False, True]
+    assert (col('category') == 'Theft').evaluate(data).tolist() == [True, False, True]
+
+def test_filter_and_add_property_with_expressions():
+    data = crimes()
+    data.add_property('doubled', col('count') * 2)
+    data.filter(col('category').isin(['Theft']) & (col('neighbors').len() > 0))
+
+    assert [row['id'] for row in data] == [1]
+    assert data[1]['doubled'] == 8
+
+def test_convert_property_keeps_rows_when_keys_collide():
+    data = Dataset([{ 'id': '1', 'name': 'a' }, { 'id': '1.0', 'name': 'b' }, { 'id': '2', 'name': 'c' }])
+
+    with pytest.raises(Exception, match="non unique primary key"):
+        data.convert_property('id', lambda value: int(float(value)))
+
+    assert len(data) == 3
+    assert sorted(row['name'] for row in data) == ['a', 'b', 'c']
+
+def test_convert_property_rekeys_rows():
+    data = Dataset([{ 'id': '1', 'name': 'a' }, { 'id': '2', 'name': 'b' }])
+    data.convert_property('id', col('id').astype(int))
+
+    assert data[2]['name'] == 'b'
+
+def junctions():
+    return Dataset([{ 'id': 10, 'name': 'a' }, { 'id': 20, 'name': 'b' }, { 'id': 30, 'name': 'c' }])
+
+def test_join_fills_rows_without_a_match():
+    retail = Dataset([{ 'junction_id': 10, 'retail_count': 2 }, { 'junction_id': 30, 'retail_count': 1 }], primary_key='junction_id')
+
+    data = junctions()
+    data.join(retail, on='id', fill=0)
+
+    assert [(row['id'], row['retail_count']) for row in data] == [(10, 2), (20, 0), (30, 1)]
+
+def test_join_fill_is_copied_for_each_row():
+    data = junctions()
+    data.join(Dataset([{ 'id': 10, 'uses': ['shop'] }]), on='id', fill=[])
+    data[20]['uses'].append('park')
+
+    assert data[10]['uses'] == ['shop']
+    assert data[30]['uses'] == []
+
+def test_join_on_another_column():
+    stations = Dataset([{ 'id': 1, 'junction': 20, 'line': 'Expo' }, { 'id': 2, 'junction': 30, 'line': 'Canada' }])
+
+    data = junctions()
+    data.join(stations, on='id', other_on='junction', columns=['line'])
+
+    assert [row['line'] for row in data] == [None, 'Expo', 'Canada']
+    assert 'junction' not in data[10]
+
+def test_join_on_a_column_with_repeated_values_raises():
+    stations = Dataset([{ 'id': 1, 'junction': 20 }, { 'id': 2, 'junction': 20 }])
+
+    with pytest.raises(Exception, match="not unique"):
+        junctions().join(stations, on='id', other_on='junction')
@@ -0,0 +1,74 @@
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import pytest
+
+from data_wrangler.elevation import DemTileSet
+from data_wrangler.elevation import DemElevationProvider
+from data_wrangler.elevation import HttpElevationProvider
+from data_wrangler.elevation import CachedElevationProvider
+from data_wrangler.elevation_server import StubElevationServer
+
+def height(longitude, latitude):
+    """A made up elevation that is different for every point"""
+    return round((latitude - 49) * 1000 + (longitude + 123) * 100, 3)
+
+def points(count, start=0):
+    return [(-123.1 + i * 0.001, 49.2 + i * 0.0005) for i in range(start, start + count)]
+
+def test_dem_provider_interpolates_the_tiles(tmp_path):
+    # Cell centres are 1 and 2 at latitude 49.35 and 3 and 4 at 49.25
+    with open(tmp_path / 'tile.asc', 'w', encoding='utf-8') as tile:
+        tile.write("ncols 2\nnrows 2\nxllcorner -123.2\nyllcorner 49.2\ncellsize 0.1\nNODATA_value -9999\n1 2\n3 4\n")
+    provider = DemElevationProvider(DemTileSet.from_folder(str(tmp_path)))
+
+    elevations = provider.lookup([-123.15, -123.1, -122.0], [49.35, 49.3, 49.0])
+
+    assert elevations == [pytest.approx(1), pytest.approx(2.5), None]
+
+def test_points_are_sent_in_batches():
+    with StubElevationServer(height) as server:
+        provider = HttpElevationProvider(server.url, batch_size=4, workers=2, retry_delay=0)
+        longitudes, latitudes = zip(*points(10))
+        elevations = provider.lookup(longitudes, latitudes)
+
+    assert elevations == [height(longitude, latitude) for longitude, latitude in zip(longitudes, latitudes)]
+    assert sorted(len(request) for request in server.requests) == [2, 4, 4]
+
+def test_server_errors_are_retried():
+    with StubElevationServer(height) as server:
+        server.failures = 2
+        provider = HttpElevationProvider(server.url, batch_size=100, workers=1, retry_delay=0)
+        longitudes, latitudes = zip(*points(5))
+        elevations = provider.lookup(longitudes, latitudes)
+
+    assert elevations == [height(longitude, latitude) for longitude, latitude in zip(longitudes, latitudes)]
+    assert server.failures == 0
+    assert server.request_count == 1
+
+def test_too_many_server_errors_raise():
+    with StubElevationServer(height) as server:
+        server.failures = 3
+        provider = HttpElevationProvider(server.url, workers=1, max_retries=2, retry_delay=0)
+        with pytest.raises(Exception):
+            provider.lookup([-123.1], [49.2])
+
+def test_cache_only_looks_up_new_points(tmp_path):
+    cache = str(tmp_path / 'elevations.json')
+    first = points(6)
+    second = first + points(3, start=6)
+
+    with StubElevationServer(height) as server:
+        provider = CachedElevationProvider(HttpElevationProvider(server.url, batch_size=4, retry_delay=0), cache)
+        provider.lookup(*zip(*first))
+        assert server.location_count == 6
+
+        # A new provider only knows the first points from the cache file
+        provider = CachedElevationProvider(HttpElevationProvider(server.url, batch_size=4, retry_delay=0), cache)
+        elevations = provider.lookup(*zip(*second))
+
+    assert server.location_count == 9
+    assert sorted(server.requests[-1]) == sorted(points(3, start=6))
+    assert elevations == [height(longitude, latitude) for longitude, latitude in second]
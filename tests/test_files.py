@@ -0,0 +1,41 @@
+import os
+import sys
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from data_wrangler.files import atomic_write
+
+def test_file_is_replaced(tmp_path):
+    path = str(tmp_path / 'progress.json')
+    with open(path, 'w', encoding='utf-8') as old_file:
+        old_file.write('old')
+
+    with atomic_write(path) as new_file:
+        new_file.write('new')
+
+    with open(path, 'r', encoding='utf-8') as written:
+        assert written.read() == 'new'
+    assert os.listdir(tmp_path) == ['progress.json']
+
+def test_failed_write_keeps_the_old_file(tmp_path):
+    path = str(tmp_path / 'progress.json')
+    with open(path, 'w', encoding='utf-8') as old_file:
+        old_file.write('old')
+
+    with pytest.raises(ValueError):
+        with atomic_write(path) as new_file:
+            new_file.write('half')
+            raise ValueError()
+
+    with open(path, 'r', encoding='utf-8') as written:
+        assert written.read() == 'old'
+    assert os.listdir(tmp_path) == ['progress.json']
+
+def test_binary_files(tmp_path):
+    path = str(tmp_path / 'tile.npy')
+    with atomic_write(path, 'wb') as new_file:
+        new_file.write(b'\x93NUMPY')
+
+    with open(path, 'rb') as written:
+        assert written.read() == b'\x93NUMPY'
@@ -0,0 +1,58 @@
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from data_wrangler import Dataset
+from data_wrangler import Category
+from data_wrangler import Checkpoint
+from data_wrangler import GraphWriter
+
+class FakeResult:
+    def __init__(self, record=None):
+        self.record = record
+
+    def consume(self):
+        return None
+
+    def single(self, strict=False):
+        return self.record
+
+class FakeSession:
+    """Keeps the rows committed for each checkpoint key like the LoadCheckpoint nodes of a database"""
+
+    def __init__(self, committed=None):
+        self.committed = dict(committed or {})
+        self.batches = []
+
+    def run(self, query, **parameters):
+        if 'RETURN checkpoint.rows' in query:
+            rows = self.committed.get(parameters['key'])
+            return FakeResult({ 'rows': rows } if rows is not None else None)
+        if 'UNWIND' in query:
+            self.batches.append(parameters['properties'])
+            self.committed[parameters['checkpoint_key']] = parameters['checkpoint_rows']
+        return FakeResult()
+
+def make_category():
+    return Category('Junction', Dataset([{ 'id': i } for i in range(5)]), ['id'], batch_size=2)
+
+def test_batches_record_their_rows_in_the_same_query(tmp_path):
+    session = FakeSession()
+    checkpoint = Checkpoint(str(tmp_path / 'checkpoint.json'))
+    GraphWriter(session, checkpoint).write_category(make_category())
+
+    assert [[row['id'] for row in batch] for batch in session.batches] == [[0, 1], [2, 3], [4]]
+    assert session.committed['category:Junction'] == 5
+    assert checkpoint.completed_rows('category:Junction') == 5
+
+def test_resume_skips_a_batch_committed_but_not_in_the_file(tmp_path):
+    # The load died after the second batch was committed but before it was written to the checkpoint file
+    checkpoint = Checkpoint(str(tmp_path / 'checkpoint.json'))
+    checkpoint.record_batch('category:Junction', 2)
+    session = FakeSession({ 'category:Junction': 4 })
+
+    GraphWriter(session, Checkpoint(checkpoint.filename)).write_category(make_category())
+
+    assert [[row['id'] for row in batch] for batch in session.batches] == [[4]]
+    assert Checkpoint(checkpoint.filename).completed_rows('category:Junction') == 5
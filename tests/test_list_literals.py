@@ -0,0 +1,57 @@
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import pytest
+
+from ast import literal_eval
+
+from data_wrangler.list_literals import parse_lists
+
+def literal_lists(values):
+    """What the lists were parsed to before parse_lists, with empty values as empty lists"""
+    return [literal_eval(value) if value and value.strip() else [] for value in values]
+
+def typed(lists):
+    """The lists with the type of every item so ints and floats that are equal don't compare equal"""
+    def item(value):
+        if isinstance(value, tuple):
+            return tuple(item(part) for part in value)
+        return (type(value).__name__, value)
+    return [[item(value) for value in values] for values in lists]
+
+COLUMNS = {
+    'integers': ['[3029, 3218]', '[7]', '[-4, 0, 12]'],
+    'floats': ['[1.5, 2.25]', '[-0.5]', '[1e-05, 3.0]'],
+    'integers and floats in different rows': ['[1, 2]', '[2.5]'],
+    'integers and floats in one row': ['[1, 2.5]', '[3.0, 4]'],
+    'empty lists': ['[]', '[ ]', '', None, '[1, 2]', '  [3]  '],
+    'only empty lists': ['[]', '[ ]', None],
+    'tuples': ['[(24, 774.7263166, 7756), (5, 347.1479463, 7851)]', '[]', '[(1, 2.0, 3)]'],
+    'tuples of different sizes': ['[(24, 774.7, 7756), (5, 347.1)]', '[(1, 2.0, 3)]'],
+    'tuples with integers and floats in one position': ['[(1, 2.5), (2, 3)]'],
+    'strings': ["['S110', 'S200']", "[]", "['', 'Retail']", "['Vacant']"],
+    'strings with commas': ["['Hastings, East', 'a,b']"],
+    'strings with escaped quotes': ["['it\\'s', 'S200']", "['S110']"],
+    'strings with double quotes': ['["O\'Neil", \'S200\']', "['S110']"],
+    'strings with a backslash': ["['C:\\\\data', 'x']"],
+    'strings that look like separators': ['["a\', \'b"]', "['c']"],
+}
+
+@pytest.mark.parametrize('values', COLUMNS.values(), ids=COLUMNS.keys())
+def test_lists_match_literal_eval(values):
+    assert typed(parse_lists(values).lists()) == typed(literal_lists(values))
+
+def test_lengths():
+    assert parse_lists(['[3029, 3218]', '[]', None, '[7]']).lengths().tolist() == [2, 0, 0, 1]
+
+def test_one_field_of_tuples():
+    values = ['[(24, 774.7, 7756), (5, 347.1, 7851)]', '[]', '[(1, 2.0, 3)]']
+
+    assert parse_lists(values).lists(0) == [[24, 5], [], [1]]
+    assert parse_lists(values).lists(2) == [[7756, 7851], [], [3]]
+
+def test_values_that_are_not_lists_raise():
+    with pytest.raises(Exception):
+        parse_lists(['[1, 2]', '{1: 2}']).lists()
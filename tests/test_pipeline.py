@@ -0,0 +1,62 @@
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from data_wrangler.pipeline import Stage
+from data_wrangler.pipeline import Pipeline
+
+# The first stage copies source.txt to shared.txt and the second adds a line to shared.txt in place
+FIRST = """
+open('runs.txt', 'a').write('first\\n')
+open('shared.txt', 'w').write(open('source.txt').read())
+"""
+SECOND = """
+open('runs.txt', 'a').write('second\\n')
+text = open('shared.txt').read()
+open('shared.txt', 'w').write(text + 'second\\n')
+"""
+
+def make_pipeline(root):
+    return Pipeline([
+        Stage('first', 'first.py', inputs=['source.txt'], outputs=['shared.txt']),
+        Stage('second', 'second.py', inputs=['shared.txt'], outputs=['shared.txt']),
+    ], str(root))
+
+def runs(root):
+    return (root / 'runs.txt').read_text().split()
+
+def test_stages_that_share_a_file_are_skipped(tmp_path):
+    (tmp_path / 'first.py').write_text(FIRST)
+    (tmp_path / 'second.py').write_text(SECOND)
+    (tmp_path / 'source.txt').write_text('source\n')
+
+    assert make_pipeline(tmp_path).run(jobs=1)
+    assert runs(tmp_path) == ['first', 'second']
+
+    # A new pipeline only knows about the last run from the cache file
+    assert make_pipeline(tmp_path).run(jobs=1)
+    assert make_pipeline(tmp_path).run(jobs=1)
+    assert runs(tmp_path) == ['first', 'second']
+    assert (tmp_path / 'shared.txt').read_text() == 'source\nsecond\n'
+
+def test_changed_input_reruns_the_stages_that_share_a_file(tmp_path):
+    (tmp_path / 'first.py').write_text(FIRST)
+    (tmp_path / 'second.py').write_text(SECOND)
+    (tmp_path / 'source.txt').write_text('source\n')
+    assert make_pipeline(tmp_path).run(jobs=1)
+
+    (tmp_path / 'source.txt').write_text('changed\n')
+    assert make_pipeline(tmp_path).run(jobs=1)
+    assert runs(tmp_path) == ['first', 'second', 'first', 'second']
+    assert (tmp_path / 'shared.txt').read_text() == 'changed\nsecond\n'
+
+def test_deleted_shared_file_reruns_both_stages(tmp_path):
+    (tmp_path / 'first.py').write_text(FIRST)
+    (tmp_path / 'second.py').write_text(SECOND)
+    (tmp_path / 'source.txt').write_text('source\n')
+    assert make_pipeline(tmp_path).run(jobs=1)
+
+    (tmp_path / 'shared.txt').unlink()
+    assert make_pipeline(tmp_path).run(jobs=1)
+    assert runs(tmp_path) == ['first', 'second', 'first', 'second']
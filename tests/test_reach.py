@@ -0,0 +1,72 @@
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import pytest
+
+from data_wrangler import Dataset
+from data_wrangler.reach import Reach, calculate_reach, calculate_reaches, junction_records, normalize_reaches, normal_dst, reach_dst, _kernel_groups
+
+def junctions():
+    """A street 1 - 2 - 3 - 4 with a shortcut from 1 to 3. Neighbors are (junction, length, segment)."""
+    return Dataset([
+        { 'id': 1, 'neighbors': [(2, 300.0, 100), (3, 600.0, 103)], 'crime_count': 1, 'stores_count': 0 },
+        { 'id': 2, 'neighbors': [(1, 300.0, 100), (3, 400.0, 101)], 'crime_count': 2, 'stores_count': 1 },
+        { 'id': 3, 'neighbors': [(2, 400.0, 101), (4, 500.0, 102), (1, 600.0, 103)], 'crime_count': 4, 'stores_count': 0 },
+        { 'id': 4, 'neighbors': [(3, 500.0, 102)], 'crime_count': 8, 'stores_count': 2 },
+    ])
+
+def test_junctions_beyond_the_limit_are_not_counted():
+    reaches = [Reach('crime_reach', 'crime_count', 'borgatti', 100)]
+    records = junction_records(junctions(), reaches)
+
+    # Junction 3 is 600m away by the shortcut and junction 4 is 1100m away
+    expected = 1 + 2 * reach_dst(300, 100) + 4 * reach_dst(600, 100)
+    assert calculate_reach(records, 1, reaches, limit=1000)['crime_reach'] == pytest.approx(expected)
+    assert calculate_reach(records, 1, reaches, limit=1100)['crime_reach'] == pytest.approx(expected + 8 * reach_dst(1100, 100))
+    assert calculate_reach(records, 1, reaches, limit=0)['crime_reach'] == 1
+
+def test_reaches_sharing_a_kernel_are_grouped():
+    reaches = [
+        Reach('crime_reach', 'crime_count', 'normal', 132),
+        Reach('store_reach', 'stores_count'),
+        Reach('near_store_reach', 'stores_count', 'normal', 132),
+        Reach('far_crime_reach', 'crime_count'),
+    ]
+    groups = _kernel_groups(reaches)
+
+    assert [(reach.kernel, reach.scale, positions) for reach, positions in groups] == [('normal', 132, [1, 3]), ('normal', 400, [2, 4])]
+
+    # Grouped reaches are the same as calculating each reach on its own
+    records = junction_records(junctions(), reaches)
+    grouped = calculate_reach(records, 2, reaches, groups=groups)
+    for position, reach in enumerate(reaches):
+        single_records = { key: (record[0], record[position + 1]) for key, record in records.items() }
+        assert grouped[reach.name] == pytest.approx(calculate_reach(single_records, 2, [reach])[reach.name])
+
+def test_reaches_are_normalized():
+    data = junctions()
+    calculate_reaches(data, [Reach('crime_reach', 'crime_count')])
+
+    assert max(row['crime_reach'] for row in data) == 1
+    assert data[4]['crime_reach'] == 1
+    assert data[1]['crime_reach'] == pytest.approx(
+        (normal_dst(0, 400) + 2 * normal_dst(300, 400) + 4 * normal_dst(600, 400)) /
+        (8 * normal_dst(0, 400) + 4 * normal_dst(500, 400) + 2 * normal_dst(900, 400))
+    )
+
+def test_columns_that_are_all_zero_are_not_normalized():
+    data = Dataset([{ 'id': 1, 'reach': 0.0 }, { 'id': 2, 'reach': 0.0 }])
+    normalize_reaches(data, ['reach'])
+
+    assert [row['reach'] for row in data] == [0.0, 0.0]
+
+def test_parse():
+    assert repr(Reach.parse('crime_reach=crime_count:borgatti:132')) == "Reach('crime_reach', 'crime_count', 'borgatti', 132)"
+    assert repr(Reach.parse('store_reach=stores_count')) == "Reach('store_reach', 'stores_count', 'normal', 400)"
+
+    with pytest.raises(Exception, match="is not a reach"):
+        Reach.parse('crime_count')
+    with pytest.raises(Exception, match="is not a kernel"):
+        Reach.parse('crime_reach=crime_count:uniform')
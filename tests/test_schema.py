@@ -0,0 +1,81 @@
+import os
+import sys
+import csv
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import pytest
+
+from data_wrangler import Dataset
+from data_wrangler.schema import Schema
+from data_wrangler.conversion_functions import RowFunction
+
+FIELDNAMES = ['ID', 'Name', 'Latitude']
+
+def records():
+    return [['1', 'Main St', '49.2'], ['2', 'Oak St', 'unknown'], ['x', 'Fir St', '49.3'], ['4', 'Elm St', '']]
+
+CONVERSIONS = { 'id': (int, 'ID'), 'name': (str, 'Name'), 'latitude': (float, 'Latitude') }
+
+def test_columns_are_converted_and_renamed():
+    rows = Schema(CONVERSIONS).read(records()[:1], FIELDNAMES, 'id')
+
+    assert rows == [{ 'id': 1, 'name': 'Main St', 'latitude': 49.2 }]
+
+def test_bad_rows_are_all_reported_when_raising():
+    with pytest.raises(Exception) as error:
+        Schema(CONVERSIONS).read(records(), FIELDNAMES, 'id')
+
+    message = str(error.value)
+    assert message.startswith("Found 3 rows with values that could not be converted in ['ID', 'Latitude']")
+    assert "row 2 Latitude='unknown'" in message
+    assert "row 3 ID='x'" in message
+    assert "row 4 Latitude=''" in message
+
+def test_bad_rows_are_dropped(capsys):
+    rows = Schema(CONVERSIONS, on_bad_rows='drop').read(records(), FIELDNAMES, 'id')
+
+    assert rows == [{ 'id': 1, 'name': 'Main St', 'latitude': 49.2 }]
+    assert capsys.readouterr().out.startswith("Dropped 3 rows")
+
+def test_the_report_is_shortened():
+    with pytest.raises(Exception, match=r"\.\.\. and 2 more"):
+        Schema(CONVERSIONS, max_reported=1).read(records(), FIELDNAMES, 'id')
+
+def test_missing_columns_are_left_empty(capsys):
+    conversions = { 'id': (int, 'ID'), 'area': (str, 'LocalArea') }
+    rows = Schema(conversions).read(records()[:1], FIELDNAMES, 'id')
+
+    assert rows == [{ 'id': 1, 'area': None }]
+    assert "['LocalArea'] are not valid fieldnames" in capsys.readouterr().out
+
+def test_primary_keys_are_generated_when_not_a_column():
+    rows = Schema({ 'name': (str, 'Name') }).read(records()[:2], FIELDNAMES, 'id', primary_key_start=10)
+
+    assert [row['id'] for row in rows] == [10, 11]
+
+def test_short_rows_are_padded():
+    rows = Schema({ 'id': (int, 'ID'), 'latitude': (lambda value: value and float(value), 'Latitude') }).read(
+        [['1', 'Main St', '49.2'], ['2', 'Oak St']], FIELDNAMES, 'id'
+    )
+
+    assert rows == [{ 'id': 1, 'latitude': 49.2 }, { 'id': 2, 'latitude': None }]
+
+def test_invalid_options_raise():
+    with pytest.raises(Exception, match="on_bad_rows"):
+        Schema(CONVERSIONS, on_bad_rows='ignore')
+    with pytest.raises(Exception, match="RowFunction"):
+        Schema({ 'id': RowFunction(lambda row, i: i) })
+
+def test_load_file_drops_bad_rows(tmp_path):
+    filename = str(tmp_path / 'junctions.csv')
+    with open(filename, 'w', encoding='utf-8', newline='') as junction_file:
+        writer = csv.writer(junction_file)
+        writer.writerow(FIELDNAMES)
+        writer.writerows(records())
+
+    with pytest.raises(Exception, match="Found 3 rows"):
+        Dataset.load_file(filename, CONVERSIONS)
+
+    junctions = Dataset.load_file(filename, CONVERSIONS, on_bad_rows='drop')
+    assert [row['name'] for row in junctions] == ['Main St']